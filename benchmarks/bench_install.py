@@ -0,0 +1,195 @@
+"""
+Замер установки по фазам на синтетической сборке, без сети и без окна.
+
+    python benchmarks/bench_install.py [--profile typical] [--runs 3]
+    python benchmarks/bench_install.py --save-baseline baseline.json
+    python benchmarks/bench_install.py --baseline baseline.json   # сравнить, код 1 при регрессии
+
+Сценарии (каждый — на каждом формате архива):
+- download — download_file с локальной замены Drive (Range-сегменты)
+- fresh    — прямая установка в пустую папку
+- update   — повторная установка того же архива поверх (delta: только сравнение)
+- staged   — установка через main/tmp
+- stream   — StreamInstaller: закачка и распаковка tar одним конвейером
+- sync     — FolderSyncInstaller: та же сборка, опубликованная папкой
+Фазы custom_install_process (чтение оглавления, снимок, сравнение,
+удаление, распаковка, перенос...) меряются по отдельности.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fc_installer_core as core  # noqa: E402
+from local_drive import LocalDrive  # noqa: E402
+from synthetic_modpack import FORMATS, PROFILES, build_modpack  # noqa: E402
+
+SCENARIOS = ("download", "fresh", "update", "staged", "stream", "sync")
+TAR_FORMATS = ("tar", "tar.gz")  # То, что StreamInstaller распаковывает потоком
+
+# (фаза, где искать: модуль или класс, атрибут)
+PHASES = [
+    ("download", None, "download_file"),
+    ("list folder", None, "list_drive_tree"),
+    ("read index", "Installer", "plan_members"),
+    ("snapshot", "Installer", "take_snapshot"),
+    ("compare", "Installer", "changed_jobs"),
+    ("remove", "Installer", "remove_stale_files_in_main"),
+    ("remove", "Installer", "remove_mods_folders_in_main"),
+    ("extract", None, "extract_members"),
+    ("stream extract", "StreamInstaller", "extract_tar_stream"),
+    ("place", "Installer", "place_minecraft_in_main"),
+]
+
+REGRESSION_FLOOR = 0.05  # Изменения меньше 50 мс считаем шумом
+
+@contextlib.contextmanager
+def phase_timer(timings: dict):
+    """
+    На время замера оборачиваем функции фаз: их время копится в timings.
+    """
+    originals = []
+    for phase, owner, attr in PHASES:
+        target = getattr(core, owner) if owner else core
+        original = target.__dict__[attr] if owner else getattr(core, attr)
+
+        def wrapper(*args, _original=original, _phase=phase, **kwargs):
+            started = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                timings[_phase] = timings.get(_phase, 0.0) + time.perf_counter() - started
+
+        setattr(target, attr, wrapper)
+        originals.append((target, attr, original))
+    try:
+        yield
+    finally:
+        for target, attr, original in reversed(originals):
+            setattr(target, attr, original)
+
+def installer_args() -> dict:
+    return dict(ignored_files=list(core.DEFAULT_IGNORED_FILES),
+                ignored_folders=list(core.DEFAULT_IGNORED_FOLDERS),
+                keep_in_main=list(core.DEFAULT_KEEP_IN_MAIN))
+
+def run_scenario(scenario: str, fmt: str, archive: str, drive: LocalDrive, ids: dict, work: str) -> dict:
+    """
+    Один прогон сценария; возвращает {фаза: секунды, "total": секунды}.
+    """
+    main_dir = tempfile.mkdtemp(prefix="main-", dir=work)
+    url = f"https://drive.google.com/file/d/{ids.get(fmt)}/view"
+    if scenario == "download":
+        def action():
+            core.download_file(drive.service(), ids[fmt], main_dir, progress_callback=lambda value: None)
+    elif scenario in ("fresh", "update", "staged"):
+        installer = core.Installer(archive, main_dir, direct_install=scenario != "staged", **installer_args())
+        if scenario == "update":
+            installer.custom_install_process()
+        action = installer.custom_install_process
+    elif scenario == "stream":
+        action = core.StreamInstaller(url, main_dir, "", use_cache=False, **installer_args()).custom_install_process
+    else:
+        folder_url = f"https://drive.google.com/drive/folders/{ids['folder']}"
+        action = core.FolderSyncInstaller(folder_url, main_dir, "", **installer_args()).custom_install_process
+
+    timings = {}
+    try:
+        with phase_timer(timings):
+            started = time.perf_counter()
+            action()
+            timings["total"] = time.perf_counter() - started
+    finally:
+        shutil.rmtree(main_dir, ignore_errors=True)
+    return timings
+
+def applicable(scenario: str, fmt: str) -> bool:
+    if scenario == "stream":
+        return fmt in TAR_FORMATS
+    if scenario == "sync":
+        return fmt == "zip"  # Папка от формата не зависит — меряем один раз
+    return True
+
+def run(args) -> dict:
+    os.makedirs(args.work, exist_ok=True)
+    packs = build_modpack(os.path.join(args.work, "packs"), args.profile, args.formats, args.seed)
+    drive = LocalDrive(latency=args.latency)
+    ids = {fmt: drive.add_file(os.path.basename(path_), path_) for fmt, path_ in packs.items() if fmt != "tree"}
+    ids["folder"] = drive.add_tree(packs["tree"])
+
+    # Клиент Drive вместо настоящего — локальная замена (сервисный ключ не нужен)
+    service = drive.service()
+    core.get_drive_service = lambda service_account_file: service
+
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            for fmt in [f for f in args.formats if f in packs and applicable(scenario, f)]:
+                samples = [run_scenario(scenario, fmt, packs[fmt], drive, ids, args.work)
+                           for _ in range(args.runs)]
+                phases = sorted({phase for sample in samples for phase in sample})
+                key = f"{scenario}/{fmt}" if scenario != "sync" else "sync/folder"
+                results[key] = {phase: statistics.median(s.get(phase, 0.0) for s in samples)
+                                for phase in phases}
+                print(f"{key:<18} total {results[key]['total'] * 1000:9.1f} ms", flush=True)
+    finally:
+        drive.close()
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    regressions = 0
+    print(f"\n{'scenario':<18} {'phase':<15} {'now, ms':>10} {'base, ms':>10} {'change':>8}")
+    for key, phases in results.items():
+        for phase, seconds in phases.items():
+            base = baseline.get(key, {}).get(phase)
+            line = f"{key:<18} {phase:<15} {seconds * 1000:10.1f}"
+            if base:
+                change = (seconds - base) / base
+                slower = change > threshold and seconds - base > REGRESSION_FLOOR
+                regressions += slower
+                line += f" {base * 1000:10.1f} {change:+8.0%}{'  REGRESSION' if slower else ''}"
+            print(line)
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-phase install benchmark for fc-auto-installer")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="typical")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Artificial delay per Drive request, seconds")
+    parser.add_argument("--work", default=os.path.join(tempfile.gettempdir(), "fc-bench"),
+                        help="Folder for generated modpacks and scratch installs")
+    parser.add_argument("--baseline", help="Compare against this saved result")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression (default: 0.10)")
+    parser.add_argument("--save-baseline", help="Write the medians to this file")
+    args = parser.parse_args(argv)
+
+    # Кэш архивов и логи — во временной папке, а не в профиле пользователя
+    os.environ["LOCALAPPDATA"] = os.path.join(args.work, "appdata")
+    results = run(args)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
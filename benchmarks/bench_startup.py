@@ -0,0 +1,91 @@
+"""
+Замер времени запуска: каждый замер — в свежем интерпретаторе, берём медиану.
+
+    python benchmarks/bench_startup.py [--runs 5] [--service-account key.json]
+
+- core import      — import fc_installer_core (без Qt и клиента Google)
+- google eager     — сколько стоили импорты клиента Google, которые раньше
+                     выполнялись при старте окна
+- window shown     — от старта интерпретатора до показанного окна
+- drive service    — первый get_drive_service и повторный (из кэша);
+                     только с --service-account
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPETS = {
+    "core import": """
+import time; t0 = time.perf_counter()
+import fc_installer_core
+print(time.perf_counter() - t0)
+""",
+    "google eager": """
+import time; t0 = time.perf_counter()
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from google.oauth2.service_account import Credentials
+import httplib2, google_auth_httplib2
+print(time.perf_counter() - t0)
+""",
+    "window shown": """
+import time; t0 = time.perf_counter()
+import importlib.util
+spec = importlib.util.spec_from_file_location("gui", os.path.join(ROOT, "fc-auto-installer.py"))
+gui = importlib.util.module_from_spec(spec); spec.loader.exec_module(gui)
+app = gui.QtWidgets.QApplication([])
+window = gui.FramelessMainWindow(); window.show(); app.processEvents()
+print(time.perf_counter() - t0)
+""",
+}
+
+SERVICE_SNIPPET = """
+import time
+import fc_installer_core
+t0 = time.perf_counter(); fc_installer_core.get_drive_service(KEY); cold = time.perf_counter() - t0
+t0 = time.perf_counter(); fc_installer_core.get_drive_service(KEY); warm = time.perf_counter() - t0
+print(cold, warm)
+"""
+
+def run_snippet(code: str) -> list:
+    prelude = f"import os, sys\nROOT = {ROOT!r}\nsys.path.insert(0, ROOT)\n"
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    out = subprocess.run([sys.executable, "-c", prelude + code], env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return [float(value) for value in out.split()]
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Startup-time benchmark for fc-auto-installer")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--service-account", help="Service account key to time Drive client creation")
+    parser.add_argument("--json", help="Write the medians to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, code in SNIPPETS.items():
+        try:
+            results[name] = statistics.median(run_snippet(code)[0] for _ in range(args.runs))
+        except subprocess.CalledProcessError as e:
+            print(f"{name}: skipped ({e.stderr.strip().splitlines()[-1]})")
+
+    if args.service_account:
+        code = SERVICE_SNIPPET.replace("KEY", repr(os.path.abspath(args.service_account)))
+        samples = [run_snippet(code) for _ in range(args.runs)]
+        results["drive service (cold)"] = statistics.median(s[0] for s in samples)
+        results["drive service (cached)"] = statistics.median(s[1] for s in samples)
+
+    for name, seconds in results.items():
+        print(f"{name:<24} {seconds * 1000:9.1f} ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Локальная замена Google Drive для бенчмарков: отдаёт метаданные
+(files.get), содержимое (alt=media, с Range) и список папки (files.list)
+по HTTP на 127.0.0.1 — без сети и без ключа сервисного аккаунта.
+
+    drive = LocalDrive()
+    file_id = drive.add_file("modpack.zip", "/path/to/modpack.zip")
+    service = drive.service()  # клиент googleapiclient, смотрящий на drive.url
+    ...
+    drive.close()
+"""
+import os
+import re
+import json
+import socket
+import hashlib
+import threading
+import http.server
+import urllib.parse
+
+from typing import Optional
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+class LocalDrive:
+    def __init__(self, latency: float = 0.0):
+        self.files = {}  # id -> {"name", "path", "size", "md5Checksum", "modifiedTime", "parent"}
+        self.folders = {}  # id -> {"name", "parent"}
+        self.latency = latency  # Искусственная задержка ответа, сек
+        self.requests = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def new_id(self, prefix: str) -> str:
+        with self._lock:
+            self._next_id += 1
+            return f"{prefix}{self._next_id}"
+
+    def add_file(self, name: str, path: str, parent: Optional[str] = None) -> str:
+        md5 = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                md5.update(chunk)
+        file_id = self.new_id("f")
+        self.files[file_id] = {
+            "name": name,
+            "path": path,
+            "size": os.path.getsize(path),
+            "md5Checksum": md5.hexdigest(),
+            "modifiedTime": "2024-01-01T00:00:00.000Z",
+            "parent": parent,
+        }
+        return file_id
+
+    def add_folder(self, name: str, parent: Optional[str] = None) -> str:
+        folder_id = self.new_id("d")
+        self.folders[folder_id] = {"name": name, "parent": parent}
+        return folder_id
+
+    def add_tree(self, root: str, parent: Optional[str] = None) -> str:
+        """
+        Публикуем папку root целиком (как распакованную сборку). Возвращает id папки.
+        """
+        folder_ids = {root: self.add_folder(os.path.basename(root), parent)}
+        for current, dirs, files in os.walk(root):
+            for name in dirs:
+                folder_ids[os.path.join(current, name)] = self.add_folder(name, folder_ids[current])
+            for name in files:
+                self.add_file(name, os.path.join(current, name), folder_ids[current])
+        return folder_ids[root]
+
+    def service(self):
+        import httplib2
+        from googleapiclient.discovery import build
+
+        return build("drive", "v3", http=httplib2.Http(timeout=60), static_discovery=True,
+                     client_options={"api_endpoint": self.url})
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        drive = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Заголовки и тело уходят разными send — без NODELAY каждый ответ ждёт delayed ACK
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def send_json(self, payload: dict, status: int = 200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with drive._lock:
+                    drive.requests += 1
+                if drive.latency:
+                    threading.Event().wait(drive.latency)
+                parsed = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(parsed.query)
+                match = re.search(r"/files/([^/]+)$", parsed.path)
+                if match:
+                    self.get_file(match.group(1), query)
+                elif parsed.path.endswith("/files"):
+                    self.list_files(query)
+                else:
+                    self.send_json({"error": {"code": 404, "message": "Not found"}}, 404)
+
+            def get_file(self, file_id: str, query: dict):
+                meta = drive.files.get(file_id)
+                if meta is None and file_id in drive.folders:
+                    self.send_json({"id": file_id, "name": drive.folders[file_id]["name"], "mimeType": FOLDER_MIME})
+                    return
+                if meta is None:
+                    self.send_json({"error": {"code": 404, "message": "File not found"}}, 404)
+                    return
+                if query.get("alt") != ["media"]:
+                    self.send_json({"id": file_id, "name": meta["name"], "size": str(meta["size"]),
+                                    "md5Checksum": meta["md5Checksum"], "modifiedTime": meta["modifiedTime"],
+                                    "mimeType": "application/octet-stream"})
+                    return
+                start, end = 0, meta["size"] - 1
+                range_header = self.headers.get("range")
+                if range_header:
+                    first, last = re.match(r"bytes=(\d+)-(\d*)", range_header).groups()
+                    start, end = int(first), min(int(last) if last else end, end)
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{meta['size']}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                with open(meta["path"], "rb") as f:
+                    f.seek(start)
+                    left = end - start + 1
+                    while left > 0:
+                        chunk = f.read(min(left, 1024 * 1024))
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                        left -= len(chunk)
+
+            def list_files(self, query: dict):
+                parent = re.match(r"'([^']+)'", query.get("q", [""])[0])
+                parent = parent.group(1) if parent else None
+                page_size = int(query.get("pageSize", ["100"])[0])
+                offset = int(query.get("pageToken", ["0"])[0])
+                children = [{"id": fid, "name": f["name"], "mimeType": FOLDER_MIME}
+                            for fid, f in drive.folders.items() if f["parent"] == parent]
+                children += [{"id": fid, "name": f["name"], "mimeType": "application/octet-stream",
+                              "size": str(f["size"]), "md5Checksum": f["md5Checksum"]}
+                             for fid, f in drive.files.items() if f["parent"] == parent]
+                payload = {"files": children[offset:offset + page_size]}
+                if offset + page_size < len(children):
+                    payload["nextPageToken"] = str(offset + page_size)
+                self.send_json(payload)
+
+        return Handler
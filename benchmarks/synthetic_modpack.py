@@ -0,0 +1,161 @@
+"""
+Генератор синтетических сборок для бенчмарков: похожие на настоящие
+модпаки деревья .minecraft/ (крупные jar, тысячи мелких конфигов,
+глубокие деревья ресурспаков), упакованные в zip, tar.gz, tar.zst, tar.
+
+    python benchmarks/synthetic_modpack.py --profile typical --out /tmp/packs
+
+Содержимое детерминировано (seed), поэтому архивы одного профиля
+можно сравнивать между запусками и машинами.
+"""
+import os
+import sys
+import json
+import math
+import random
+import importlib.util
+import shutil
+import tarfile
+import zipfile
+import argparse
+
+from typing import Dict, List, Tuple
+
+PROFILES = {
+    # jars: число и лог-нормальное распределение размера (медиана, сигма, потолок)
+    "tiny": {"jars": 20, "jar_median": 200_000, "jar_sigma": 1.0, "jar_max": 4_000_000,
+             "configs": 300, "resources": 300, "resource_depth": 4},
+    "typical": {"jars": 300, "jar_median": 400_000, "jar_sigma": 1.2, "jar_max": 30_000_000,
+                "configs": 3000, "resources": 2000, "resource_depth": 7},
+    "large": {"jars": 450, "jar_median": 900_000, "jar_sigma": 1.3, "jar_max": 60_000_000,
+              "configs": 8000, "resources": 6000, "resource_depth": 8},
+}
+
+FORMATS = ("zip", "tar.gz", "tar.zst", "tar")
+
+CONFIG_WORDS = ["enabled", "true", "false", "range", "spawnWeight", "maxGroupSize", "biomes",
+                "minecraft:plains", "dimension", "cooldown", "# Default value", "client", "server"]
+
+def zstd_available() -> bool:
+    return importlib.util.find_spec("zstandard") is not None
+
+def config_text(rng: random.Random, size: int) -> bytes:
+    lines, length = [], 0
+    while length < size:
+        line = f"{rng.choice(CONFIG_WORDS)}{rng.randint(0, 999)} = {rng.choice(CONFIG_WORDS)}"
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines).encode()[:size]
+
+def modpack_files(profile: dict, seed: int = 1) -> List[Tuple[str, int, str]]:
+    """
+    План сборки: (путь в архиве, размер, вид: jar/config/resource).
+    """
+    rng = random.Random(seed)
+    files = []
+    mu = math.log(profile["jar_median"])
+    for i in range(profile["jars"]):
+        size = min(profile["jar_max"], max(1024, int(rng.lognormvariate(mu, profile["jar_sigma"]))))
+        files.append((f".minecraft/mods/mod-{i:04d}-1.20.1.jar", size, "jar"))
+    for i in range(profile["configs"]):
+        folder = rng.choice(["config", "config", "config/modid", "defaultconfigs", "kubejs/server_scripts"])
+        ext = rng.choice([".toml", ".json", ".cfg", ".js", ".properties"])
+        files.append((f".minecraft/{folder}/{i:05d}{ext}", rng.randint(100, 6000), "config"))
+    for i in range(profile["resources"]):
+        depth = rng.randint(2, profile["resource_depth"])
+        parts = [f"d{rng.randint(0, 5)}" for _ in range(depth)]
+        path_ = "/".join(["resourcepacks/pack/assets/modpack/textures"] + parts)
+        files.append((f".minecraft/{path_}/tex{i:05d}.png", rng.randint(300, 60_000), "resource"))
+    files += [(".minecraft/options.txt", 3000, "config"), (".minecraft/servers.dat", 200, "resource")]
+    return files
+
+def file_content(rng: random.Random, size: int, kind: str) -> bytes:
+    # jar и png уже сжаты — случайные байты; конфиги — сжимаемый текст
+    return config_text(rng, size) if kind == "config" else rng.randbytes(size)
+
+def write_tree(files: List[Tuple[str, int, str]], root: str, seed: int = 1):
+    rng = random.Random(seed + 1)
+    for name, size, kind in files:
+        path_ = os.path.join(root, *name.split("/"))
+        os.makedirs(os.path.dirname(path_), exist_ok=True)
+        with open(path_, "wb") as f:
+            f.write(file_content(rng, size, kind))
+
+def pack(tree_root: str, out_path: str, fmt: str):
+    """
+    Упаковываем содержимое tree_root (с папкой .minecraft внутри) в out_path.
+    """
+    names = []
+    for current, _, files in os.walk(tree_root):
+        for name in files:
+            full = os.path.join(current, name)
+            names.append((full, os.path.relpath(full, tree_root).replace(os.sep, "/")))
+    names.sort(key=lambda item: item[1])
+
+    if fmt == "zip":
+        with zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for full, arcname in names:
+                zf.write(full, arcname)
+    elif fmt in ("tar", "tar.gz"):
+        with tarfile.open(out_path, "w:gz" if fmt == "tar.gz" else "w") as tf:
+            for full, arcname in names:
+                tf.add(full, arcname)
+    elif fmt == "tar.zst":
+        import zstandard
+        with open(out_path, "wb") as raw:
+            with zstandard.ZstdCompressor(level=3, threads=-1).stream_writer(raw) as writer:
+                with tarfile.open(fileobj=writer, mode="w|") as tf:
+                    for full, arcname in names:
+                        tf.add(full, arcname)
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+def build_modpack(out_dir: str, profile_name: str = "typical", formats=FORMATS,
+                  seed: int = 1, overrides: dict = None) -> Dict[str, str]:
+    """
+    Генерируем сборку и архивы в out_dir (повторный вызов с теми же
+    параметрами переиспользует готовое). Возвращает {формат: путь к архиву}
+    и путь к распакованному дереву под ключом "tree".
+    """
+    profile = dict(PROFILES[profile_name], **(overrides or {}))
+    key = f"{profile_name}-{seed}-" + "-".join(f"{k}{v}" for k, v in sorted((overrides or {}).items()))
+    work = os.path.join(out_dir, key.rstrip("-"))
+    tree = os.path.join(work, "tree")
+    stamp = os.path.join(work, "profile.json")
+
+    if not os.path.exists(stamp):
+        shutil.rmtree(work, ignore_errors=True)
+        files = modpack_files(profile, seed)
+        write_tree(files, tree, seed)
+        os.makedirs(work, exist_ok=True)
+        with open(stamp, "w", encoding="utf-8") as f:
+            json.dump({"profile": profile, "seed": seed, "files": len(files),
+                       "bytes": sum(size for _, size, _ in files)}, f)
+
+    result = {"tree": tree}
+    for fmt in formats:
+        if fmt == "tar.zst" and not zstd_available():
+            continue
+        out_path = os.path.join(work, f"modpack.{fmt}")
+        if not os.path.exists(out_path):
+            pack(tree, out_path + ".tmp", fmt)
+            os.replace(out_path + ".tmp", out_path)
+        result[fmt] = out_path
+    return result
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic modpack archives")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="typical")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", required=True, help="Folder for the generated tree and archives")
+    args = parser.parse_args(argv)
+
+    for fmt, path_ in build_modpack(args.out, args.profile, args.formats, args.seed).items():
+        size = sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(path_) for f in fs) \
+            if os.path.isdir(path_) else os.path.getsize(path_)
+        print(f"{fmt:<8} {size / 1024 ** 2:9.1f} MB  {path_}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,129 +1,137 @@
 import os
 import sys
-import shutil
-import socket
-import zipfile
-import tarfile
-import tempfile
 import logging
+import collections
 
-from typing import Optional, Callable, List
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from google.oauth2.service_account import Credentials
+from typing import List, Optional
 
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtGui import QFontDatabase, QIcon, QFont, QPixmap, QPainter
 from PyQt5.QtCore import Qt, QRect
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+from fc_installer_core import (
+    logger,
+    DIRECT_INSTALL,
+    PRESTAGE_INTERVAL,
+    USE_ARCHIVE_CACHE,
+    USE_CONTENT_STORE,
+    DEFAULT_IGNORED_FILES,
+    DEFAULT_IGNORED_FOLDERS,
+    DEFAULT_KEEP_IN_MAIN,
+    FolderSyncInstaller,
+    InstallIndex,
+    Installer,
+    PreflightResult,
+    SnapshotManager,
+    StreamInstaller,
+    UpdateStager,
+    add_file_log_handler,
+    check_internet_connection,
+    default_service_account_file,
+    extract_folder_id,
+    preflight,
+    warm_up_drive_service,
+)
+
+LOG_MAX_LINES = 5000  # Сколько последних строк держим во вкладке Logs
+LOG_FLUSH_INTERVAL_MS = 100  # Как часто переносим накопленные записи в окно
+
+class LogListModel(QtCore.QAbstractListModel):
+    """
+    Модель для вкладки Logs: кольцевой буфер на max_lines строк,
+    старые строки вытесняются новыми.
+    """
+    def __init__(self, max_lines: int = LOG_MAX_LINES, parent=None):
+        super().__init__(parent)
+        self.lines = collections.deque(maxlen=max_lines)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.lines[index.row()]
+        return None
+
+    def append_lines(self, new_lines: list):
+        max_lines = self.lines.maxlen
+        new_lines = new_lines[-max_lines:]
+        overflow = len(self.lines) + len(new_lines) - max_lines
+        if overflow > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self.lines.popleft()
+            self.endRemoveRows()
+        first = len(self.lines)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(new_lines) - 1)
+        self.lines.extend(new_lines)
+        self.endInsertRows()
 
 class QtLogHandler(logging.Handler):
     """
-    Логгирование в QListWidget (Logs).
+    Логгирование во вкладку Logs. emit вызывается из любого потока и только
+    кладёт строку в очередь; таймер в GUI-потоке раз в LOG_FLUSH_INTERVAL_MS
+    переносит накопленное в модель одной пачкой.
     """
-    def __init__(self, list_widget: QtWidgets.QListWidget):
+    def __init__(self, view: QtWidgets.QListView):
         super().__init__()
-        self.list_widget = list_widget
-
-    def emit(self, record):
-        msg = self.format(record)
-        # Добавляем сообщение в QListWidget
-        self.list_widget.addItem(msg)
-        self.list_widget.scrollToBottom()
-
-# ==================== Константы / Настройки ====================
+        self.view = view
+        self.model = LogListModel(parent=view)
+        self.view.setModel(self.model)
+        self.view.setUniformItemSizes(True)
+        self.pending = collections.deque()  # append/popleft потокобезопасны
 
-ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".rar")
-MODS_FOLDERS = ["mods", "configs"]  # Папки, которые удаляем из main
-MC_FILES_TO_REMOVE = ["options.txt", "server.dat"]  # Файлы, удаляемые в tmp/.minecraft, ЕСЛИ есть такие же в main
+        self.timer = QtCore.QTimer(view)
+        self.timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self.timer.timeout.connect(self.flush_pending)
+        self.timer.start()
 
-# ==================== Вспомогательные функции ====================
-
-def check_internet_connection() -> bool:
-    try:
-        socket.create_connection(("8.8.8.8", 53), timeout=5)
-        return True
-    except OSError:
-        return False
+    def emit(self, record):
+        try:
+            self.pending.append(self.format(record))
+        except Exception:
+            self.handleError(record)
 
-def extract_file_id(url: str) -> str:
-    if "drive.google.com" in url and "/file/d/" in url:
-        return url.split("/file/d/")[-1].split("/")[0]
-    elif "id=" in url:
-        return url.split("id=")[-1].split("&")[0]
-    else:
-        raise ValueError("Invalid Google Drive URL format.")
-
-def get_drive_service(service_account_file: str):
-    try:
-        credentials = Credentials.from_service_account_file(service_account_file)
-        service = build('drive', 'v3', credentials=credentials)
-        return service
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Service account file not found: {service_account_file}")
-    except Exception as e:
-        raise Exception(f"Error creating Google Drive service: {e}")
-
-def download_file(service,
-                  file_id: str,
-                  save_folder: str,
-                  progress_callback: Callable[[int], None]) -> str:
-    file_info = service.files().get(fileId=file_id, fields="name, size").execute()
-    file_name = file_info.get("name", "downloaded_file")
-    file_size = int(file_info.get("size", 0)) if file_info.get("size") else 0
-
-    request = service.files().get_media(fileId=file_id)
-    file_path = os.path.join(save_folder, file_name)
-
-    with open(file_path, "wb") as f:
-        downloader = MediaIoBaseDownload(f, request)
-        done = False
-        last_progress_sent = 0
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                current_progress = int(status.progress() * 100)
-                if current_progress - last_progress_sent >= 2:
-                    progress_callback(current_progress)
-                    last_progress_sent = current_progress
-
-    return file_path
+    def flush_pending(self):
+        if not self.pending:
+            return
+        lines = []
+        while self.pending:
+            lines.append(self.pending.popleft())
+        scrollbar = self.view.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        self.model.append_lines(lines)
+        # Не дёргаем прокрутку, если пользователь читает старые строки
+        if at_bottom:
+            self.view.scrollToBottom()
 
 # ==================== QThread-классы (Workers) ====================
 
-class DownloadWorker(QtCore.QThread):
-    progress = QtCore.pyqtSignal(int)
-    message = QtCore.pyqtSignal(str)
-    finished_ok = QtCore.pyqtSignal(str)
-    failed = QtCore.pyqtSignal(str)
+class PreflightWorker(QtCore.QThread):
+    """
+    Проверка перед установкой (см. preflight) — сеть, ключ, метаданные и
+    место на диске проверяются в фоне, окно не замирает.
+    """
+    finished_ok = QtCore.pyqtSignal(object)
 
-    def __init__(self, url: str, save_folder: str, service_account_file: str):
+    def __init__(self, url: str, main_dir: str, service_account_file: str):
         super().__init__()
         self.url = url
-        self.save_folder = save_folder
+        self.main_dir = main_dir
         self.service_account_file = service_account_file
 
     def run(self):
         try:
-            service = get_drive_service(self.service_account_file)
-            file_id = extract_file_id(self.url)
-            file_path = download_file(
-                service=service,
-                file_id=file_id,
-                save_folder=self.save_folder,
-                progress_callback=self.on_progress
-            )
-            self.finished_ok.emit(file_path)
+            result = preflight(self.url, self.main_dir, self.service_account_file)
         except Exception as e:
-            self.failed.emit(str(e))
-
-    def on_progress(self, value: int):
-        self.progress.emit(value)
+            # Что бы ни сломалось, окно должно получить ответ и вернуть кнопки
+            result = PreflightResult()
+            result.errors["preflight"] = str(e)
+        self.finished_ok.emit(result)
 
 class ExtractWorker(QtCore.QThread):
     progress = QtCore.pyqtSignal(int)
+    status = QtCore.pyqtSignal(str)
     message = QtCore.pyqtSignal(str)
     finished_ok = QtCore.pyqtSignal()
     failed = QtCore.pyqtSignal(str)
@@ -133,125 +141,152 @@ class ExtractWorker(QtCore.QThread):
                  extract_folder: str,
                  ignored_files: List[str],
                  ignored_folders: List[str],
-                 keep_in_main: List[str]):
+                 keep_in_main: List[str],
+                 direct_install: bool = DIRECT_INSTALL,
+                 use_store: bool = USE_CONTENT_STORE):
         super().__init__()
-        self.file_path = file_path
-        self.extract_folder = extract_folder
-        self.ignored_files = ignored_files
-        self.ignored_folders = ignored_folders
-        self.keep_in_main = keep_in_main
+        self.installer = Installer(file_path, extract_folder, ignored_files, ignored_folders,
+                                   keep_in_main, direct_install, use_store=use_store, **self.callbacks())
+
+    def callbacks(self) -> dict:
+        return dict(progress_callback=self.progress.emit,
+                    status_callback=self.status.emit,
+                    message_callback=self.message.emit)
 
     def run(self):
         try:
-            self.custom_install_process()
+            self.installer.custom_install_process()
             self.message.emit("Installation steps completed successfully.")
             self.finished_ok.emit()
         except Exception as e:
             self.failed.emit(str(e))
 
-    def on_progress(self, value: int):
-        self.progress.emit(value)
+class StreamInstallWorker(ExtractWorker):
+    """
+    Закачка + установка одним конвейером (см. StreamInstaller).
+    """
+    def __init__(self,
+                 url: str,
+                 extract_folder: str,
+                 service_account_file: str,
+                 ignored_files: List[str],
+                 ignored_folders: List[str],
+                 keep_in_main: List[str],
+                 use_cache: bool = USE_ARCHIVE_CACHE,
+                 use_store: bool = USE_CONTENT_STORE,
+                 file_info: Optional[dict] = None):
+        super().__init__("", extract_folder, ignored_files, ignored_folders, keep_in_main)
+        self.installer = StreamInstaller(url, extract_folder, service_account_file, ignored_files,
+                                         ignored_folders, keep_in_main, use_cache, file_info,
+                                         use_store=use_store, **self.callbacks())
+
+class FolderSyncWorker(ExtractWorker):
+    """
+    Синхронизация с распакованной папкой сборки на Drive (см. FolderSyncInstaller).
+    """
+    def __init__(self,
+                 url: str,
+                 extract_folder: str,
+                 service_account_file: str,
+                 ignored_files: List[str],
+                 ignored_folders: List[str],
+                 keep_in_main: List[str],
+                 use_store: bool = USE_CONTENT_STORE):
+        super().__init__("", extract_folder, ignored_files, ignored_folders, keep_in_main)
+        self.installer = FolderSyncInstaller(url, extract_folder, service_account_file, ignored_files,
+                                             ignored_folders, keep_in_main, use_store=use_store,
+                                             **self.callbacks())
+
+class PrestageWorker(QtCore.QThread):
+    """
+    Фоновая подготовка обновления (см. UpdateStager.stage). staged получает
+    имя подготовленного архива или "" — обновлений нет.
+    """
+    staged = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal(str)
 
-    def custom_install_process(self):
-        """
-        1) Создаём папку tmp
-        2) Распаковываем архив => tmp
-        3) Удаляем mods/, configs/ в main
-        4) Удаляем options.txt/server.dat в tmp/.minecraft, но только если они есть в main
-        5) Копируем tmp/.minecraft => main (overwrite)
-        6) Удаляем tmp (и при желании — сам архив)
-        """
-        main_dir = self.extract_folder
-        archive_path = self.file_path
-
-        # 1. Папка tmp
-        tmp_dir = os.path.join(main_dir, "tmp")
-        if not os.path.exists(tmp_dir):
-            os.makedirs(tmp_dir)
-
-        # 2. Распаковать архива => tmp
-        self.extract_to_tmp(archive_path, tmp_dir)
-
-        # 3. Удаляем mods/, configs/ из main
-        self.remove_mods_folders_in_main(main_dir, MODS_FOLDERS)
-
-        # 4. Удаляем options.txt/server.dat в tmp/.minecraft, если они есть в main
-        self.remove_files_in_minecraft_if_in_main(tmp_dir, main_dir, MC_FILES_TO_REMOVE)
-
-        # 5. Копируем tmp/.minecraft => main
-        self.copy_minecraft_to_main(tmp_dir, main_dir)
-
-        # 6. Удаляем tmp
-        shutil.rmtree(tmp_dir, ignore_errors=True)
-        # (Если хотите удалять архив — раскомментируйте)
-        # os.remove(archive_path)
-
-    def extract_to_tmp(self, archive_path: str, tmp_dir: str):
-        if zipfile.is_zipfile(archive_path):
-            with zipfile.ZipFile(archive_path, "r") as zip_ref:
-                all_files = zip_ref.namelist()
-                total = len(all_files)
-                for i, member in enumerate(all_files):
-                    zip_ref.extract(member, tmp_dir)
-                    percent = int((i + 1) / total * 100)
-                    self.on_progress(percent)
-        elif tarfile.is_tarfile(archive_path):
-            with tarfile.open(archive_path, "r:*") as tar_ref:
-                all_members = tar_ref.getmembers()
-                total = len(all_members)
-                for i, member in enumerate(all_members):
-                    tar_ref.extract(member, tmp_dir)
-                    percent = int((i + 1) / total * 100)
-                    self.on_progress(percent)
-        else:
-            raise ValueError("Unsupported archive format.")
+    def __init__(self, stager: UpdateStager):
+        super().__init__()
+        self.stager = stager
 
-        # Проверка на наличие .minecraft
-        mc_path = os.path.join(tmp_dir, ".minecraft")
-        if not os.path.exists(mc_path):
-            raise FileNotFoundError("No .minecraft folder found inside the archive.")
+    def run(self):
+        # Без сети молча ждём следующей проверки (проба — здесь, не в потоке окна)
+        if not check_internet_connection():
+            self.staged.emit("")
+            return
+        try:
+            state = self.stager.stage()
+            self.staged.emit(state["name"] if state else "")
+        except Exception as e:
+            self.failed.emit(str(e))
 
-    def remove_mods_folders_in_main(self, main_dir: str, folders: List[str]):
-        for folder_name in folders:
-            path_ = os.path.join(main_dir, folder_name)
-            if os.path.isdir(path_):
-                shutil.rmtree(path_, ignore_errors=True)
-                logger.info(f"Removed folder: {path_}")
+class ApplyUpdateWorker(ExtractWorker):
+    """
+    Установка заранее подготовленного обновления (см. UpdateStager.apply).
+    """
+    def __init__(self,
+                 stager: UpdateStager,
+                 ignored_files: List[str],
+                 ignored_folders: List[str],
+                 keep_in_main: List[str]):
+        super().__init__("", stager.main_dir, ignored_files, ignored_folders, keep_in_main)
+        self.stager = stager
 
-    def remove_files_in_minecraft_if_in_main(self, tmp_dir: str, main_dir: str, files_to_remove: List[str]):
-        """
-        Удаляем указанные файлы из tmp/.minecraft ТОЛЬКО ЕСЛИ аналогичные есть в main_dir.
-        """
-        mc_path = os.path.join(tmp_dir, ".minecraft")
-        if not os.path.exists(mc_path):
-            return
+    def run(self):
+        try:
+            state = self.stager.apply(**self.callbacks())
+            self.message.emit(f"Update {state['name']} applied.")
+            self.finished_ok.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
 
-        for fname in files_to_remove:
-            main_path = os.path.join(main_dir, fname)
-            # Проверяем, есть ли такой файл в main_dir:
-            if not os.path.exists(main_path):
-                # значит не удаляем его в tmp
-                continue
-
-            # Если в main есть, то удаляем во всём tmp/.minecraft
-            for root, dirs, files in os.walk(mc_path, topdown=True):
-                if fname in files:
-                    f_path = os.path.join(root, fname)
-                    os.remove(f_path)
-                    logger.info(f"Removed file in tmp: {f_path}")
-
-    def copy_minecraft_to_main(self, tmp_dir: str, main_dir: str):
-        mc_path = os.path.join(tmp_dir, ".minecraft")
-        if not os.path.exists(mc_path):
-            return
-        for item in os.listdir(mc_path):
-            src = os.path.join(mc_path, item)
-            dst = os.path.join(main_dir, item)
-            if os.path.isdir(src):
-                shutil.copytree(src, dst, dirs_exist_ok=True)
+class RollbackWorker(QtCore.QThread):
+    """
+    Возврат mods/, configs/ из снимка (см. SnapshotManager.restore).
+    """
+    finished_ok = QtCore.pyqtSignal(int)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, main_dir: str, snapshot_id: str):
+        super().__init__()
+        self.main_dir = main_dir
+        self.snapshot_id = snapshot_id
+
+    def run(self):
+        try:
+            files = SnapshotManager(self.main_dir).restore(self.snapshot_id)
+            InstallIndex(self.main_dir).forget()
+            self.finished_ok.emit(files)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class VerifyWorker(QtCore.QThread):
+    """
+    Сверка папки с индексом установки (InstallIndex.verify), а если заданы
+    paths — починка этих файлов из архива (InstallIndex.repair).
+    """
+    progress = QtCore.pyqtSignal(int)
+    status = QtCore.pyqtSignal(str)
+    verified = QtCore.pyqtSignal(list)
+    repaired = QtCore.pyqtSignal(int)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, main_dir: str, service_account_file: str, paths: Optional[List[str]] = None):
+        super().__init__()
+        self.main_dir = main_dir
+        self.service_account_file = service_account_file
+        self.paths = paths
+
+    def run(self):
+        try:
+            index = InstallIndex(self.main_dir)
+            if self.paths is None:
+                self.verified.emit(index.verify(self.status.emit))
             else:
-                shutil.copy2(src, dst)
-        logger.info(f"Copied .minecraft contents from {mc_path} to {main_dir}")
+                self.repaired.emit(index.repair(self.paths, self.service_account_file,
+                                                self.progress.emit, self.status.emit))
+        except Exception as e:
+            self.failed.emit(str(e))
 
 # ===================== Класс бескаркасного окна =====================
 class FramelessMainWindow(QtWidgets.QMainWindow):
@@ -393,26 +428,35 @@ class MinecraftInstallerUI(QtWidgets.QTabWidget):
         """)
 
         # Параметры по умолчанию
-        self.ignored_files: List[str] = ["options.txt", "servers.dat"]
-        self.ignored_folders: List[str] = ["logs"]
-        self.keep_in_main:  List[str] = ["saves", "xaero", "distant_horizons_server_data"]
+        self.ignored_files: List[str] = list(DEFAULT_IGNORED_FILES)
+        self.ignored_folders: List[str] = list(DEFAULT_IGNORED_FOLDERS)
+        self.keep_in_main:  List[str] = list(DEFAULT_KEEP_IN_MAIN)
 
-        self.service_account_file = os.path.join(
-            os.path.dirname(__file__),
-            "fc-auto-installer-3b84891aacd2.json"
-        )
+        self.service_account_file = default_service_account_file()
 
         # Лог-виджет
-        self.log_area = QtWidgets.QListWidget()
+        self.log_area = QtWidgets.QListView()
         self.log_handler = QtLogHandler(self.log_area)
         formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         self.log_handler.setFormatter(formatter)
         logger.addHandler(self.log_handler)
+        # Полный лог — в файл с ротацией (вкладка хранит только последние строки)
+        add_file_log_handler(formatter)
 
         self.selected_folder = ""
+        self.prestage_worker = None
 
         self.init_ui()
 
+        # Фоновая подготовка обновлений: проверка по таймеру, пока включён флажок
+        self.prestage_timer = QtCore.QTimer(self)
+        self.prestage_timer.setInterval(PRESTAGE_INTERVAL * 1000)
+        self.prestage_timer.timeout.connect(self.start_prestage)
+        self.prestage_timer.start()
+
+        # Клиент Drive и токен готовим уже после показа окна
+        QtCore.QTimer.singleShot(0, lambda: warm_up_drive_service(self.service_account_file))
+
     def init_ui(self):
         self.download_tab = QtWidgets.QWidget()
         self.logs_tab = QtWidgets.QWidget()
@@ -438,6 +482,14 @@ class MinecraftInstallerUI(QtWidgets.QTabWidget):
         self.select_folder_button.clicked.connect(self.select_folder)
         layout.addWidget(self.select_folder_button)
 
+        self.store_checkbox = QtWidgets.QCheckBox("Share mod jars between instances (hardlinks)")
+        self.store_checkbox.setChecked(USE_CONTENT_STORE)
+        layout.addWidget(self.store_checkbox)
+
+        self.prestage_checkbox = QtWidgets.QCheckBox("Prepare updates in the background")
+        self.prestage_checkbox.toggled.connect(lambda checked: checked and self.start_prestage())
+        layout.addWidget(self.prestage_checkbox)
+
         self.progress_bar = QtWidgets.QProgressBar()
         layout.addWidget(self.progress_bar)
 
@@ -452,6 +504,19 @@ class MinecraftInstallerUI(QtWidgets.QTabWidget):
         self.extract_button.clicked.connect(self.start_extract_only)
         layout.addWidget(self.extract_button)
 
+        self.apply_button = QtWidgets.QPushButton("Apply Update")
+        self.apply_button.clicked.connect(self.start_apply_update)
+        self.apply_button.setEnabled(False)
+        layout.addWidget(self.apply_button)
+
+        self.rollback_button = QtWidgets.QPushButton("Rollback...")
+        self.rollback_button.clicked.connect(self.start_rollback)
+        layout.addWidget(self.rollback_button)
+
+        self.verify_button = QtWidgets.QPushButton("Verify")
+        self.verify_button.clicked.connect(self.start_verify)
+        layout.addWidget(self.verify_button)
+
         layout.addStretch()
         self.download_tab.setLayout(layout)
 
@@ -489,6 +554,7 @@ class MinecraftInstallerUI(QtWidgets.QTabWidget):
         if folder:
             self.selected_folder = folder
             logger.info(f"Selected folder: {folder}")
+            self.refresh_apply_button()
 
     def start_download_and_extract(self):
         url = self.url_input.text()
@@ -500,44 +566,50 @@ class MinecraftInstallerUI(QtWidgets.QTabWidget):
             logger.error("Invalid folder selected.")
             return
 
-        if not check_internet_connection():
-            logger.error("No internet connection detected.")
+        if self.prestage_running():
             return
 
         self.progress_bar.setValue(0)
-        self.status_label.setText("Status: Downloading...")
+        self.status_label.setText("Status: Checking...")
         self.toggle_buttons(False)
 
-        self.download_worker = DownloadWorker(url, self.selected_folder, self.service_account_file)
-        self.download_worker.progress.connect(self.update_progress_bar)
-        self.download_worker.message.connect(lambda msg: logger.info(msg))
-        self.download_worker.finished_ok.connect(self.on_download_finished_ok)
-        self.download_worker.failed.connect(self.on_download_failed)
-        self.download_worker.start()
+        self.preflight_worker = PreflightWorker(url, self.selected_folder, self.service_account_file)
+        self.preflight_worker.finished_ok.connect(self.on_preflight_finished)
+        self.preflight_worker.start()
 
-    def on_download_finished_ok(self, file_path: str):
-        logger.info(f"Downloaded file: {file_path}")
-        self.progress_bar.setValue(0)
-        self.status_label.setText("Status: Extracting...")
+    def on_preflight_finished(self, result):
+        if not result.ok:
+            for check, error in result.errors.items():
+                logger.error(f"Preflight check failed ({check}): {error}")
+            self.status_label.setText("Status: Preflight failed.")
+            self.toggle_buttons(True)
+            return
 
-        self.extract_worker = ExtractWorker(
-            file_path=file_path,
+        url = self.preflight_worker.url
+        self.status_label.setText("Status: Downloading...")
+
+        worker_args = dict(
+            url=url,
             extract_folder=self.selected_folder,
+            service_account_file=self.service_account_file,
             ignored_files=self.ignored_files,
             ignored_folders=self.ignored_folders,
-            keep_in_main=self.keep_in_main
+            keep_in_main=self.keep_in_main,
+            use_store=self.store_checkbox.isChecked()
         )
+        if extract_folder_id(url):
+            self.extract_worker = FolderSyncWorker(**worker_args)
+        else:
+            # Метаданные архива уже получены проверкой — второй раз не спрашиваем.
+            # Скачать-потом-распаковать или поток решает StreamInstaller.can_stream
+            self.extract_worker = StreamInstallWorker(file_info=result.file_info, **worker_args)
         self.extract_worker.progress.connect(self.update_progress_bar)
+        self.extract_worker.status.connect(self.update_status)
         self.extract_worker.message.connect(lambda msg: logger.info(msg))
         self.extract_worker.finished_ok.connect(self.on_extract_finished_ok)
         self.extract_worker.failed.connect(self.on_extract_failed)
         self.extract_worker.start()
 
-    def on_download_failed(self, error_str: str):
-        logger.error(f"Download failed: {error_str}")
-        self.status_label.setText("Status: Download failed.")
-        self.toggle_buttons(True)
-
     def on_extract_finished_ok(self):
         logger.info("Extraction completed successfully.")
         self.status_label.setText("Status: Done")
@@ -556,12 +628,15 @@ class MinecraftInstallerUI(QtWidgets.QTabWidget):
         file_path, _ = QtWidgets.QFileDialog.getOpenFileName(
             self,
             "Select an archive to extract",
-            filter="Archives (*.zip *.tar *.tar.gz *.tgz *.rar)"
+            filter="Archives (*.zip *.tar *.tar.gz *.tgz *.tar.zst *.tzst *.rar)"
         )
         if not file_path:
             logger.error("No archive selected.")
             return
 
+        if self.prestage_running():
+            return
+
         self.progress_bar.setValue(0)
         self.status_label.setText("Status: Extracting...")
         self.toggle_buttons(False)
@@ -571,23 +646,161 @@ class MinecraftInstallerUI(QtWidgets.QTabWidget):
             extract_folder=self.selected_folder,
             ignored_files=self.ignored_files,
             ignored_folders=self.ignored_folders,
-            keep_in_main=self.keep_in_main
+            keep_in_main=self.keep_in_main,
+            use_store=self.store_checkbox.isChecked()
         )
         self.extract_worker.progress.connect(self.update_progress_bar)
+        self.extract_worker.status.connect(self.update_status)
         self.extract_worker.message.connect(lambda msg: logger.info(msg))
         self.extract_worker.finished_ok.connect(self.on_extract_finished_ok)
         self.extract_worker.failed.connect(self.on_extract_failed)
         self.extract_worker.start()
 
+    def make_stager(self, url: str = "") -> UpdateStager:
+        return UpdateStager(url, self.selected_folder, self.service_account_file, self.ignored_files,
+                            self.ignored_folders, self.keep_in_main,
+                            use_store=self.store_checkbox.isChecked())
+
+    def prestage_running(self) -> bool:
+        if self.prestage_worker is not None and self.prestage_worker.isRunning():
+            logger.warning("An update is being prepared in the background, try again when it is ready.")
+            return True
+        return False
+
+    def start_prestage(self):
+        url = self.url_input.text()
+        # Только архивы: папка Drive и так синхронизируется по изменениям
+        if not self.prestage_checkbox.isChecked() or not self.validate_url(url) or \
+                extract_folder_id(url) or not os.path.isdir(self.selected_folder):
+            return
+        # Не мешаем установке, запущенной вручную, и не запускаемся дважды
+        if not self.download_button.isEnabled() or \
+                (self.prestage_worker is not None and self.prestage_worker.isRunning()):
+            return
+
+        self.prestage_worker = PrestageWorker(self.make_stager(url))
+        self.prestage_worker.staged.connect(self.on_prestage_finished)
+        self.prestage_worker.failed.connect(lambda error_str: logger.error(f"Background update failed: {error_str}"))
+        self.prestage_worker.start()
+
+    def on_prestage_finished(self, name: str):
+        if name:
+            logger.info(f"Update {name} is ready, press Apply Update to install it.")
+        self.refresh_apply_button()
+
+    def refresh_apply_button(self):
+        staged = self.make_stager().staged_version() if os.path.isdir(self.selected_folder) else None
+        self.apply_button.setEnabled(bool(staged) and self.download_button.isEnabled())
+        self.apply_button.setText(f"Apply Update ({staged['name']})" if staged else "Apply Update")
+
+    def start_apply_update(self):
+        if not os.path.isdir(self.selected_folder) or self.prestage_running():
+            return
+
+        self.progress_bar.setValue(0)
+        self.status_label.setText("Status: Applying update...")
+        self.toggle_buttons(False)
+        self.extract_worker = ApplyUpdateWorker(self.make_stager(), self.ignored_files,
+                                                self.ignored_folders, self.keep_in_main)
+        self.extract_worker.progress.connect(self.update_progress_bar)
+        self.extract_worker.status.connect(self.update_status)
+        self.extract_worker.message.connect(lambda msg: logger.info(msg))
+        self.extract_worker.finished_ok.connect(self.on_extract_finished_ok)
+        self.extract_worker.failed.connect(self.on_extract_failed)
+        self.extract_worker.start()
+
+    def start_rollback(self):
+        if not os.path.isdir(self.selected_folder):
+            logger.error("Invalid folder selected.")
+            return
+
+        snapshots = SnapshotManager(self.selected_folder).list()
+        if not snapshots:
+            logger.error("No snapshots found in the selected folder.")
+            return
+        items = [f"{s['id']}  {s['label']}  ({s['files']} files)" for s in snapshots]
+        item, ok = QtWidgets.QInputDialog.getItem(
+            self, "Rollback", "Restore mods/ and configs/ from snapshot:", items, 0, False)
+        if not ok:
+            return
+
+        snapshot_id = snapshots[items.index(item)]["id"]
+        self.status_label.setText(f"Status: Restoring {snapshot_id}...")
+        self.toggle_buttons(False)
+        self.rollback_worker = RollbackWorker(self.selected_folder, snapshot_id)
+        self.rollback_worker.finished_ok.connect(self.on_rollback_finished_ok)
+        self.rollback_worker.failed.connect(self.on_rollback_failed)
+        self.rollback_worker.start()
+
+    def on_rollback_finished_ok(self, files: int):
+        logger.info(f"Rollback completed: {files} files restored.")
+        self.status_label.setText("Status: Rolled back")
+        self.toggle_buttons(True)
+
+    def on_rollback_failed(self, error_str: str):
+        logger.error(f"Rollback failed: {error_str}")
+        self.status_label.setText("Status: Rollback failed.")
+        self.toggle_buttons(True)
+
+    def start_verify(self, paths: Optional[List[str]] = None):
+        if not os.path.isdir(self.selected_folder) or self.prestage_running():
+            return
+
+        self.progress_bar.setValue(0)
+        self.status_label.setText("Status: Verifying..." if paths is None else "Status: Repairing...")
+        self.toggle_buttons(False)
+        self.verify_worker = VerifyWorker(self.selected_folder, self.service_account_file, paths)
+        self.verify_worker.progress.connect(self.update_progress_bar)
+        self.verify_worker.status.connect(self.update_status)
+        self.verify_worker.verified.connect(self.on_verify_finished)
+        self.verify_worker.repaired.connect(self.on_repair_finished)
+        self.verify_worker.failed.connect(self.on_verify_failed)
+        self.verify_worker.start()
+
+    def on_verify_finished(self, problems: list):
+        self.toggle_buttons(True)
+        if not problems:
+            logger.info("Verify: the folder matches the installed modpack.")
+            self.status_label.setText("Status: Verified")
+            return
+        for rel, problem in problems[:50]:
+            logger.warning(f"Verify: {problem}: {rel}")
+        if len(problems) > 50:
+            logger.warning(f"Verify: ... and {len(problems) - 50} more")
+        self.status_label.setText(f"Status: {len(problems)} files differ")
+        answer = QtWidgets.QMessageBox.question(
+            self, "Verify",
+            f"{len(problems)} files differ from the installed modpack.\n"
+            f"Restore them from the modpack archive?")
+        if answer == QtWidgets.QMessageBox.Yes:
+            self.start_verify([rel for rel, _ in problems])
+
+    def on_repair_finished(self, files: int):
+        logger.info(f"Repair completed: {files} files restored.")
+        self.status_label.setText("Status: Repaired")
+        self.toggle_buttons(True)
+
+    def on_verify_failed(self, error_str: str):
+        logger.error(f"Verify failed: {error_str}")
+        self.status_label.setText("Status: Verify failed.")
+        self.toggle_buttons(True)
+
     def toggle_buttons(self, enable: bool):
         self.url_input.setEnabled(enable)
         self.select_folder_button.setEnabled(enable)
         self.download_button.setEnabled(enable)
         self.extract_button.setEnabled(enable)
+        self.rollback_button.setEnabled(enable)
+        self.verify_button.setEnabled(enable)
+        self.store_checkbox.setEnabled(enable)
+        self.refresh_apply_button()
 
     def update_progress_bar(self, value: int):
         self.progress_bar.setValue(value)
 
+    def update_status(self, text: str):
+        self.status_label.setText(f"Status: {text}")
+
     def validate_url(self, url: str) -> bool:
         return url.startswith("https://") and "drive.google.com" in url
 
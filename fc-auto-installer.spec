@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('C:/Users/slovn/.json/fc-auto-installer-3b84891aacd2.json', '.')],
-    hiddenimports=[],
+    hiddenimports=['zstandard', 'rarfile'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,353 @@
+"""
+Headless-режим без Qt: скачиваем архив сборки один раз и параллельно
+ставим его в несколько папок Minecraft. Ссылка на папку Drive
+синхронизируется в каждую папку отдельно (качаются только изменения).
+
+    python fc_cli.py --url "https://drive.google.com/file/d/<id>/view" \
+        --target D:\\mc\\client1 --target D:\\mc\\client2
+
+    python fc_cli.py --archive modpack.zip --target /srv/mc/a /srv/mc/b
+
+    python fc_cli.py --url "https://drive.google.com/drive/folders/<id>" --target /srv/mc/a
+
+    python fc_cli.py --url "<ссылка на манифест .json>" --target /srv/mc/a  # сборка из нескольких архивов
+
+    python fc_cli.py --rollback --target /srv/mc/a  # вернуть mods/, configs/ из последнего снимка
+
+    python fc_cli.py --verify --target /srv/mc/a  # сверить папку с индексом установки
+    python fc_cli.py --verify --repair --target /srv/mc/a  # и вернуть несовпавшие файлы из архива
+
+    python fc_cli.py --archive modpack.zip --store --target /srv/mc/a /srv/mc/b  # jar один раз на диске
+    python fc_cli.py --store-gc  # убрать из хранилища файлы, на которые никто не ссылается
+
+    python fc_cli.py --url "<ссылка на архив>" --prestage --target /srv/mc/a  # по расписанию (cron)
+    python fc_cli.py --apply-staged --target /srv/mc/a  # поставить подготовленное за секунды
+
+    python fc_cli.py --archive modpack.zip --profile all --target /srv/mc/a  # cProfile + tracemalloc в отчёт
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from fc_installer_core import (
+    logger,
+    DELTA_INSTALL,
+    DIRECT_INSTALL,
+    DEFAULT_IGNORED_FILES,
+    DEFAULT_IGNORED_FOLDERS,
+    DEFAULT_KEEP_IN_MAIN,
+    PROFILE_ENV,
+    ArchiveCache,
+    ContentStore,
+    FolderSyncInstaller,
+    InstallIndex,
+    Installer,
+    MultiPartInstaller,
+    SnapshotManager,
+    UpdateStager,
+    archive_version,
+    default_service_account_file,
+    download_file,
+    extract_file_id,
+    extract_folder_id,
+    format_bytes,
+    format_duration,
+    get_drive_service,
+    get_file_info,
+    is_parts_manifest,
+)
+
+def download_once(url: str, service_account_file: str, use_cache: bool, save_folder: str) -> Tuple[str, dict]:
+    """
+    Качаем архив; возвращаем путь к нему и его источник на Drive (file_id и
+    версия) — по нему индекс установки достанет архив для --repair, когда
+    временной копии уже не будет.
+    """
+    service = get_drive_service(service_account_file)
+    file_id = extract_file_id(url)
+    file_info = get_file_info(service, file_id)
+    archive_path = download_file(
+        service=service,
+        file_id=file_id,
+        save_folder=save_folder,
+        progress_callback=lambda value: None,
+        cache=ArchiveCache() if use_cache else None,
+        file_info=file_info,
+        status_callback=lambda text: logger.debug(text)
+    )
+    return archive_path, dict(archive_version(file_info), file_id=file_id)
+
+def install_targets(archive_path: str,
+                    targets: List[str],
+                    jobs: int,
+                    direct_install: bool = DIRECT_INSTALL,
+                    delta_install: bool = DELTA_INSTALL,
+                    folder_url: Optional[str] = None,
+                    service_account_file: str = "",
+                    use_store: bool = False,
+                    store_dir: Optional[str] = None,
+                    use_cache: bool = True,
+                    drive_source: Optional[dict] = None) -> List[dict]:
+    """
+    Ставим один архив (или синхронизируем папку Drive folder_url) во все
+    targets параллельно; ошибка в одной папке не останавливает остальные.
+    Если archive_path — манифест сборки из частей, каждая папка получает
+    свои изменившиеся части (общие качаются в кэш один раз).
+    drive_source — откуда архив на Drive (см. download_once), для индекса.
+    Возвращает отчёт по каждой папке.
+    """
+    def install_one(target: str) -> dict:
+        started = time.monotonic()
+        report = {"target": target, "ok": False, "seconds": 0.0, "error": ""}
+        try:
+            if not os.path.isdir(target):
+                raise FileNotFoundError(f"Target folder not found: {target}")
+            callbacks = dict(
+                status_callback=lambda text: logger.debug(f"[{target}] {text}"),
+                message_callback=lambda text: logger.info(f"[{target}] {text}")
+            )
+            if folder_url:
+                installer = FolderSyncInstaller(
+                    folder_url, target, service_account_file, list(DEFAULT_IGNORED_FILES),
+                    list(DEFAULT_IGNORED_FOLDERS), list(DEFAULT_KEEP_IN_MAIN),
+                    use_store=use_store, store_dir=store_dir, **callbacks)
+            elif is_parts_manifest(archive_path):
+                installer = MultiPartInstaller(
+                    archive_path, target, service_account_file, list(DEFAULT_IGNORED_FILES),
+                    list(DEFAULT_IGNORED_FOLDERS), list(DEFAULT_KEEP_IN_MAIN), use_cache,
+                    delta_install=delta_install, use_store=use_store, store_dir=store_dir, **callbacks)
+            else:
+                installer = Installer(
+                    file_path=archive_path,
+                    extract_folder=target,
+                    ignored_files=list(DEFAULT_IGNORED_FILES),
+                    ignored_folders=list(DEFAULT_IGNORED_FOLDERS),
+                    keep_in_main=list(DEFAULT_KEEP_IN_MAIN),
+                    direct_install=direct_install,
+                    delta_install=delta_install,
+                    use_store=use_store,
+                    store_dir=store_dir,
+                    **callbacks
+                )
+                if drive_source:
+                    installer.drive_source = dict(drive_source)
+            installer.custom_install_process()
+            report["ok"] = True
+        except Exception as e:
+            report["error"] = str(e)
+            logger.error(f"[{target}] Installation failed: {e}")
+        report["seconds"] = time.monotonic() - started
+        return report
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        return list(pool.map(install_one, targets))
+
+def print_summary(archive_path: str, results: List[dict]):
+    if os.path.isfile(archive_path):
+        print(f"\nArchive: {archive_path} ({format_bytes(os.path.getsize(archive_path))})")
+    else:
+        print(f"\nDrive folder: {archive_path}")
+    width = max(len(r["target"]) for r in results)
+    for r in results:
+        state = "OK    " if r["ok"] else "FAILED"
+        line = f"  {state} {r['target']:<{width}}  {format_duration(r['seconds'])}"
+        if r["error"]:
+            line += f"  {r['error']}"
+        print(line)
+    failed = sum(1 for r in results if not r["ok"])
+    print(f"{len(results) - failed} of {len(results)} targets updated.")
+
+def rollback_targets(targets: List[str], snapshot_id: str) -> int:
+    failed = 0
+    for target in targets:
+        try:
+            files = SnapshotManager(target).restore(snapshot_id)
+            InstallIndex(target).forget()
+            print(f"  OK     {target}  {files} files restored")
+        except Exception as e:
+            failed += 1
+            print(f"  FAILED {target}  {e}")
+    return 1 if failed else 0
+
+def verify_targets(targets: List[str], args) -> int:
+    """
+    Сверка каждой папки с её индексом установки; с --repair несовпавшие
+    файлы достаются из архива. Код 1, если что-то осталось не так.
+    """
+    failed = 0
+    for target in targets:
+        try:
+            index = InstallIndex(target)
+            problems = index.verify(quick=args.quick)
+            for rel, problem in problems:
+                logger.info(f"[{target}] {problem}: {rel}")
+            if problems and args.repair:
+                repaired = index.repair([rel for rel, _ in problems], args.service_account,
+                                        status_callback=lambda text: logger.debug(f"[{target}] {text}"),
+                                        store_dir=args.store_dir)
+                problems = index.verify(quick=args.quick)
+                print(f"  {'OK    ' if not problems else 'FAILED'} {target}  {repaired} files repaired"
+                      + (f", {len(problems)} still differ" if problems else ""))
+            else:
+                print(f"  {'OK    ' if not problems else 'FAILED'} {target}  "
+                      + (f"{len(problems)} files differ from the modpack" if problems else "matches the modpack"))
+            failed += bool(problems)
+        except Exception as e:
+            failed += 1
+            print(f"  FAILED {target}  {e}")
+    return 1 if failed else 0
+
+def stager_for(url: str, target: str, args) -> UpdateStager:
+    return UpdateStager(url, target, args.service_account, list(DEFAULT_IGNORED_FILES),
+                        list(DEFAULT_IGNORED_FOLDERS), list(DEFAULT_KEEP_IN_MAIN),
+                        use_store=args.store or bool(args.store_dir), store_dir=args.store_dir)
+
+def prestage_targets(url: str, targets: List[str], args) -> int:
+    failed = 0
+    for target in targets:
+        try:
+            state = stager_for(url, target, args).stage()
+            print(f"  OK     {target}  " + (f"{state['name']} ready to apply" if state else "up to date"))
+        except Exception as e:
+            failed += 1
+            print(f"  FAILED {target}  {e}")
+    return 1 if failed else 0
+
+def apply_staged_targets(targets: List[str], args) -> int:
+    failed = 0
+    for target in targets:
+        try:
+            state = stager_for("", target, args).apply()
+            print(f"  OK     {target}  {state['name']} applied")
+        except Exception as e:
+            failed += 1
+            print(f"  FAILED {target}  {e}")
+    return 1 if failed else 0
+
+def list_snapshots(targets: List[str]):
+    for target in targets:
+        print(f"{target}:")
+        for meta in SnapshotManager(target).list():
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(meta["created"]))
+            print(f"  {meta['id']}  {created}  {meta['files']} files  {meta['label']}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="fc_cli",
+        description="Update one or more Minecraft instances without the GUI."
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--url", help="Google Drive link to the modpack archive or unpacked folder")
+    source.add_argument("--archive", help="Local archive to install instead of downloading")
+    source.add_argument("--rollback", nargs="?", const="latest", metavar="SNAPSHOT",
+                        help="Restore mods/ and configs/ from a snapshot (default: the latest)")
+    source.add_argument("--list-snapshots", action="store_true",
+                        help="List the snapshots kept in each target")
+    source.add_argument("--store-gc", action="store_true",
+                        help="Delete content store files no target links to any more")
+    source.add_argument("--apply-staged", action="store_true",
+                        help="Install the update prepared earlier with --prestage")
+    source.add_argument("--verify", action="store_true",
+                        help="Check each target against the index written by the last install")
+    parser.add_argument("--target", "-t", nargs="+", action="extend", default=[],
+                        help="Minecraft folder (main) to update; may be repeated")
+    parser.add_argument("--service-account", default=default_service_account_file(),
+                        help="Service account JSON key for Google Drive")
+    parser.add_argument("--jobs", "-j", type=int, default=4,
+                        help="How many targets to install at the same time (default: 4)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not use or fill the local archive cache")
+    parser.add_argument("--staging", action="store_true",
+                        help="Extract through <target>/tmp instead of writing straight into the target")
+    parser.add_argument("--full", action="store_true",
+                        help="Rewrite every file instead of only new or changed ones")
+    parser.add_argument("--store", action="store_true",
+                        help="Keep jars in a shared content store and hardlink them into each target")
+    parser.add_argument("--store-dir",
+                        help="Content store folder (default: in the app data folder); "
+                             "must be on the same drive as the targets")
+    parser.add_argument("--prestage", action="store_true",
+                        help="With --url: only download and unpack a new version into "
+                             "<target>/.fc-staged at low I/O priority (see --apply-staged)")
+    parser.add_argument("--repair", action="store_true",
+                        help="With --verify: restore files that differ from the modpack archive")
+    parser.add_argument("--quick", action="store_true",
+                        help="With --verify: only reread files whose size or modification time changed")
+    parser.add_argument("--profile", nargs="?", const="cpu", choices=["cpu", "mem", "all"],
+                        help="Profile each run (cProfile, tracemalloc) and add the results "
+                             "to its report in the app data folder (same as FC_PROFILE=...)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Print progress details")
+    args = parser.parse_args(argv)
+    if not args.target and not args.store_gc:
+        parser.error("the following arguments are required: --target/-t")
+    if args.prestage and (not args.url or extract_folder_id(args.url)):
+        parser.error("--prestage needs --url with a link to an archive")
+    if args.repair and not args.verify:
+        parser.error("--repair needs --verify")
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    if args.profile:
+        os.environ[PROFILE_ENV] = args.profile
+
+    targets = [os.path.abspath(t) for t in dict.fromkeys(args.target)]
+    if args.store_gc:
+        removed, freed = ContentStore(args.store_dir).gc()
+        print(f"Content store: removed {removed} files, freed {format_bytes(freed)}")
+        return 0
+    if args.list_snapshots:
+        list_snapshots(targets)
+        return 0
+    if args.rollback:
+        return rollback_targets(targets, args.rollback)
+    if args.apply_staged:
+        return apply_staged_targets(targets, args)
+    if args.verify:
+        return verify_targets(targets, args)
+    if args.prestage:
+        return prestage_targets(args.url, targets, args)
+
+    with tempfile.TemporaryDirectory(prefix="fc-auto-installer-") as download_dir:
+        drive_source = None
+        if args.archive:
+            archive_path = args.archive
+        elif extract_folder_id(args.url):
+            results = install_targets(args.url, targets, args.jobs, folder_url=args.url,
+                                      service_account_file=args.service_account,
+                                      use_store=args.store or bool(args.store_dir),
+                                      store_dir=args.store_dir)
+            print_summary(args.url, results)
+            return 0 if all(r["ok"] for r in results) else 1
+        else:
+            try:
+                archive_path, drive_source = download_once(args.url, args.service_account,
+                                                           not args.no_cache, download_dir)
+            except Exception as e:
+                logger.error(f"Download failed: {e}")
+                return 2
+            logger.info(f"Downloaded file: {archive_path}")
+
+        results = install_targets(archive_path, targets, args.jobs,
+                                  direct_install=not args.staging,
+                                  delta_install=not args.full,
+                                  service_account_file=args.service_account,
+                                  use_store=args.store or bool(args.store_dir),
+                                  store_dir=args.store_dir,
+                                  use_cache=not args.no_cache,
+                                  drive_source=drive_source)
+        print_summary(archive_path, results)
+    return 0 if all(r["ok"] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3828 @@
+"""
+Логика установки сборки без GUI: закачка с Google Drive, кэш архивов,
+распаковка и перенос .minecraft в папку игры. Используется и окном
+(fc-auto-installer.py), и headless-режимом (fc_cli.py), поэтому здесь нет Qt.
+"""
+import io
+import os
+import re
+import sys
+import json
+import errno
+import hashlib
+import time
+import random
+import queue
+import shutil
+import socket
+import tempfile
+import importlib
+import contextlib
+import zlib
+import zipfile
+import tarfile
+import fnmatch
+import sqlite3
+import logging
+import threading
+import collections
+import logging.handlers
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, List, Tuple, NamedTuple
+
+# Клиент Google (googleapiclient, google.auth, httplib2) импортируется лениво,
+# при первом обращении к Drive: это заметная часть времени запуска окна.
+
+# ==================== Константы / Настройки ====================
+
+APP_NAME = "fc-auto-installer"
+SERVICE_ACCOUNT_FILE_NAME = "fc-auto-installer-3b84891aacd2.json"
+
+logger = logging.getLogger(APP_NAME)
+logger.setLevel(logging.INFO)
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.zst", ".tzst", ".rar")
+MODS_FOLDERS = ["mods", "configs"]  # Папки, которые удаляем из main
+MC_FILES_TO_REMOVE = ["options.txt", "server.dat"]  # Файлы, удаляемые в tmp/.minecraft, ЕСЛИ есть такие же в main
+DEFAULT_IGNORED_FILES = ["options.txt", "servers.dat"]
+DEFAULT_IGNORED_FOLDERS = ["logs"]
+DEFAULT_KEEP_IN_MAIN = ["saves", "xaero", "distant_horizons_server_data"]
+MC_ROOT = ".minecraft"  # Корневая папка сборки внутри архива
+DIRECT_INSTALL = True  # Писать .minecraft/ сразу в main, без промежуточной копии в tmp
+DELTA_INSTALL = True  # Писать только новые/изменённые файлы, а из mods/, configs/ удалять лишь лишнее
+COPY_BUFFER_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 0.1  # Не чаще 10 сигналов прогресса в секунду
+EXTRACT_WORKERS = max(1, min(16, os.cpu_count() or 1))  # Потоки распаковки ZIP
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024  # Размер одного Range-запроса к Drive
+DOWNLOAD_RETRIES = 5  # Повторы одного куска при сетевых/5xx ошибках
+DOWNLOAD_SEGMENTS = 4  # Сколько кусков файла качаем параллельно
+SEGMENT_RETRIES = 3  # Повторы целого сегмента (на новом соединении)
+MD5_REORDER_BYTES = 64 * 1024 * 1024  # Сколько опередивших кусков держим в памяти до хеширования
+HTTP_TIMEOUT = 60
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+STREAM_TAR_INSTALL = True  # Для .tar/.tar.gz/.tgz распаковывать прямо во время закачки (только без DIRECT/DELTA_INSTALL)
+TAR_STREAM_EXTENSIONS = (".tar", ".tar.gz", ".tgz")
+STREAM_CHUNK_SIZE = 4 * 1024 * 1024  # Кусок закачки в потоковом режиме
+STREAM_QUEUE_CHUNKS = 8  # Сколько кусков может ждать распаковщика (ограничивает память)
+USE_ARCHIVE_CACHE = True  # Хранить скачанные архивы и не качать их повторно
+ARCHIVE_CACHE_MAX_BYTES = 20 * 1024 ** 3  # Предел размера кэша архивов (LRU)
+PART_SUFFIX = ".part"  # Недокачанный файл
+PART_STATE_SUFFIX = ".part.json"  # Состояние докачки рядом с .part
+SNAPSHOT_BEFORE_INSTALL = True  # Перед установкой сохранять снимок mods/, configs/
+SNAPSHOT_LINK_PATTERNS = ["*.jar"]  # В снимке — жёсткими ссылками (jar на месте не переписывают), прочее копируем
+SNAPSHOTS_DIR_NAME = ".fc-snapshots"  # Папка снимков внутри main (та же ФС — ссылки возможны)
+SNAPSHOT_KEEP = 5  # Сколько последних снимков храним
+USE_CONTENT_STORE = False  # Общее для всех папок игры хранилище jar: файл на диске один, в папках — ссылки
+CONTENT_STORE_PATTERNS = ["*.jar", "*.zip"]  # Что кладём в хранилище (игра не меняет эти файлы на месте)
+SYNC_WORKERS = 8  # Сколько файлов папки Drive качаем одновременно
+SYNC_MANIFEST_NAME = ".fc-sync.json"  # Манифест синхронизации в папке main
+DRIVE_FOLDER_MIME = "application/vnd.google-apps.folder"
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024  # Размер одного файла лога до ротации
+LOG_FILE_BACKUPS = 3
+STAGING_DIR_NAME = ".fc-staged"  # Заранее распакованное обновление внутри main
+INSTALLED_STATE_NAME = ".fc-installed.json"  # Какая версия архива стоит в main
+MANIFEST_EXTENSION = ".json"  # Ссылка на такой файл — манифест сборки из нескольких архивов
+PARTS_STATE_NAME = ".fc-parts.json"  # Какие версии частей сборки стоят в main и их файлы
+PART_DOWNLOADS = 3  # Сколько частей сборки качаем одновременно
+INDEX_FILE_NAME = ".fc-index.sqlite"  # Индекс установленных файлов в main (для Verify)
+PRESTAGE_INTERVAL = 30 * 60  # Как часто (сек) фоновый режим проверяет архив на Drive
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "amd64": 251, "i386": 289, "i686": 289,
+                       "aarch64": 30, "arm64": 30}  # ioprio_set в Linux; ioprio_get — следующий номер
+RUN_REPORTS = True  # Писать JSON-отчёт о фазах каждого запуска в app_data_dir("reports")
+RUN_REPORTS_KEEP = 50  # Сколько последних отчётов храним
+PROFILE_ENV = "FC_PROFILE"  # cpu / mem / all — профилировать запуск (cProfile / tracemalloc)
+PROFILE_TOP = 30  # Сколько строк профиля попадает в отчёт
+CONNECTIVITY_PROBE = ("8.8.8.8", 53)  # Куда стучимся, проверяя наличие сети
+CONNECTIVITY_TIMEOUT = 5
+PREFLIGHT_SPACE_FACTOR = 2.0  # Места в main нужно: размер архива × множитель (архив + распакованное)
+
+# ==================== Телеметрия ====================
+
+class RunReport:
+    """
+    Отчёт об одном запуске (закачка, установка, синхронизация): время,
+    байты и число файлов каждой фазы. Сохраняется JSON-файлом в
+    app_data_dir("reports") — по нему видно, на что уходит время на
+    машине пользователя, а не только в бенчмарке.
+    """
+    def __init__(self, kind: str, **meta):
+        self.kind = kind
+        self.meta = meta
+        self.phases = []
+        self.profile = {}
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, **counters):
+        """
+        Замер фазы; в отданный словарь можно дописать bytes, files и т.п.
+        """
+        started = time.perf_counter()
+        entry = dict(name=name, start=round(started - self.started, 4), **counters)
+        try:
+            yield entry
+        finally:
+            entry["seconds"] = round(time.perf_counter() - started, 4)
+            self.phases.append(entry)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{entry['name']} {entry['seconds']:.1f}s" for entry in self.phases)
+        return f"{self.kind.capitalize()} took {self.elapsed():.1f}s" + (f" ({phases})" if phases else "")
+
+    def to_dict(self, error: Optional[BaseException] = None) -> dict:
+        phases = []
+        for entry in self.phases:
+            entry = dict(entry)
+            if entry.get("bytes") and entry["seconds"] > 0:
+                entry["bytes_per_second"] = round(entry["bytes"] / entry["seconds"])
+            phases.append(entry)
+        return {
+            "kind": self.kind,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "seconds": round(self.elapsed(), 4),
+            "ok": error is None,
+            "error": f"{type(error).__name__}: {error}" if error is not None else None,
+            "meta": self.meta,
+            "system": {"platform": sys.platform, "python": sys.version.split()[0], "cpus": os.cpu_count()},
+            "phases": phases,
+            "profile": self.profile or None,
+        }
+
+class RunProfiler:
+    """
+    Профилирование запуска, включается переменной окружения FC_PROFILE:
+    cpu — cProfile (поток запуска и потоки, созданные во время него),
+    mem — tracemalloc (пик и крупнейшие места выделения памяти), all — оба.
+    """
+    _tracemalloc_lock = threading.Lock()
+    _tracemalloc_users = 0  # tracemalloc общий на процесс, а запусков может быть несколько
+
+    def __init__(self, mode: str):
+        self.cpu = mode in ("1", "cpu", "all")
+        self.mem = mode in ("mem", "all")
+        self.profiler = None
+        self.thread_profilers = []
+        self.stats = None
+
+    def start(self):
+        if self.cpu:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Python 3.12+: параллельный запуск (CLI, несколько папок) уже профилируется
+                logger.warning("Another run is already being profiled, skipping cProfile for this one")
+                self.cpu = False
+            else:
+                threading.setprofile(self._profile_thread)
+        if self.mem:
+            import tracemalloc
+            with RunProfiler._tracemalloc_lock:
+                if not RunProfiler._tracemalloc_users and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                RunProfiler._tracemalloc_users += 1
+
+    def _profile_thread(self, *_):
+        # Первое событие в новом потоке (пул распаковки, закачки): включаем в нём свой cProfile
+        import cProfile
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return  # Python 3.12+: профилировщик один на процесс и уже видит все потоки
+        self.thread_profilers.append(profiler)
+
+    def stop(self) -> dict:
+        result = {}
+        if self.cpu:
+            self.profiler.disable()
+            threading.setprofile(None)
+            import pstats
+            self.stats = pstats.Stats(self.profiler)
+            for profiler in self.thread_profilers:
+                self.stats.add(profiler)
+            rows = sorted(self.stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+            result["cpu"] = [{"function": f"{file}:{line}({func})", "calls": calls,
+                              "tottime": round(tottime, 4), "cumtime": round(cumtime, 4)}
+                             for (file, line, func), (_, calls, tottime, cumtime, _) in rows[:PROFILE_TOP]]
+        if self.mem:
+            import tracemalloc
+            with RunProfiler._tracemalloc_lock:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                RunProfiler._tracemalloc_users -= 1
+                if not RunProfiler._tracemalloc_users:
+                    tracemalloc.stop()
+            result["memory"] = {
+                "peak_bytes": peak,
+                "top": [{"where": str(stat.traceback[0]), "bytes": stat.size, "count": stat.count}
+                        for stat in snapshot.statistics("lineno")[:PROFILE_TOP]],
+            }
+        return result
+
+_telemetry = threading.local()
+
+def current_report() -> Optional[RunReport]:
+    return getattr(_telemetry, "report", None)
+
+def annotate_run(**meta):
+    report = current_report()
+    if report is not None:
+        report.meta.update(meta)
+
+@contextlib.contextmanager
+def report_to(report: Optional[RunReport]):
+    """
+    Фазы этого потока (например, из пула) пишем в отчёт запуска другого потока.
+    """
+    previous = current_report()
+    _telemetry.report = report
+    try:
+        yield
+    finally:
+        _telemetry.report = previous
+
+@contextlib.contextmanager
+def run_phase(name: str, **counters):
+    """
+    Фаза текущего запуска этого потока; вне запуска — ничего не пишет.
+    """
+    report = current_report()
+    if report is None:
+        yield dict(counters)
+        return
+    with report.phase(name, **counters) as entry:
+        yield entry
+
+@contextlib.contextmanager
+def telemetry_run(kind: str, **meta):
+    """
+    Запуск с отчётом RunReport (работает и как декоратор). Вложенный
+    запуск в том же потоке (StreamInstaller → Installer, установка →
+    download_file) пишет фазы в уже открытый отчёт.
+    """
+    report = current_report()
+    if report is not None:
+        report.meta.update(meta)
+        yield report
+        return
+    report = RunReport(kind, **meta)
+    mode = os.environ.get(PROFILE_ENV, "").strip().lower()
+    profiler = RunProfiler(mode) if mode else None
+    if profiler is not None:
+        profiler.start()
+    _telemetry.report = report
+    error = None
+    try:
+        yield report
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _telemetry.report = None
+        if profiler is not None:
+            report.profile = profiler.stop()
+        logger.info(report.summary())
+        if RUN_REPORTS or profiler is not None:
+            save_run_report(report, error, profiler)
+
+def save_run_report(report: RunReport, error: Optional[BaseException],
+                    profiler: Optional[RunProfiler] = None) -> Optional[str]:
+    try:
+        reports_dir = app_data_dir("reports")
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(report.started_at))
+        fd, path_ = tempfile.mkstemp(prefix=f"{stamp}-{re.sub(r'[^a-z0-9]+', '-', report.kind)}-",
+                                     suffix=".json", dir=reports_dir)
+        if profiler is not None and profiler.stats is not None:
+            report.profile["cpu_file"] = path_[:-len(".json")] + ".prof"
+            profiler.stats.dump_stats(report.profile["cpu_file"])
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(error), f, indent=1)
+    except OSError as e:
+        logger.warning(f"Could not write run report: {e}")
+        return None
+    if profiler is not None:
+        logger.info(f"Profile of the run written to {path_}")
+
+    reports = sorted(name for name in os.listdir(reports_dir) if name.endswith(".json"))
+    for name in reports[:-RUN_REPORTS_KEEP]:
+        for old in (name, name[:-len(".json")] + ".prof"):
+            try:
+                os.remove(os.path.join(reports_dir, old))
+            except OSError:
+                pass
+    return path_
+
+# ==================== Вспомогательные функции ====================
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+class ProgressTracker:
+    """
+    Общий движок прогресса для закачки, распаковки и копирования: считает
+    байты (а не файлы), отдаёт процент не чаще PROGRESS_INTERVAL и пишет
+    в статус текущую скорость и оставшееся время. Потокобезопасен.
+    """
+    def __init__(self,
+                 phase: str,
+                 total_bytes: int,
+                 progress_callback: Callable[[int], None],
+                 status_callback: Optional[Callable[[str], None]] = None,
+                 done_bytes: int = 0,
+                 interval: float = PROGRESS_INTERVAL):
+        self.phase = phase
+        self.total = total_bytes
+        self.done = done_bytes
+        self.progress_callback = progress_callback
+        self.status_callback = status_callback
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last_emit = 0.0
+        self._last_done = done_bytes
+        self._rate = 0.0
+        self._percent = -1
+
+    def add(self, size: int):
+        with self._lock:
+            self.done += size
+            self._emit(force=False)
+
+    def finish(self):
+        with self._lock:
+            self.done = max(self.done, self.total)
+            self._emit(force=True)
+
+    def _emit(self, force: bool):
+        now = time.monotonic()
+        elapsed = now - self._last_emit
+        if not force and elapsed < self.interval:
+            return
+        if self._last_emit and elapsed > 0:
+            # Сглаженная текущая скорость, а не средняя за всю фазу
+            current = (self.done - self._last_done) / elapsed
+            self._rate = current if not self._rate else 0.3 * current + 0.7 * self._rate
+        self._last_emit, self._last_done = now, self.done
+
+        percent = min(100, int(self.done / self.total * 100)) if self.total else 100
+        if percent != self._percent:
+            self._percent = percent
+            self.progress_callback(percent)
+        if self.status_callback:
+            text = f"{self.phase}: {format_bytes(self.done)} / {format_bytes(self.total)}"
+            if self._rate > 0 and self.done < self.total:
+                eta = (self.total - self.done) / self._rate
+                text += f", {format_bytes(self._rate)}/s, ETA {format_duration(eta)}"
+            self.status_callback(text)
+
+def default_service_account_file() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), SERVICE_ACCOUNT_FILE_NAME)
+
+def check_internet_connection() -> bool:
+    try:
+        socket.create_connection(CONNECTIVITY_PROBE, timeout=CONNECTIVITY_TIMEOUT).close()
+        return True
+    except OSError:
+        return False
+
+def extract_file_id(url: str) -> str:
+    if "drive.google.com" in url and "/file/d/" in url:
+        return url.split("/file/d/")[-1].split("/")[0]
+    elif "id=" in url:
+        return url.split("id=")[-1].split("&")[0]
+    else:
+        raise ValueError("Invalid Google Drive URL format.")
+
+def extract_folder_id(url: str) -> Optional[str]:
+    """
+    ID папки из ссылки вида https://drive.google.com/drive/folders/<id>
+    (None — ссылка не на папку).
+    """
+    if "drive.google.com" in url and "/folders/" in url:
+        return url.split("/folders/")[-1].split("/")[0].split("?")[0]
+    return None
+
+def safe_relpath(member_name: str) -> Optional[str]:
+    """
+    Нормализованный относительный путь члена архива (None — если он пустой
+    или пытается выйти за пределы папки через '..' / абсолютный путь).
+    """
+    name = member_name.replace("\\", "/")
+    while name.startswith("./"):
+        name = name[2:]
+    rel = name.strip("/")
+    if not rel or name.startswith("/"):
+        return None
+    parts = rel.split("/")
+    if any(part in ("", ".", "..") for part in parts) or ":" in parts[0]:
+        return None
+    return os.path.join(*parts)
+
+def minecraft_relpath(member_name: str) -> Optional[str]:
+    """
+    Путь члена архива относительно .minecraft/ (None — если он вне .minecraft).
+    """
+    name = member_name.replace("\\", "/")
+    while name.startswith("./"):
+        name = name[2:]
+    prefix = MC_ROOT + "/"
+    if not name.startswith(prefix):
+        return None
+    return safe_relpath(name[len(prefix):])
+
+class IntegrityError(IOError):
+    """
+    Скачанный файл или член архива повреждён: MD5, CRC или размер не совпали.
+    """
+
+def check_md5(actual: str, expected: Optional[str], name: str):
+    # У части файлов Drive (документы Google) md5Checksum нет — сверять не с чем
+    if expected and actual != expected:
+        raise IntegrityError(f"{name} is corrupted: MD5 {actual} does not match {expected} from Drive.")
+
+def write_file_atomic(src, dst_path: str, on_bytes: Optional[Callable[[int], None]] = None,
+                      size: Optional[int] = None, crc: Optional[int] = None, digest=None) -> int:
+    """
+    Пишем поток src во временный файл рядом с dst_path и атомарно подменяем его.
+    on_bytes получает размер каждого записанного куска. Если заданы size/crc,
+    сверяем их по ходу записи: при несовпадении dst_path не трогаем.
+    digest (объект hashlib) обновляется записанными данными.
+    Возвращает CRC32 записанного (для индекса установки, если его нет в архиве).
+    """
+    tmp_path = dst_path + ".fcpart"
+    written, checksum = 0, 0
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = src.read(COPY_BUFFER_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+                checksum = zlib.crc32(chunk, checksum)
+                if digest is not None:
+                    digest.update(chunk)
+                if on_bytes:
+                    on_bytes(len(chunk))
+        if size is not None and written != size:
+            raise IntegrityError(f"got {written} bytes instead of {size}")
+        if crc is not None and checksum != crc:
+            raise IntegrityError(f"CRC32 {checksum:08x} instead of {crc:08x}")
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return checksum
+
+class ChainedReader:
+    """
+    Файлоподобный объект (только read) поверх нескольких источников подряд:
+    пар (объект с read, сколько байт взять или None — до конца). Исчерпанный
+    источник закрывается.
+    """
+    def __init__(self, *parts):
+        self.parts = list(parts)
+
+    def read(self, size: int = COPY_BUFFER_SIZE) -> bytes:
+        while self.parts:
+            src, left = self.parts[0]
+            data = src.read(size if left is None else min(size, left)) if left != 0 else b""
+            if data:
+                if left is not None:
+                    self.parts[0] = (src, left - len(data))
+                return data
+            self.parts.pop(0)
+            src.close()
+        return b""
+
+def write_file_if_changed(src, dst_path: str, on_bytes: Optional[Callable[[int], None]] = None,
+                          size: Optional[int] = None, crc: Optional[int] = None) -> Tuple[int, bool]:
+    """
+    write_file_atomic для файла, который, возможно, уже совпадает с членом
+    архива (tar: сверить заранее не по чему). Поток src сверяем с dst_path
+    по ходу чтения: совпавший файл не переписываем, а при первом
+    расхождении пишем новую версию — уже сверенное начало берём из старого
+    файла, так что член архива читается один раз.
+    Возвращает (CRC32 данных, переписан ли файл).
+    """
+    try:
+        old = open(dst_path, "rb")
+    except OSError:
+        old = None
+    if old is not None and size is not None and os.fstat(old.fileno()).st_size != size:
+        old.close()
+        old = None
+    if old is None:
+        return write_file_atomic(src, dst_path, on_bytes, size, crc), True
+
+    with old:
+        same, checksum = 0, 0
+        while True:
+            chunk = src.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            if old.read(len(chunk)) != chunk:
+                # Старый файл закроется, как только из него дочитают начало, — до os.replace
+                old.seek(0)
+                rest = ChainedReader((old, same), (io.BytesIO(chunk), None), (src, None))
+                return write_file_atomic(rest, dst_path, on_bytes, size, crc), True
+            same += len(chunk)
+            checksum = zlib.crc32(chunk, checksum)
+        if old.read(1):
+            # Член архива короче файла: пишем его (и ловим обрыв по размеру)
+            old.seek(0)
+            return write_file_atomic(ChainedReader((old, same)), dst_path, on_bytes, size, crc), True
+    if crc is not None and checksum != crc:
+        raise IntegrityError(f"CRC32 {checksum:08x} instead of {crc:08x}")
+    if on_bytes:
+        on_bytes(same)
+    return checksum, False
+
+def copy_file_fast(src_path: str, dst_path: str):
+    """
+    Копия между разными устройствами: сначала reflink (FICLONE — Btrfs/XFS),
+    затем copy_file_range в ядре, и только потом обычное копирование.
+    Пишем во временный файл и подменяем dst_path атомарно.
+    """
+    tmp_path = dst_path + ".fcpart"
+    try:
+        with open(src_path, "rb") as src, open(tmp_path, "wb") as dst:
+            try:
+                import fcntl
+                fcntl.ioctl(dst.fileno(), 0x40049409, src.fileno())  # FICLONE
+            except (ImportError, OSError):
+                size = os.fstat(src.fileno()).st_size
+                copied = 0
+                try:
+                    while copied < size:
+                        sent = os.copy_file_range(src.fileno(), dst.fileno(), size - copied)
+                        if not sent:
+                            break
+                        copied += sent
+                except (AttributeError, OSError):
+                    copied = 0
+                if copied < size:
+                    src.seek(0)
+                    dst.seek(0)
+                    dst.truncate()
+                    shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+        shutil.copystat(src_path, tmp_path)
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def place_tree(src_root: str, dst_root: str, on_file: Optional[Callable[[str], None]] = None) -> int:
+    """
+    Переносим содержимое src_root в dst_root с заменой: папки сливаются,
+    файлы переезжают через os.replace (без копирования данных). Копируем
+    (copy_file_fast) только если src и dst на разных устройствах.
+    on_file получает путь каждого перенесённого файла (до переноса).
+    Возвращает число файлов.
+    """
+    placed = 0
+    for root, dirs, files in os.walk(src_root):
+        target_root = os.path.join(dst_root, os.path.relpath(root, src_root))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            src = os.path.join(root, name)
+            dst = os.path.join(target_root, name)
+            if on_file:
+                on_file(src)
+            try:
+                os.replace(src, dst)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                copy_file_fast(src, dst)
+                os.remove(src)
+            placed += 1
+    return placed
+
+def link_tree(src_root: str, dst_root: str, link_patterns: Optional[List[str]] = None) -> int:
+    """
+    Повторяем дерево src_root в dst_root жёсткими ссылками (данные не
+    копируются). Где ссылки невозможны (FAT/exFAT, другое устройство) —
+    копируем. Если задан link_patterns, ссылками ставятся только подходящие
+    по имени файлы, остальные копируются (copy_file_fast: reflink, где ФС
+    умеет). Возвращает число файлов.
+    """
+    linked = 0
+    for root, _, files in os.walk(src_root):
+        target_root = os.path.join(dst_root, os.path.relpath(root, src_root))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            link_or_copy(os.path.join(root, name), os.path.join(target_root, name), link_patterns)
+            linked += 1
+    return linked
+
+def link_or_copy(src: str, dst: str, link_patterns: Optional[List[str]] = None):
+    """
+    Один файл для link_tree: жёсткая ссылка, если имя подходит под
+    link_patterns (или они не заданы) и ФС умеет, иначе копия.
+    """
+    name = os.path.basename(src).lower()
+    if link_patterns is not None and not any(fnmatch.fnmatch(name, pattern) for pattern in link_patterns):
+        copy_file_fast(src, dst)
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        copy_file_fast(src, dst)
+
+def file_crc32(path: str) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                return crc
+            crc = zlib.crc32(chunk, crc)
+
+def member_unchanged(member: "ArchiveMember", dst_path: str) -> Optional[bool]:
+    """
+    Совпадает ли файл dst_path с членом архива: размер и CRC32, если формат
+    его хранит (ZIP, RAR). У tar CRC нет, а одинаковые размер и mtime ничего
+    не гарантируют (сборки с фиксированным mtime, правка конфига той же
+    длины) — тогда None: содержимое сверит write_file_if_changed при распаковке.
+    """
+    try:
+        st = os.stat(dst_path)
+    except OSError:
+        return False
+    if st.st_size != member.size:
+        return False
+    if member.crc is None:
+        return None
+    return file_crc32(dst_path) == member.crc
+
+def job_paths(jobs: list, dest_root: str) -> List[str]:
+    """
+    Пути назначения jobs относительно dest_root через '/'.
+    """
+    return [os.path.relpath(dst, dest_root).replace(os.sep, "/") for _, dst in jobs]
+
+def balance_by_size(items: list, buckets: int, size_of: Callable) -> List[list]:
+    """
+    Раскладываем items по корзинам так, чтобы суммарный размер был примерно
+    равным: крупные элементы идут первыми, каждый — в самую лёгкую корзину.
+    """
+    result = [[] for _ in range(max(1, buckets))]
+    loads = [0] * len(result)
+    for item in sorted(items, key=size_of, reverse=True):
+        idx = loads.index(min(loads))
+        result[idx].append(item)
+        loads[idx] += size_of(item)
+    return [bucket for bucket in result if bucket]
+
+_drive_services = {}
+_drive_services_lock = threading.Lock()
+
+def get_drive_service(service_account_file: str):
+    """
+    Сервис Drive, один на процесс для каждого ключа: JSON ключа читается и
+    клиент строится один раз, из встроенного discovery-документа (без запроса
+    к сети). Токен живёт в credentials и обновляется, только когда истёк.
+    Собственное соединение сервиса — для одного потока за раз; параллельные
+    запросы идут через new_http.
+    """
+    return _cached_drive_service(service_account_file)[0]
+
+def _cached_drive_service(service_account_file: str):
+    key = os.path.abspath(service_account_file)
+    with _drive_services_lock:
+        if key in _drive_services:
+            return _drive_services[key]
+        try:
+            from google.oauth2.service_account import Credentials
+            from googleapiclient.discovery import build
+
+            credentials = Credentials.from_service_account_file(service_account_file, scopes=DRIVE_SCOPES)
+            service = build('drive', 'v3', credentials=credentials,
+                            static_discovery=True, cache_discovery=False)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Service account file not found: {service_account_file}")
+        except Exception as e:
+            raise Exception(f"Error creating Google Drive service: {e}")
+        _drive_services[key] = (service, credentials)
+        return _drive_services[key]
+
+def authorize_drive_service(service_account_file: str):
+    """
+    Сервис Drive с уже полученным токеном: ошибки ключа (нет файла, битый
+    JSON, отозванный ключ) вылезают здесь, а не посреди закачки.
+    """
+    import httplib2
+    from google_auth_httplib2 import Request
+
+    service, credentials = _cached_drive_service(service_account_file)
+    if not credentials.valid:
+        credentials.refresh(Request(httplib2.Http(timeout=HTTP_TIMEOUT)))
+    return service
+
+def warm_up_drive_service(service_account_file: str):
+    """
+    Заранее (в фоне) строим сервис и получаем токен, чтобы первый клик
+    «Download and Extract» не ждал импорта клиента и OAuth.
+    """
+    def warm_up():
+        try:
+            authorize_drive_service(service_account_file)
+        except Exception as e:
+            logger.debug(f"Drive service warm-up failed: {e}")
+
+    threading.Thread(target=warm_up, name="drive-warm-up", daemon=True).start()
+
+def app_data_dir(*parts: str) -> str:
+    """
+    Папка данных программы: %LOCALAPPDATA%\\fc-auto-installer на Windows,
+    ~/.cache/fc-auto-installer (XDG_CACHE_HOME) на остальных системах.
+    """
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, APP_NAME, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+@contextlib.contextmanager
+def low_io_priority():
+    """
+    На время блока понижаем приоритет ввода-вывода текущего потока:
+    Windows — фоновый режим потока, Linux — класс idle (ioprio_set; потоки,
+    созданные внутри блока, его наследуют). Где это невозможно — работаем
+    с обычным приоритетом.
+    """
+    restore = None
+    try:
+        import ctypes
+        if sys.platform == "win32":
+            kernel32 = ctypes.windll.kernel32
+            # THREAD_MODE_BACKGROUND_BEGIN / _END
+            if kernel32.SetThreadPriority(kernel32.GetCurrentThread(), 0x00010000):
+                restore = lambda: kernel32.SetThreadPriority(kernel32.GetCurrentThread(), 0x00020000)
+        elif sys.platform.startswith("linux"):
+            import platform
+            number = IOPRIO_SET_SYSCALLS.get(platform.machine().lower())
+            if number:
+                libc = ctypes.CDLL(None, use_errno=True)
+                # IOPRIO_WHO_PROCESS с who=0 — вызывающий поток; IOPRIO_CLASS_IDLE = 3
+                old = libc.syscall(number + 1, 1, 0)
+                if old >= 0 and libc.syscall(number, 1, 0, 3 << 13) == 0:
+                    restore = lambda: libc.syscall(number, 1, 0, old)
+    except (OSError, AttributeError) as e:
+        logger.debug(f"Could not lower I/O priority: {e}")
+    try:
+        yield
+    finally:
+        if restore:
+            restore()
+
+def add_file_log_handler(formatter: Optional[logging.Formatter] = None) -> str:
+    """
+    Пишем полный лог в <папка данных>/logs/fc-auto-installer.log с ротацией.
+    Возвращает путь к файлу лога.
+    """
+    log_path = os.path.join(app_data_dir("logs"), f"{APP_NAME}.log")
+    handler = logging.handlers.RotatingFileHandler(
+        log_path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+    handler.setFormatter(formatter or logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+    return log_path
+
+def new_http(http):
+    """
+    Отдельное HTTP-соединение с теми же учётными данными:
+    httplib2.Http не потокобезопасен, поэтому у каждого потока — своё.
+    """
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+    if not isinstance(http, AuthorizedHttp):
+        return httplib2.Http(timeout=HTTP_TIMEOUT)
+    return AuthorizedHttp(http.credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+
+def is_rate_limited(status: int, content: bytes) -> bool:
+    # Drive отвечает на превышение квоты 429 или 403 с reason (user)RateLimitExceeded
+    return status == 429 or (status == 403 and b"ratelimitexceeded" in (content or b"").lower())
+
+def backoff_delay(attempt: int) -> float:
+    # Экспоненциальная пауза со случайной добавкой, чтобы потоки не повторяли запросы хором
+    return 2 ** attempt + random.random()
+
+def fetch_range(request,
+                start: int,
+                end: Optional[int],
+                http=None) -> Tuple[bytes, Optional[int]]:
+    """
+    Один HTTP Range-запрос к media-ссылке Drive (end=None — до конца файла).
+    Возвращает (данные, полный размер файла из Content-Range или None).
+    """
+    http = http or request.http
+    headers = dict(request.headers)
+    headers["range"] = f"bytes={start}-{'' if end is None else end}"
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            resp, content = http.request(request.uri, method="GET", headers=headers)
+        except OSError as e:
+            if attempt == DOWNLOAD_RETRIES:
+                raise
+            logger.info(f"Chunk {start}-{end} failed ({e}), retrying...")
+            time.sleep(backoff_delay(attempt))
+            continue
+        if (resp.status >= 500 or is_rate_limited(resp.status, content)) and attempt < DOWNLOAD_RETRIES:
+            logger.info(f"Chunk {start}-{end} failed (HTTP {resp.status}), retrying...")
+            time.sleep(backoff_delay(attempt))
+            continue
+        break
+
+    if resp.status == 206:
+        match = re.match(r"bytes \d+-\d+/(\d+)", resp.get("content-range", ""))
+        return content, int(match.group(1)) if match else None
+    if resp.status == 200:
+        # Сервер проигнорировал Range и прислал файл целиком
+        return content[start:] if end is None else content[start:end + 1], len(content)
+    if resp.status == 416:
+        return b"", start
+    from googleapiclient.errors import HttpError
+    raise HttpError(resp, content, uri=request.uri)
+
+def plan_segments(total: int, chunk_size: int) -> List[List[int]]:
+    """
+    Делим файл на сегменты [начало, конец, следующий байт] размером в кусок.
+    Потоки берут их по порядку, поэтому данные приходят почти подряд
+    (это нужно IncrementalMD5).
+    """
+    return [[start, min(start + chunk_size, total) - 1, start] for start in range(0, total, chunk_size)]
+
+class IncrementalMD5:
+    """
+    MD5 файла, который качается кусками не по порядку. Кусок с текущей
+    позиции сразу идёт в хеш, опередившие ждут в памяти (не больше
+    max_buffered байт). То, что в память не влезло или лежало в файле ещё
+    до этой закачки (докачка), дочитывается с диска, когда до него дойдёт
+    очередь, — остальной файл второй раз не читается.
+    """
+    def __init__(self, path: str, max_buffered: int = MD5_REORDER_BYTES):
+        self.path = path
+        self.max_buffered = max_buffered
+        self.md5 = hashlib.md5()
+        self.pos = 0
+        self.pending = {}  # начало -> данные
+        self.on_disk = {}  # начало -> конец (не включая): уже в файле, но ещё не в хеше
+        self.buffered = 0
+        self._lock = threading.Lock()
+
+    def add(self, pos: int, data: bytes):
+        with self._lock:
+            if pos == self.pos:
+                self.md5.update(data)
+                self.pos += len(data)
+            elif self.buffered + len(data) <= self.max_buffered:
+                self.pending[pos] = data
+                self.buffered += len(data)
+            else:
+                self.on_disk[pos] = pos + len(data)
+            self._drain()
+
+    def add_on_disk(self, start: int, end: int):
+        if end > start:
+            with self._lock:
+                self.on_disk[start] = end
+                self._drain()
+
+    def _drain(self):
+        while True:
+            if self.pos in self.pending:
+                data = self.pending.pop(self.pos)
+                self.buffered -= len(data)
+                self.md5.update(data)
+                self.pos += len(data)
+            elif self.pos in self.on_disk:
+                end = self.on_disk.pop(self.pos)
+                with open(self.path, "rb") as f:
+                    f.seek(self.pos)
+                    while self.pos < end:
+                        chunk = f.read(min(COPY_BUFFER_SIZE, end - self.pos))
+                        if not chunk:
+                            raise IOError(f"{self.path} is shorter than expected")
+                        self.md5.update(chunk)
+                        self.pos += len(chunk)
+            else:
+                return
+
+    def hexdigest(self, size: int) -> str:
+        with self._lock:
+            self._drain()
+            if self.pos != size:
+                raise IntegrityError(f"{os.path.basename(self.path)}: only {self.pos} of {size} bytes were hashed")
+            return self.md5.hexdigest()
+
+def load_partial_state(part_path: str, state_path: str, remote: dict) -> Optional[List[List[int]]]:
+    """
+    Сегменты незаконченной закачки .part-файла (None — начинаем заново).
+    Если метаданные файла на Drive изменились — частичное состояние выбрасываем.
+    """
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = None
+
+    if not state or not os.path.exists(part_path) or \
+            os.path.getsize(part_path) != remote["size"] or \
+            any(state.get(key) != value for key, value in remote.items()):
+        for path_ in (part_path, state_path):
+            if os.path.exists(path_):
+                os.remove(path_)
+        return None
+    return state.get("segments") or None
+
+def save_partial_state(state_path: str, remote: dict, segments: List[List[int]]):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(dict(remote, segments=segments), f)
+    os.replace(tmp_path, state_path)
+
+def preallocate(path: str, size: int):
+    with open(path, "wb") as f:
+        if hasattr(os, "posix_fallocate") and size:
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+
+def download_segments(request,
+                      part_path: str,
+                      segments: List[List[int]],
+                      workers: int,
+                      chunk_size: int,
+                      progress: ProgressTracker,
+                      state_callback: Callable[[List[List[int]]], None],
+                      chunk_callback: Optional[Callable[[int, bytes], None]] = None):
+    """
+    Качаем сегменты в workers потоков: каждый берёт следующий по порядку
+    сегмент и качает его через своё постоянное соединение. Упавший сегмент
+    перезапускается сам по себе с места остановки. chunk_callback получает
+    (позицию, данные) каждого записанного куска.
+    """
+    lock = threading.Lock()
+    local = threading.local()
+    pending = iter([segment for segment in segments if segment[2] <= segment[1]])
+
+    def run_worker():
+        while True:
+            with lock:
+                segment = next(pending, None)
+            if segment is None:
+                return
+            run_segment(segment)
+
+    def run_segment(segment):
+        if not hasattr(local, "http"):
+            local.http = request.http if workers == 1 else new_http(request.http)
+        http = local.http
+        for attempt in range(SEGMENT_RETRIES + 1):
+            try:
+                with open(part_path, "r+b") as f:
+                    while segment[2] <= segment[1]:
+                        pos = segment[2]
+                        end = min(pos + chunk_size - 1, segment[1])
+                        content, _ = fetch_range(request, pos, end, http=http)
+                        content = content[:end - pos + 1]
+                        if not content:
+                            raise IOError(f"Empty response for bytes {pos}-{end}")
+                        f.seek(pos)
+                        f.write(content)
+                        f.flush()
+                        if chunk_callback:
+                            chunk_callback(pos, content)
+                        with lock:
+                            segment[2] = pos + len(content)
+                            state_callback(segments)
+                        progress.add(len(content))
+                return
+            except Exception as e:
+                if attempt == SEGMENT_RETRIES:
+                    raise
+                logger.info(f"Segment {segment[0]}-{segment[1]} failed at byte {segment[2]} ({e}), retrying...")
+                time.sleep(2 ** attempt)
+                http = local.http = new_http(request.http)
+
+    count = max(1, min(workers, sum(1 for segment in segments if segment[2] <= segment[1])))
+    if count == 1:
+        # Один поток — качаем в текущем (и с его приоритетом, см. low_io_priority)
+        run_worker()
+        return
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        for future in [pool.submit(run_worker) for _ in range(count)]:
+            future.result()
+
+def get_file_info(service, file_id: str, http=None) -> dict:
+    return service.files().get(
+        fileId=file_id, fields="name, size, md5Checksum, modifiedTime").execute(http=http)
+
+class ChunkQueueReader:
+    """
+    Файлоподобный объект поверх ограниченной очереди кусков: закачка кладёт
+    в неё данные (put), потоковый tarfile читает (read). None — конец потока.
+    """
+    def __init__(self, max_chunks: int = STREAM_QUEUE_CHUNKS):
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._chunk = b""
+        self._pos = 0
+        self._eof = False
+        self.closed = threading.Event()
+        self.error = None  # Ошибка, переданная закачкой вместо данных
+
+    def put(self, chunk):
+        # Ждём место в очереди, но не вечно — читатель мог упасть и закрыться
+        while not self.closed.is_set():
+            try:
+                self._queue.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise IOError("Stream reader was closed.")
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while not self._eof and (size < 0 or size > 0):
+            if self._pos >= len(self._chunk):
+                item = self._queue.get()
+                if item is None:
+                    self._eof = True
+                    break
+                if isinstance(item, BaseException):
+                    self.error = item
+                    raise item
+                self._chunk, self._pos = item, 0
+                continue
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._pos + size)
+            parts.append(self._chunk[self._pos:end])
+            if size > 0:
+                size -= end - self._pos
+            self._pos = end
+        return b"".join(parts)
+
+    def close(self):
+        self.closed.set()
+
+def stream_download(request,
+                    file_size: int,
+                    part_path: str,
+                    state_path: str,
+                    remote: dict,
+                    reader: ChunkQueueReader,
+                    progress: ProgressTracker,
+                    chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Последовательная закачка для потоковой распаковки: каждый кусок пишется
+    в .part (для кэша и докачки) и отдаётся в reader. Уже скачанное начало
+    .part-файла отдаётся с диска без сети. MD5 считается по тем же кускам;
+    при несовпадении с md5Checksum .part удаляется, а в reader уходит ошибка
+    вместо конца потока — установка прерывается до изменений в main.
+    """
+    plan = load_partial_state(part_path, state_path, remote)
+    offset = plan[0][2] if plan and plan[0][0] == 0 else 0
+    if not plan:
+        preallocate(part_path, file_size)
+    segment = [0, file_size - 1, offset]
+    save_partial_state(state_path, remote, [segment])
+    md5 = hashlib.md5()
+
+    with open(part_path, "r+b") as f:
+        pos = 0
+        while pos < file_size:
+            if pos < offset:
+                f.seek(pos)
+                content = f.read(min(chunk_size, offset - pos))
+            else:
+                end = min(pos + chunk_size, file_size) - 1
+                content, _ = fetch_range(request, pos, end)
+                content = content[:end - pos + 1]
+                if not content:
+                    raise IOError(f"Empty response for bytes {pos}-{end}")
+                f.seek(pos)
+                f.write(content)
+                f.flush()
+                segment[2] = pos + len(content)
+                save_partial_state(state_path, remote, [segment])
+            md5.update(content)
+            reader.put(content)
+            pos += len(content)
+            progress.add(len(content))
+    try:
+        check_md5(md5.hexdigest(), remote.get("md5Checksum"), os.path.basename(part_path)[:-len(PART_SUFFIX)])
+    except IntegrityError:
+        for path_ in (part_path, state_path):
+            if os.path.exists(path_):
+                os.remove(path_)
+        raise
+    progress.finish()
+
+@telemetry_run("download")
+def download_file(service,
+                  file_id: str,
+                  save_folder: str,
+                  progress_callback: Callable[[int], None],
+                  segments: int = DOWNLOAD_SEGMENTS,
+                  chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                  cache: Optional["ArchiveCache"] = None,
+                  file_info: Optional[dict] = None,
+                  status_callback: Optional[Callable[[str], None]] = None,
+                  http=None) -> str:
+    """
+    Качаем файл в <имя>.part Range-запросами в `segments` потоков; прогресс
+    сегментов пишем в <имя>.part.json. Оборванная закачка продолжается с того
+    же места, если размер/md5Checksum/modifiedTime файла на Drive не изменились.
+    MD5 считается по мере прихода кусков (IncrementalMD5) и сверяется с
+    md5Checksum до того, как файл получит своё имя: битый файл удаляется.
+
+    С cache архив качается прямо в кэш, а при попадании в кэш сеть не нужна.
+    http — своё соединение для закачки, если service заодно нужен другим потокам.
+    """
+    if not file_info:
+        with run_phase("metadata"):
+            file_info = get_file_info(service, file_id, http)
+    file_name = file_info.get("name", "downloaded_file")
+    file_size = int(file_info.get("size", 0)) if file_info.get("size") else 0
+    annotate_run(archive=file_name, archive_size=file_size)
+
+    if cache is not None:
+        cached_path = cache.lookup(file_id, file_info)
+        if cached_path:
+            logger.info(f"Archive {file_name} is unchanged, using cached copy: {cached_path}")
+            annotate_run(cached=True)
+            progress_callback(100)
+            return cached_path
+        file_path = cache.path_for(file_id, file_info)
+    else:
+        file_path = os.path.join(save_folder, file_name)
+
+    request = service.files().get_media(fileId=file_id)
+    if http is not None:
+        request.http = http
+    part_path = file_path + PART_SUFFIX
+    state_path = file_path + PART_STATE_SUFFIX
+    if cache is not None:
+        cache.discard_parts(file_id, part_path)
+
+    if not file_size:
+        # Размер неизвестен — сегментировать нечего, качаем одним запросом
+        with run_phase("download", files=1) as entry:
+            content, _ = fetch_range(request, 0, None)
+            check_md5(hashlib.md5(content).hexdigest(), file_info.get("md5Checksum"), file_name)
+            entry["bytes"] = len(content)
+        with open(file_path, "wb") as f:
+            f.write(content)
+        ProgressTracker("Downloading", len(content), progress_callback, status_callback, len(content)).finish()
+        if cache is not None:
+            cache.add(file_id, file_info, file_path)
+        return file_path
+
+    remote = {
+        "file_id": file_id,
+        "size": file_size,
+        "md5Checksum": file_info.get("md5Checksum"),
+        "modifiedTime": file_info.get("modifiedTime"),
+    }
+    plan = load_partial_state(part_path, state_path, remote)
+    done = 0
+    if plan:
+        done = sum(pos - start for start, _, pos in plan)
+        logger.info(f"Resuming download of {file_name}: {done} of {file_size} bytes already on disk")
+    else:
+        plan = plan_segments(file_size, chunk_size)
+        preallocate(part_path, file_size)
+        save_partial_state(state_path, remote, plan)
+
+    hasher = IncrementalMD5(part_path)
+    for start, _, pos in plan:
+        hasher.add_on_disk(start, pos)
+    progress = ProgressTracker("Downloading", file_size, progress_callback, status_callback, done)
+    with run_phase("download", files=1, bytes=file_size - done, segments=segments, archive=file_name):
+        download_segments(
+            request, part_path, plan, segments, chunk_size, progress,
+            state_callback=lambda segs: save_partial_state(state_path, remote, segs),
+            chunk_callback=hasher.add
+        )
+        try:
+            check_md5(hasher.hexdigest(file_size), remote["md5Checksum"], file_name)
+        except IntegrityError:
+            for path_ in (part_path, state_path):
+                if os.path.exists(path_):
+                    os.remove(path_)
+            raise
+    progress.finish()
+
+    os.replace(part_path, file_path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    if cache is not None:
+        cache.add(file_id, file_info, file_path)
+    return file_path
+
+# ==================== Форматы архивов ====================
+
+class ArchiveMember(NamedTuple):
+    name: str  # Путь внутри архива
+    size: int
+    is_dir: bool
+    is_file: bool  # Обычный файл (не ссылка и не устройство)
+    index: int  # Порядковый номер в архиве
+    compress_size: int = 0
+    crc: Optional[int] = None  # CRC32 данных, если формат его хранит
+    mtime: Optional[float] = None  # Время из заголовка — выставляем файлу при записи
+    info: object = None  # Объект члена из библиотеки формата
+
+def import_optional(module_name: str, purpose: str):
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        raise ValueError(f"{purpose} need the optional '{module_name}' package "
+                         f"(pip install {module_name}).")
+
+class ArchiveBackend:
+    """
+    Формат архива. Наследник узнаёт свой файл (detect), перечисляет члены
+    с размерами (members) и потоком отдаёт содержимое выбранных членов в
+    порядке архива (read_members). parallel — архив можно открыть в
+    нескольких потоках сразу и читать члены в любом порядке.
+    members у zip и rar читает только оглавление; форматам без оглавления
+    (tar.zst) приходится пройти архив целиком — это отдельный полный проход.
+    """
+    name = ""
+    parallel = False
+    verifies_crc = False  # Библиотека формата сама сверяет CRC при чтении члена
+    integrity_errors: tuple = ()  # Ошибки библиотеки, означающие повреждённые данные
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    @classmethod
+    def detect(cls, path: str) -> bool:
+        raise NotImplementedError
+
+    def members(self) -> List[ArchiveMember]:
+        raise NotImplementedError
+
+    def read_members(self, selected: List[ArchiveMember]):
+        """
+        Генератор (член, файлоподобный объект); selected — в порядке архива.
+        Объект годен только до следующего шага генератора.
+        """
+        raise NotImplementedError
+
+def read_magic(path: str, size: int) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            return f.read(size)
+    except OSError:
+        return b""
+
+class ZipBackend(ArchiveBackend):
+    name = "zip"
+    parallel = True
+    verifies_crc = True
+    integrity_errors = (zipfile.BadZipFile, zlib.error, EOFError)
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.archive = zipfile.ZipFile(path, "r")
+
+    def close(self):
+        self.archive.close()
+
+    @classmethod
+    def detect(cls, path: str) -> bool:
+        return zipfile.is_zipfile(path)
+
+    def members(self) -> List[ArchiveMember]:
+        return [ArchiveMember(info.filename, info.file_size, info.is_dir(), not info.is_dir(), index,
+                              info.compress_size, info.CRC, None, info)
+                for index, info in enumerate(self.archive.infolist())]
+
+    def read_members(self, selected: List[ArchiveMember]):
+        for member in selected:
+            with self.archive.open(member.info) as src:
+                yield member, src
+
+class TarBackend(ArchiveBackend):
+    """
+    tar, tar.gz, tar.bz2, tar.xz — всё, что понимает tarfile. CRC у членов
+    tar нет: обрыв ловится по размеру, а порча данных — по MD5 при закачке.
+    """
+    name = "tar"
+    integrity_errors = (tarfile.TarError, zlib.error, EOFError)
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.archive = tarfile.open(path, "r:*")
+
+    def close(self):
+        self.archive.close()
+
+    @classmethod
+    def detect(cls, path: str) -> bool:
+        return tarfile.is_tarfile(path)
+
+    def members(self) -> List[ArchiveMember]:
+        return [ArchiveMember(info.name, info.size, info.isdir(), info.isfile(), index,
+                              info.size, None, info.mtime, info)
+                for index, info in enumerate(self.archive.getmembers())]
+
+    def read_members(self, selected: List[ArchiveMember]):
+        for member in selected:
+            with self.archive.extractfile(member.info) as src:
+                yield member, src
+
+class TarZstBackend(ArchiveBackend):
+    """
+    tar, сжатый zstd (.tar.zst): распаковывается в разы быстрее gzip/deflate.
+    Оглавления и произвольного доступа нет, поэтому установка распаковывает
+    архив дважды: members — весь поток ради заголовков (tarfile пропускает
+    данные, но zstd их всё равно разжимает), read_members — ещё раз ради
+    выбранных членов. Оба прохода — в один поток (parallel = False). На
+    сборке в несколько ГБ лишний проход стоит секунды. Нужен пакет zstandard.
+    """
+    name = "tar.zst"
+    MAGIC = b"\x28\xb5\x2f\xfd"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        zstandard = import_optional("zstandard", "Zstandard (.tar.zst) archives")
+        self.integrity_errors = TarBackend.integrity_errors + (zstandard.ZstdError,)
+
+    @classmethod
+    def detect(cls, path: str) -> bool:
+        return read_magic(path, len(cls.MAGIC)) == cls.MAGIC
+
+    @contextlib.contextmanager
+    def open_stream(self):
+        zstandard = import_optional("zstandard", "Zstandard (.tar.zst) archives")
+        with open(self.path, "rb") as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_size=COPY_BUFFER_SIZE)
+            with tarfile.open(fileobj=reader, mode="r|") as tar_ref:
+                yield tar_ref
+
+    def iter_stream(self, tar_ref: tarfile.TarFile):
+        index = 0
+        while True:
+            info = tar_ref.next()
+            if info is None:
+                return
+            yield index, info
+            # Заголовки прочитанных членов не копим
+            tar_ref.members = []
+            index += 1
+
+    def members(self) -> List[ArchiveMember]:
+        with self.open_stream() as tar_ref:
+            return [ArchiveMember(info.name, info.size, info.isdir(), info.isfile(), index,
+                                  info.size, None, info.mtime)
+                    for index, info in self.iter_stream(tar_ref)]
+
+    def read_members(self, selected: List[ArchiveMember]):
+        wanted = {member.index: member for member in selected}
+        if not wanted:
+            return
+        with self.open_stream() as tar_ref:
+            for index, info in self.iter_stream(tar_ref):
+                if index in wanted:
+                    with tar_ref.extractfile(info) as src:
+                        yield wanted.pop(index), src
+                    if not wanted:
+                        return
+
+class RarBackend(ArchiveBackend):
+    """
+    RAR через пакет rarfile (ему нужна утилита unrar, unar или bsdtar).
+    Оглавление читается без распаковки, но члены — по одному и в один
+    поток: rarfile запускает утилиту на каждый сжатый член, а в непрерывном
+    (solid) архиве каждый член распаковывается с начала архива.
+    """
+    name = "rar"
+    MAGIC = b"Rar!\x1a\x07"
+    verifies_crc = True
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        rarfile = import_optional("rarfile", "RAR archives")
+        self.integrity_errors = (rarfile.Error,)
+        self.archive = rarfile.RarFile(path)
+
+    def close(self):
+        self.archive.close()
+
+    @classmethod
+    def detect(cls, path: str) -> bool:
+        return read_magic(path, len(cls.MAGIC)) == cls.MAGIC
+
+    def members(self) -> List[ArchiveMember]:
+        return [ArchiveMember(info.filename, info.file_size, info.is_dir(), info.is_file(), index,
+                              info.compress_size, info.CRC, None, info)
+                for index, info in enumerate(self.archive.infolist())]
+
+    def read_members(self, selected: List[ArchiveMember]):
+        for member in selected:
+            with self.archive.open(member.info) as src:
+                yield member, src
+
+ARCHIVE_BACKENDS = [ZipBackend, RarBackend, TarZstBackend, TarBackend]  # Порядок проверки detect
+
+def register_archive_backend(backend: type):
+    """
+    Подключаем свой формат: он проверяется раньше встроенных.
+    """
+    ARCHIVE_BACKENDS.insert(0, backend)
+
+def archive_backend_for(path: str) -> type:
+    for backend in ARCHIVE_BACKENDS:
+        if backend.detect(path):
+            return backend
+    raise ValueError("Unsupported archive format.")
+
+def extract_members(backend: type,
+                    archive_path: str,
+                    dirs: List[str],
+                    jobs: List[Tuple[ArchiveMember, str]],
+                    progress: ProgressTracker,
+                    workers: int = EXTRACT_WORKERS,
+                    store: Optional["ContentStore"] = None,
+                    crcs: Optional[Dict[str, int]] = None,
+                    compare: Optional[set] = None,
+                    same: Optional[set] = None) -> Dict[str, str]:
+    """
+    Распаковка jobs — пар (член архива, путь назначения). Сначала создаём все
+    папки; если формат позволяет (backend.parallel), делим члены по потокам с
+    учётом сжатого размера, у каждого потока свой дескриптор архива.
+    Размер и CRC каждого члена сверяются в том же проходе, что и запись;
+    повреждённый член не заменяет файл назначения и даёт IntegrityError.
+
+    Подходящие для store файлы пишутся в хранилище, а на место назначения
+    ставится ссылка. Возвращает {путь назначения: sha256} таких файлов.
+    В crcs (если задан) попадает CRC32 каждого записанного файла.
+    Пути из compare (файл того же размера уже есть, а CRC в оглавлении нет)
+    пишутся через write_file_if_changed; совпавшие попадают в same.
+    """
+    for dir_path in dirs:
+        os.makedirs(dir_path, exist_ok=True)
+    for parent in {os.path.dirname(dst) for _, dst in jobs}:
+        os.makedirs(parent, exist_ok=True)
+
+    linked = {}
+    if not jobs:
+        progress.finish()
+        return linked
+
+    stop = threading.Event()
+
+    def extract_bucket(bucket):
+        bucket = sorted(bucket, key=lambda job: job[0].index)
+        destinations = {member.index: dst for member, dst in bucket}
+        with backend(archive_path) as archive:
+            for member, src in archive.read_members([member for member, _ in bucket]):
+                if stop.is_set():
+                    return
+                dst = destinations[member.index]
+                crc = None if archive.verifies_crc else member.crc
+                try:
+                    if store is not None and store.accepts(dst):
+                        linked[dst], checksum = store.add(src, member.size, crc,
+                                                          store.crc_alias(member.size, member.crc), progress.add)
+                        store.link(linked[dst], dst)
+                        changed = True
+                    elif compare and dst in compare:
+                        checksum, changed = write_file_if_changed(src, dst, progress.add, size=member.size, crc=crc)
+                    else:
+                        checksum, changed = write_file_atomic(src, dst, progress.add, size=member.size, crc=crc), True
+                    if crcs is not None:
+                        crcs[dst] = checksum
+                except archive.integrity_errors + (IntegrityError,) as e:
+                    raise IntegrityError(f"Archive member {member.name} is corrupted: {e}") from e
+                if not changed:
+                    if same is not None:
+                        same.add(dst)
+                elif member.mtime is not None:
+                    os.utime(dst, (member.mtime, member.mtime))
+
+    buckets = balance_by_size(jobs, workers if backend.parallel else 1, lambda job: job[0].compress_size)
+    if len(buckets) == 1:
+        extract_bucket(buckets[0])
+    else:
+        with ThreadPoolExecutor(max_workers=len(buckets)) as pool:
+            futures = [pool.submit(extract_bucket, bucket) for bucket in buckets]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                stop.set()
+                raise
+    progress.finish()
+    return linked
+
+# ==================== Кэш архивов ====================
+
+class ArchiveCache:
+    """
+    Кэш скачанных архивов, адресуемый по md5Checksum с Drive
+    (или по id + modifiedTime, если md5 нет). index.json хранит размер,
+    время последнего использования и исходное имя; при превышении max_bytes
+    удаляются давно не использованные архивы.
+    """
+    # Замки общие для всех экземпляров: одну папку кэша разом используют
+    # несколько установок (папки в CLI, части сборки), у каждой свой экземпляр
+    _index_locks = collections.defaultdict(threading.Lock)  # Папка кэша -> замок index.json
+    _download_locks = collections.defaultdict(threading.Lock)  # Путь архива -> замок закачки
+    _locks_guard = threading.Lock()
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = ARCHIVE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir or app_data_dir("archives")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        with ArchiveCache._locks_guard:
+            self._lock = ArchiveCache._index_locks[os.path.normcase(os.path.abspath(self.cache_dir))]
+
+    def download_lock(self, file_id: str, file_info: dict) -> threading.Lock:
+        """
+        Замок на закачку одного архива: параллельные установки (несколько
+        папок в CLI) качают его в кэш один раз, остальные берут готовый.
+        """
+        with ArchiveCache._locks_guard:
+            return ArchiveCache._download_locks[self.path_for(file_id, file_info)]
+
+    @staticmethod
+    def cache_key(file_id: str, file_info: dict) -> str:
+        if file_info.get("md5Checksum"):
+            return file_info["md5Checksum"]
+        return re.sub(r"[^0-9A-Za-z_.-]", "_", f"{file_id}-{file_info.get('modifiedTime', '')}")
+
+    def path_for(self, file_id: str, file_info: dict) -> str:
+        name = file_info.get("name", "")
+        ext = next((e for e in ARCHIVE_EXTENSIONS if name.lower().endswith(e)), os.path.splitext(name)[1])
+        return os.path.join(self.cache_dir, self.cache_key(file_id, file_info) + ext)
+
+    def lookup(self, file_id: str, file_info: dict, touch: bool = True) -> Optional[str]:
+        """
+        Путь к архиву в кэше или None. touch=False — только посмотреть (для
+        проверок перед установкой): index.json не меняется, и архив, который
+        потом не поставили, не выглядит недавно использованным для вытеснения.
+        """
+        key = self.cache_key(file_id, file_info)
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            if not entry:
+                return None
+            path_ = os.path.join(self.cache_dir, entry["file"])
+            if not os.path.isfile(path_) or os.path.getsize(path_) != entry["size"] or \
+                    entry["size"] != int(file_info.get("size") or 0):
+                if touch:
+                    index.pop(key, None)
+                    self._save_index(index)
+                return None
+            if touch:
+                entry["last_used"] = time.time()
+                self._save_index(index)
+            return path_
+
+    def add(self, file_id: str, file_info: dict, path_: str):
+        key = self.cache_key(file_id, file_info)
+        with self._lock:
+            index = self._load_index()
+            index[key] = {
+                "file": os.path.basename(path_),
+                "name": file_info.get("name"),
+                "file_id": file_id,
+                "modifiedTime": file_info.get("modifiedTime"),
+                "size": os.path.getsize(path_),
+                "last_used": time.time(),
+            }
+            self._evict(index, keep=key)
+            self._save_index(index)
+
+    def discard(self, file_id: str, file_info: dict):
+        """
+        Убираем архив из кэша (например, он оказался повреждён).
+        """
+        key = self.cache_key(file_id, file_info)
+        with self._lock:
+            index = self._load_index()
+            entry = index.pop(key, None)
+            if entry:
+                path_ = os.path.join(self.cache_dir, entry["file"])
+                if os.path.exists(path_):
+                    os.remove(path_)
+                self._save_index(index)
+                logger.info(f"Discarded cached archive: {entry.get('name')} ({key})")
+
+    def part_files(self) -> List[Tuple[str, Optional[dict]]]:
+        """
+        Недокачанные архивы в папке кэша: (путь .part, состояние из .part.json или None).
+        """
+        parts = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(PART_SUFFIX):
+                continue
+            part_path = os.path.join(self.cache_dir, name)
+            try:
+                with open(part_path[:-len(PART_SUFFIX)] + PART_STATE_SUFFIX, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = None
+            parts.append((part_path, state))
+        return parts
+
+    def discard_parts(self, file_id: str, keep: str):
+        """
+        Файл на Drive сменился: недокачанные прежние версии (у них другой
+        ключ, а значит, и другое имя .part) продолжить нельзя — удаляем.
+        """
+        for part_path, state in self.part_files():
+            if part_path != keep and state and state.get("file_id") == file_id:
+                self.remove_part(part_path)
+                logger.info(f"Removed partial download of an older version: {os.path.basename(part_path)}")
+
+    @staticmethod
+    def remove_part(part_path: str):
+        for path_ in (part_path, part_path[:-len(PART_SUFFIX)] + PART_STATE_SUFFIX):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path_)
+
+    def _evict(self, index: dict, keep: str):
+        # В предел идут и недокачанные .part (кроме тех, что качаются прямо сейчас)
+        parts = []
+        for part_path, _ in self.part_files():
+            with ArchiveCache._locks_guard:
+                lock = ArchiveCache._download_locks.get(part_path[:-len(PART_SUFFIX)])
+            try:
+                st = os.stat(part_path)
+            except OSError:
+                continue
+            parts.append((st.st_mtime, part_path, st.st_size, lock is not None and lock.locked()))
+        total = sum(entry["size"] for entry in index.values()) + sum(part[2] for part in parts)
+        candidates = [(entry["last_used"], key, entry["size"], key == keep) for key, entry in index.items()]
+        for _, key, size, busy in sorted(candidates + parts):
+            if total <= self.max_bytes:
+                break
+            if busy:
+                continue
+            if key in index:
+                entry = index.pop(key)
+                path_ = os.path.join(self.cache_dir, entry["file"])
+                if os.path.exists(path_):
+                    os.remove(path_)
+                logger.info(f"Evicted cached archive: {entry.get('name')} ({key})")
+            else:
+                self.remove_part(key)
+                logger.info(f"Evicted partial download: {os.path.basename(key)}")
+            total -= size
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index: dict):
+        # Своё временное имя: другой процесс (окно и CLI разом) не перепишет его на полпути
+        fd, tmp_path = tempfile.mkstemp(prefix="index-", suffix=".tmp", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=1)
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+# ==================== Снимки ====================
+
+class SnapshotManager:
+    """
+    Снимки управляемых папок (mods/, configs/) в main/.fc-snapshots/<id>/.
+    jar (SNAPSHOT_LINK_PATTERNS) попадают в снимок жёсткими ссылками и
+    стоят только метаданных: установка их не переписывает, а подменяет
+    через os.replace (новый inode), и игра на месте их тоже не меняет.
+    Остальное (конфиги) игра, моды и редакторы переписывают на месте, в
+    тот же inode, — такие файлы копируются (reflink, где ФС умеет), иначе
+    правка изменила бы и снимок. При восстановлении — так же.
+
+    Установка пишет и вне этих папок (options.txt, resourcepacks/...):
+    такие файлы перед записью сохраняются поштучно в <id>/other/ (create
+    и add с путями), а пути, которых до установки не было, — в списке
+    absent снимка: restore их удаляет.
+    """
+    META_NAME = "snapshot.json"
+    OTHER_DIR = "other"
+
+    def __init__(self, main_dir: str, folders: List[str] = MODS_FOLDERS, keep: int = SNAPSHOT_KEEP):
+        self.main_dir = main_dir
+        self.folders = folders
+        self.keep = keep
+        self.root = os.path.join(main_dir, SNAPSHOTS_DIR_NAME)
+
+    def create(self, label: str = "", paths: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Снимок текущих папок и файлов paths (пути относительно main через
+        '/', см. add); None — снимать нечего.
+        """
+        present = [f for f in self.folders if os.path.isdir(os.path.join(self.main_dir, f))]
+        paths = self.outside_folders(paths or [])
+        if not present and not paths:
+            return None
+        snapshot_id = time.strftime("%Y%m%d-%H%M%S")
+        suffix = 1
+        while os.path.exists(os.path.join(self.root, snapshot_id)):
+            suffix += 1
+            snapshot_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+
+        started = time.monotonic()
+        tmp_path = os.path.join(self.root, snapshot_id + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        files = sum(link_tree(os.path.join(self.main_dir, f), os.path.join(tmp_path, f), SNAPSHOT_LINK_PATTERNS)
+                    for f in present)
+        meta = {"id": snapshot_id, "created": time.time(), "label": label,
+                "folders": present, "files": files, "other": [], "absent": []}
+        self.save_paths(tmp_path, meta, paths)
+        os.replace(tmp_path, os.path.join(self.root, snapshot_id))
+        logger.info(f"Snapshot {snapshot_id}: {meta['files']} files in {time.monotonic() - started:.2f}s")
+        self.prune()
+        return snapshot_id
+
+    def add(self, snapshot_id: str, paths: List[str]) -> int:
+        """
+        Дополняем снимок файлами вне его папок, которые установка сейчас
+        перезапишет. Уже сохранённые пути не трогаем: в снимке остаётся их
+        состояние до установки. Возвращает число новых путей.
+        """
+        snapshot_path = os.path.join(self.root, snapshot_id)
+        with open(os.path.join(snapshot_path, self.META_NAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        known = set(meta.get("other", [])) | set(meta.get("absent", []))
+        paths = [rel for rel in self.outside_folders(paths) if rel not in known]
+        if paths:
+            self.save_paths(snapshot_path, meta, paths)
+        return len(paths)
+
+    def outside_folders(self, paths: List[str]) -> List[str]:
+        """
+        Пути вне папок снимка (те сохраняются целиком), без повторов.
+        """
+        folders = {f.lower() for f in self.folders}
+        return sorted({rel for rel in paths if rel.split("/", 1)[0].lower() not in folders})
+
+    def save_paths(self, snapshot_path: str, meta: dict, paths: List[str]):
+        """
+        Существующие файлы из paths — в <снимок>/other/, отсутствующие — в
+        meta["absent"]; затем meta атомарно записывается в снимок.
+        """
+        for rel in paths:
+            src = os.path.join(self.main_dir, *rel.split("/"))
+            if not os.path.isfile(src):
+                meta["absent"].append(rel)
+                continue
+            dst = os.path.join(snapshot_path, self.OTHER_DIR, *rel.split("/"))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            link_or_copy(src, dst, SNAPSHOT_LINK_PATTERNS)
+            meta["other"].append(rel)
+            meta["files"] += 1
+        meta_path = os.path.join(snapshot_path, self.META_NAME)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def list(self) -> List[dict]:
+        """
+        Снимки от новых к старым.
+        """
+        snapshots = []
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                try:
+                    with open(os.path.join(self.root, name, self.META_NAME), "r", encoding="utf-8") as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(snapshots, key=lambda meta: meta["created"], reverse=True)
+
+    def prune(self):
+        for meta in self.list()[self.keep:]:
+            shutil.rmtree(os.path.join(self.root, meta["id"]), ignore_errors=True)
+            logger.info(f"Removed old snapshot {meta['id']}")
+
+    def restore(self, snapshot_id: str) -> int:
+        """
+        Возвращаем папки из снимка: собираем их рядом с main (jar — жёсткими
+        ссылками, остальное — копиями), затем подменяем текущие папки
+        переименованием. После этого — сохранённые файлы вне папок, а
+        появившиеся после снимка (absent) удаляем. Сам снимок
+        остаётся и может быть восстановлен снова. Возвращает число файлов.
+        """
+        if snapshot_id == "latest":
+            snapshots = self.list()
+            if not snapshots:
+                raise FileNotFoundError(f"No snapshots in {self.root}")
+            snapshot_id = snapshots[0]["id"]
+        snapshot_path = os.path.join(self.root, snapshot_id)
+        if not os.path.isfile(os.path.join(snapshot_path, self.META_NAME)):
+            raise FileNotFoundError(f"Snapshot not found: {snapshot_id}")
+
+        started = time.monotonic()
+        files = 0
+        staged = {}
+        for folder in self.folders:
+            saved = os.path.join(snapshot_path, folder)
+            if os.path.isdir(saved):
+                staged[folder] = os.path.join(self.main_dir, folder + ".fcrestore")
+                shutil.rmtree(staged[folder], ignore_errors=True)
+                files += link_tree(saved, staged[folder], SNAPSHOT_LINK_PATTERNS)
+
+        trash = os.path.join(self.root, f".trash-{snapshot_id}")
+        os.makedirs(trash, exist_ok=True)
+        swaps = []  # [папка, убрана ли текущая в trash, поставлена ли собранная]
+        try:
+            for folder in self.folders:
+                current = os.path.join(self.main_dir, folder)
+                swaps.append([folder, False, False])
+                if os.path.lexists(current):
+                    os.replace(current, os.path.join(trash, folder))
+                    swaps[-1][1] = True
+                if folder in staged:
+                    os.replace(staged[folder], current)
+                    swaps[-1][2] = True
+        except BaseException:
+            # Подмена не удалась (например, папку держит другой процесс) —
+            # возвращаем текущие папки на место; trash удаляем, только если вернули всё
+            if self.undo_swaps(swaps, staged, trash):
+                shutil.rmtree(trash, ignore_errors=True)
+            for path_ in staged.values():
+                shutil.rmtree(path_, ignore_errors=True)
+            raise
+        shutil.rmtree(trash, ignore_errors=True)
+        files += self.restore_paths(snapshot_path)
+        logger.info(f"Restored snapshot {snapshot_id}: {files} files in {time.monotonic() - started:.2f}s")
+        return files
+
+    def restore_paths(self, snapshot_path: str) -> int:
+        """
+        Файлы вне папок снимка: каждый возвращается атомарно (рядом + os.replace).
+        """
+        with open(os.path.join(snapshot_path, self.META_NAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        for rel in meta.get("other", []):
+            dst = os.path.join(self.main_dir, *rel.split("/"))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            tmp_path = dst + ".fcrestore"
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+            link_or_copy(os.path.join(snapshot_path, self.OTHER_DIR, *rel.split("/")), tmp_path,
+                         SNAPSHOT_LINK_PATTERNS)
+            os.replace(tmp_path, dst)
+        for rel in meta.get("absent", []):
+            path_ = os.path.join(self.main_dir, *rel.split("/"))
+            if os.path.isfile(path_):
+                os.remove(path_)
+        return len(meta.get("other", []))
+
+    def undo_swaps(self, swaps: List[list], staged: Dict[str, str], trash: str) -> bool:
+        """
+        Откат restore(): собранные из снимка папки — обратно рядом с main,
+        убранные в trash — обратно в main. False — что-то вернуть не вышло
+        (тогда папки остаются в trash, а путь к ним — в логе).
+        """
+        ok = True
+        for folder, trashed, placed in reversed(swaps):
+            current = os.path.join(self.main_dir, folder)
+            try:
+                if placed:
+                    os.replace(current, staged[folder])
+                if trashed:
+                    os.replace(os.path.join(trash, folder), current)
+            except OSError as e:
+                ok = False
+                logger.error(f"Could not put {folder} back after a failed restore, "
+                             f"it is kept in {os.path.join(trash, folder)}: {e}")
+        return ok
+
+# ==================== Общее хранилище файлов ====================
+
+class ContentStore:
+    """
+    Общее для всех папок игры на машине хранилище файлов, адресуемых по
+    SHA-256 (objects/ab/<sha256>). Одинаковый jar из разных сборок и папок
+    лежит на диске один раз, а в каждую папку ставится жёсткой ссылкой.
+    aliases/ — подсказки «такой файл уже есть» по тому, что известно заранее:
+    crc-<размер>-<crc32> из оглавления zip/rar и md5-<md5> из Drive. По ним
+    файл ставится ссылкой вообще без распаковки или закачки.
+    refs/<ключ папки>.json — какие файлы какой папки ссылаются на хранилище;
+    gc() удаляет файлы, на которые не ссылается больше никто.
+
+    Ссылки возможны только на той же файловой системе (usable_for). В
+    хранилище идут лишь CONTENT_STORE_PATTERNS: правка на месте одной из
+    ссылок изменила бы файл во всех папках, а jar/zip игра не переписывает
+    (установка же всегда подменяет файлы через os.replace). Чтобы правка на
+    месте не прошла молча, файлы хранилища доступны только для чтения, а
+    lookup сверяет размер и выбрасывает испорченный файл (evict).
+    """
+    TMP_MAX_AGE = 24 * 3600  # Брошенные временные файлы старше суток убирает gc
+
+    def __init__(self, root: Optional[str] = None, patterns: List[str] = CONTENT_STORE_PATTERNS):
+        self.root = root or app_data_dir("store")
+        self.patterns = [p.lower() for p in patterns]
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.aliases_dir = os.path.join(self.root, "aliases")
+        self.refs_dir = os.path.join(self.root, "refs")
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        for path_ in (self.objects_dir, self.aliases_dir, self.refs_dir, self.tmp_dir):
+            os.makedirs(path_, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def accepts(self, path_: str) -> bool:
+        name = os.path.basename(path_).lower()
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+    def usable_for(self, main_dir: str) -> bool:
+        # Жёсткие ссылки не пересекают границу устройства
+        try:
+            return os.stat(self.root).st_dev == os.stat(main_dir).st_dev
+        except OSError:
+            return False
+
+    def object_path(self, sha: str) -> str:
+        return os.path.join(self.objects_dir, sha[:2], sha)
+
+    @staticmethod
+    def crc_alias(size: int, crc: Optional[int]) -> Optional[str]:
+        return None if crc is None else f"crc-{size}-{crc:08x}"
+
+    @staticmethod
+    def md5_alias(md5: Optional[str]) -> Optional[str]:
+        return f"md5-{md5}" if md5 else None
+
+    def lookup(self, alias: Optional[str], size: Optional[int] = None) -> Optional[str]:
+        """
+        sha256 уже сохранённого файла по подсказке (None — такого нет).
+        Если размер файла не равен size, файл испорчен: выбрасываем его.
+        """
+        if alias is None:
+            return None
+        try:
+            with open(os.path.join(self.aliases_dir, alias), "r", encoding="utf-8") as f:
+                sha = f.read().strip()
+            actual = os.path.getsize(self.object_path(sha))
+        except OSError:
+            return None
+        if size is not None and actual != size:
+            logger.warning(f"Content store file {sha} is {actual} bytes instead of {size}, discarding it")
+            self.evict(sha, alias)
+            return None
+        return sha
+
+    def evict(self, sha: str, alias: Optional[str] = None):
+        """
+        Убираем испорченный файл из хранилища. Папки, которые на него уже
+        ссылаются, держат свою ссылку, пока их не переустановят или не починят.
+        """
+        for path_ in (self.object_path(sha), os.path.join(self.aliases_dir, alias) if alias else None):
+            if path_ is not None:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path_)
+
+    def evict_linked(self, main_dir: str, paths: List[str]):
+        """
+        Выбрасываем файлы хранилища, на которые ссылаются paths папки
+        main_dir (пути через '/'): их содержимое признано испорченным.
+        """
+        files = self.load_ref(self.ref_path(main_dir)).get("files", {})
+        for rel in paths:
+            sha = files.get(rel.replace("/", os.sep)) or files.get(rel)
+            if sha and self.is_linked(os.path.join(main_dir, rel), sha):
+                logger.warning(f"Content store file {sha} behind {rel} is corrupted, discarding it")
+                self.evict(sha)
+
+    @staticmethod
+    def protect(blob: str):
+        # Только на POSIX: на Windows атрибут «только чтение» общий для всех
+        # ссылок и не дал бы установке подменить или удалить файл в папке
+        if os.name != "nt":
+            with contextlib.suppress(OSError):
+                os.chmod(blob, 0o444)
+
+    def add(self, src, size: int, crc: Optional[int], alias: Optional[str],
+            on_bytes: Optional[Callable[[int], None]] = None) -> Tuple[str, int]:
+        """
+        Пишем поток src в хранилище (размер и crc сверяются при записи).
+        Возвращает (sha256, CRC32).
+        """
+        tmp_path = self.tmp_file()
+        try:
+            digest = hashlib.sha256()
+            checksum = write_file_atomic(src, tmp_path, on_bytes, size=size, crc=crc, digest=digest)
+            return self.adopt(tmp_path, digest.hexdigest(), alias), checksum
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def adopt(self, tmp_path: str, sha: str, alias: Optional[str]) -> str:
+        """
+        Забираем готовый файл из tmp хранилища под именем sha. Если такой
+        файл уже есть, новая копия выбрасывается. Возвращает sha256.
+        """
+        blob = self.object_path(sha)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(tmp_path, blob)
+        except FileExistsError:
+            if os.path.getsize(blob) != os.path.getsize(tmp_path):
+                # Лежащая копия испорчена — меняем её на свежую (старые ссылки на неё не трогаются)
+                os.replace(tmp_path, blob)
+        self.protect(blob)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if alias is not None:
+            alias_tmp = self.tmp_file()
+            with open(alias_tmp, "w", encoding="utf-8") as f:
+                f.write(sha)
+            os.replace(alias_tmp, os.path.join(self.aliases_dir, alias))
+        return sha
+
+    def tmp_file(self) -> str:
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        return tmp_path
+
+    def link(self, sha: str, dst_path: str):
+        """
+        Ставим файл хранилища на место dst_path (атомарно, через временное имя).
+        """
+        blob = self.object_path(sha)
+        self.protect(blob)  # Файлы из хранилищ, созданных до защиты
+        if os.path.exists(dst_path) and os.path.samefile(blob, dst_path):
+            return
+        tmp_path = dst_path + ".fclink"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        os.link(blob, tmp_path)
+        os.replace(tmp_path, dst_path)
+
+    def is_linked(self, path_: str, sha: str) -> bool:
+        try:
+            return os.path.samefile(path_, self.object_path(sha))
+        except OSError:
+            return False
+
+    def ref_path(self, main_dir: str) -> str:
+        key = hashlib.sha1(os.path.normcase(os.path.abspath(main_dir)).encode("utf-8")).hexdigest()
+        return os.path.join(self.refs_dir, key[:16] + ".json")
+
+    def load_ref(self, ref_path: str) -> dict:
+        try:
+            with open(ref_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, main_dir: str, linked: Dict[str, str]):
+        """
+        Запоминаем ссылки папки main_dir ({путь в папке: sha256}). Прежние
+        записи остаются, пока файл в папке всё ещё ссылка на тот же sha256.
+        """
+        ref_path = self.ref_path(main_dir)
+        with self._lock:
+            files = self.load_ref(ref_path).get("files", {})
+            files.update(linked)
+            files = {rel: sha for rel, sha in files.items()
+                     if self.is_linked(os.path.join(main_dir, rel), sha)}
+            with open(ref_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"path": os.path.abspath(main_dir), "files": files}, f)
+            os.replace(ref_path + ".tmp", ref_path)
+
+    def gc(self) -> Tuple[int, int]:
+        """
+        Удаляем из хранилища файлы, на которые не ссылается ни одна папка.
+        Записи в refs перепроверяются по факту (тот же inode); папки, которых
+        больше нет, забываются. Файл с посторонними жёсткими ссылками (снимок,
+        идущая сейчас установка) не трогаем. Возвращает (файлов, байт).
+        """
+        referenced = set()
+        for name in os.listdir(self.refs_dir):
+            ref_path = os.path.join(self.refs_dir, name)
+            ref = self.load_ref(ref_path)
+            if not ref.get("path") or not os.path.isdir(ref["path"]):
+                os.remove(ref_path)
+                logger.info(f"Forgot store references of missing folder {ref.get('path')}")
+                continue
+            referenced.update(sha for rel, sha in ref.get("files", {}).items()
+                              if self.is_linked(os.path.join(ref["path"], rel), sha))
+
+        removed, freed = 0, 0
+        for prefix in os.listdir(self.objects_dir):
+            for sha in os.listdir(os.path.join(self.objects_dir, prefix)):
+                blob = os.path.join(self.objects_dir, prefix, sha)
+                st = os.stat(blob)
+                if sha in referenced or st.st_nlink > 1:
+                    continue
+                os.remove(blob)
+                removed += 1
+                freed += st.st_size
+        for name in os.listdir(self.aliases_dir):
+            alias_path = os.path.join(self.aliases_dir, name)
+            with open(alias_path, "r", encoding="utf-8") as f:
+                sha = f.read().strip()
+            if not os.path.isfile(self.object_path(sha)):
+                os.remove(alias_path)
+        for name in os.listdir(self.tmp_dir):
+            tmp_path = os.path.join(self.tmp_dir, name)
+            if time.time() - os.path.getmtime(tmp_path) > self.TMP_MAX_AGE:
+                os.remove(tmp_path)
+        logger.info(f"Store GC: removed {removed} files, freed {format_bytes(freed)}")
+        return removed, freed
+
+# ==================== Индекс установленных файлов ====================
+
+class InstallIndex:
+    """
+    Индекс установки в main/.fc-index.sqlite: путь, размер, mtime и CRC32
+    каждого файла, поставленного из архива, и архив-источник. verify()
+    сверяет папку с индексом, перечитывая файлы (quick — только те, у
+    которых сменился mtime), а repair() достаёт из архива (из кэша, при
+    нужде — снова с Drive) только члены, которые не сошлись. Источником
+    может быть и папка Drive (FolderSyncInstaller, в source есть folder_id) —
+    тогда файлы качаются из неё поштучно. Файлы, не тронутые установкой
+    (исключения, то, что уже было в main), в индекс не входят.
+    """
+    def __init__(self, main_dir: str):
+        self.main_dir = main_dir
+        self.path = os.path.join(main_dir, INDEX_FILE_NAME)
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path)
+        db.execute("CREATE TABLE IF NOT EXISTS sources "
+                   "(id INTEGER PRIMARY KEY, archive TEXT UNIQUE, file_id TEXT, info TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS files "
+                   "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, crc32 INTEGER, source INTEGER)")
+        return db
+
+    def full_path(self, rel: str) -> str:
+        return os.path.join(self.main_dir, *rel.split("/"))
+
+    def file_rows(self, db: sqlite3.Connection, files: Dict[str, Tuple[int, Optional[int]]],
+                  source_id: int) -> list:
+        """
+        Строки индекса для files ({путь через '/': (размер, CRC32 или None)}).
+        Размер пишем из архива, а не с диска: файл, который уже при установке
+        не сошёлся с архивом, verify покажет. CRC, которого не дала установка,
+        считаем по файлу: прежней строке индекса не верим — файл той же
+        длины и с тем же mtime мог смениться.
+        """
+        rows, unknown = [], []
+        for rel, (size, crc) in files.items():
+            try:
+                st = os.stat(self.full_path(rel))
+            except OSError:
+                continue
+            if st.st_size != size:
+                logger.warning(f"{rel} is {st.st_size} bytes on disk instead of {size} in the archive")
+            rows.append([rel, size, st.st_mtime_ns, crc, source_id])
+            if crc is None:
+                unknown.append(rows[-1])
+        with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+            for row, crc in zip(unknown, pool.map(lambda row: file_crc32(self.full_path(row[0])), unknown)):
+                row[3] = crc
+        return rows
+
+    def update(self, files: Dict[str, Tuple[int, Optional[int]]], source: dict):
+        """
+        Записываем (или перезаписываем) файлы одного архива source
+        ({"archive": путь, "file_id", "name", "size", "md5Checksum", ...}).
+        """
+        with contextlib.closing(self.connect()) as db, db:
+            db.execute("INSERT OR IGNORE INTO sources (archive) VALUES (?)", (source["archive"],))
+            db.execute("UPDATE sources SET file_id = ?, info = ? WHERE archive = ?",
+                       (source.get("file_id"), json.dumps(source), source["archive"]))
+            source_id = db.execute("SELECT id FROM sources WHERE archive = ?", (source["archive"],)).fetchone()[0]
+            db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                           self.file_rows(db, files, source_id))
+
+    def paths(self, source: dict) -> set:
+        """
+        Файлы, записанные в индекс из source.
+        """
+        if not self.exists():
+            return set()
+        with contextlib.closing(self.connect()) as db:
+            return {rel for (rel,) in db.execute("SELECT path FROM files JOIN sources ON files.source = sources.id "
+                                                 "WHERE sources.archive = ?", (source["archive"],))}
+
+    def prune(self, keep: set):
+        """
+        Забываем файлы, которых больше нет в сборке, и ненужные источники.
+        """
+        with contextlib.closing(self.connect()) as db, db:
+            stale = [(rel,) for (rel,) in db.execute("SELECT path FROM files") if rel not in keep]
+            db.executemany("DELETE FROM files WHERE path = ?", stale)
+            db.execute("DELETE FROM sources WHERE id NOT IN (SELECT DISTINCT source FROM files)")
+
+    def forget(self, folders: List[str] = MODS_FOLDERS):
+        """
+        После отката к снимку файлы folders уже не те, что поставила
+        последняя установка: убираем их из индекса, чтобы verify не
+        считал их испорченными. Следующая установка запишет их заново.
+        """
+        if not self.exists():
+            return
+        keep = set()
+        with contextlib.closing(self.connect()) as db:
+            for (rel,) in db.execute("SELECT path FROM files"):
+                if rel.split("/", 1)[0] not in folders:
+                    keep.add(rel)
+        self.prune(keep)
+
+    def verify(self,
+               status_callback: Optional[Callable[[str], None]] = None,
+               quick: bool = False) -> List[Tuple[str, str]]:
+        """
+        Возвращает расхождения [(путь, missing/size/modified)]. Каждый файл
+        с верным размером перечитывается и сверяется по CRC. quick — быстрая
+        проверка: читаются лишь файлы с другим mtime (правку на месте без
+        смены размера и mtime она не заметит). Если CRC совпал, в индекс
+        пишется новый mtime.
+        """
+        if not self.exists():
+            raise FileNotFoundError(f"No install index in {self.main_dir}; install the modpack first.")
+        started = time.monotonic()
+        with contextlib.closing(self.connect()) as db:
+            rows = db.execute("SELECT path, size, mtime_ns, crc32 FROM files").fetchall()
+        problems, rehash = [], []
+        for rel, size, mtime_ns, crc in rows:
+            try:
+                st = os.stat(self.full_path(rel))
+            except OSError:
+                problems.append((rel, "missing"))
+                continue
+            if st.st_size != size:
+                problems.append((rel, "size"))
+            elif not quick or st.st_mtime_ns != mtime_ns:
+                rehash.append((rel, crc, st.st_mtime_ns))
+
+        if status_callback:
+            status_callback(f"Verifying: rehashing {len(rehash)} of {len(rows)} files...")
+        touched = []
+        mtimes = {rel: mtime_ns for rel, _, mtime_ns, _ in rows}
+        with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+            for (rel, crc, mtime_ns), actual in zip(rehash, pool.map(
+                    lambda item: file_crc32(self.full_path(item[0])), rehash)):
+                if actual != crc:
+                    problems.append((rel, "modified"))
+                elif mtime_ns != mtimes[rel]:
+                    touched.append((mtime_ns, rel))
+        if touched:
+            with contextlib.closing(self.connect()) as db, db:
+                db.executemany("UPDATE files SET mtime_ns = ? WHERE path = ?", touched)
+        logger.info(f"Verified {len(rows)} files in {time.monotonic() - started:.1f}s "
+                    f"({len(rehash)} rehashed): {len(problems)} do not match the modpack")
+        return sorted(problems)
+
+    def repair(self,
+               paths: List[str],
+               service_account_file: Optional[str] = None,
+               progress_callback: Optional[Callable[[int], None]] = None,
+               status_callback: Optional[Callable[[str], None]] = None,
+               store_dir: Optional[str] = None) -> int:
+        """
+        Возвращаем файлы paths из их архивов. Архив берём по пути из индекса;
+        если его уже нет, а версия на Drive та же — качаем в кэш заново.
+        Испорченные файлы хранилища (ContentStore), на которые ссылались
+        paths, выбрасываются, чтобы их не поставили в другие папки.
+        Возвращает число восстановленных файлов.
+        """
+        wanted = set(paths)
+        store_root = store_dir or os.path.join(app_data_dir(), "store")
+        if os.path.isdir(store_root):
+            ContentStore(store_root).evict_linked(self.main_dir, paths)
+        with contextlib.closing(self.connect()) as db:
+            by_source = collections.defaultdict(dict)
+            for rel, size, crc, source_id in db.execute("SELECT path, size, crc32, source FROM files"):
+                if rel in wanted:
+                    by_source[source_id][rel] = (size, crc)
+            sources = {source_id: json.loads(info or "{}") for source_id, info in db.execute("SELECT id, info FROM sources")}
+
+        repaired = 0
+        for source_id, files in by_source.items():
+            source = sources.get(source_id, {})
+            if source.get("folder_id"):
+                repaired += self.repair_from_folder(source, files, service_account_file,
+                                                    progress_callback, status_callback)
+                continue
+            archive_path = self.source_archive(source, service_account_file)
+            backend = archive_backend_for(archive_path)
+            with backend(archive_path) as archive:
+                members = archive.members()
+            jobs = []
+            for member in members:
+                rel = minecraft_relpath(member.name)
+                if member.is_file and rel is not None and rel.replace(os.sep, "/") in files:
+                    jobs.append((member, os.path.join(self.main_dir, rel)))
+            progress = ProgressTracker(f"Repairing from {os.path.basename(archive_path)}",
+                                       sum(member.size for member, _ in jobs),
+                                       progress_callback or (lambda value: None), status_callback)
+            crcs = {}
+            extract_members(backend, archive_path, [], jobs, progress, crcs=crcs)
+            # CRC — записанных данных, а не прежний из индекса
+            self.update({os.path.relpath(dst, self.main_dir).replace(os.sep, "/"): (member.size, crcs.get(dst))
+                         for member, dst in jobs}, source)
+            repaired += len(jobs)
+            logger.info(f"Repaired {len(jobs)} files from {archive_path}")
+        return repaired
+
+    def repair_from_folder(self,
+                           source: dict,
+                           files: Dict[str, Tuple[int, Optional[int]]],
+                           service_account_file: Optional[str],
+                           progress_callback: Optional[Callable[[int], None]] = None,
+                           status_callback: Optional[Callable[[str], None]] = None) -> int:
+        """
+        Файлы синхронизированной папки Drive качаем заново по одному —
+        если на Drive они те же (MD5), что в манифесте синхронизации.
+        """
+        name = source.get("archive", source["folder_id"])
+        if not service_account_file:
+            raise FileNotFoundError(f"Drive folder {name} is needed to repair these files.")
+        service = get_drive_service(service_account_file)
+        remote = list_drive_tree(service, source["folder_id"])
+        synced = load_sync_manifest(self.main_dir)
+        for rel in files:
+            if rel not in remote or remote[rel]["md5Checksum"] != synced.get(rel, {}).get("md5Checksum"):
+                raise ValueError(f"{rel} has changed in Drive folder {name} since it was synced; "
+                                 f"sync the folder instead of repairing.")
+        progress = ProgressTracker(f"Repairing from {name}", sum(remote[rel]["size"] for rel in files),
+                                   progress_callback or (lambda value: None), status_callback)
+        http = new_http(service.files().list().http)
+        for rel in sorted(files):
+            request = service.files().get_media(fileId=remote[rel]["id"])
+            download_drive_file(request, self.full_path(rel), remote[rel]["size"], http, progress,
+                                md5_checksum=remote[rel]["md5Checksum"])
+        self.update({rel: (remote[rel]["size"], None) for rel in files}, source)
+        logger.info(f"Repaired {len(files)} files from {name}")
+        return len(files)
+
+    def source_archive(self, source: dict, service_account_file: Optional[str]) -> str:
+        archive_path = source.get("archive", "")
+        if os.path.isfile(archive_path):
+            return archive_path
+        name = source.get("name") or os.path.basename(archive_path)
+        if not source.get("file_id") or not service_account_file:
+            raise FileNotFoundError(f"Archive {name} used for this install is no longer available.")
+        service = get_drive_service(service_account_file)
+        file_info = get_file_info(service, source["file_id"])
+        if archive_version(file_info) != archive_version(source):
+            raise ValueError(f"Archive {name} has changed on Drive since it was installed; "
+                             f"install the update instead of repairing.")
+        return download_file(service, source["file_id"], self.main_dir, lambda value: None,
+                             cache=ArchiveCache(), file_info=file_info)
+
+# ==================== Проверка перед установкой ====================
+
+class PreflightResult:
+    """
+    Итог проверки перед установкой. errors — {проверка: причина} для
+    проваленных; file_info — метаданные архива (или папки) с Drive, чтобы
+    установка не запрашивала их второй раз.
+    """
+    def __init__(self):
+        self.errors = {}
+        self.file_info = None
+        self.free_bytes = None
+        self.needed_bytes = None
+        self.elapsed = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def summary(self) -> str:
+        if self.ok:
+            return f"Preflight OK in {self.elapsed:.2f}s"
+        return "; ".join(f"{check}: {error}" for check, error in self.errors.items())
+
+def preflight(url: str, main_dir: str, service_account_file: str,
+              use_cache: bool = USE_ARCHIVE_CACHE) -> PreflightResult:
+    """
+    Проверки перед установкой разом, в пуле: сеть, ключ сервисного аккаунта
+    (с получением токена) и метаданные на Drive, свободное место. Ждём самую
+    долгую, а не сумму. Исключений не бросает — всё собирается в результат.
+    """
+    started = time.monotonic()
+    result = PreflightResult()
+    folder_id = extract_folder_id(url)
+
+    def connectivity():
+        if not check_internet_connection():
+            raise ConnectionError(f"no connection to {CONNECTIVITY_PROBE[0]}")
+
+    def drive():
+        try:
+            service = authorize_drive_service(service_account_file)
+        except Exception as e:
+            result.errors["credentials"] = str(e)
+            return
+        try:
+            # Сервис общий с установкой — соединение своё (как у частей сборки)
+            http = new_http(service.files().list().http)
+            if folder_id:
+                info = service.files().get(fileId=folder_id, fields="name, mimeType").execute(http=http)
+                if info.get("mimeType") != DRIVE_FOLDER_MIME:
+                    raise ValueError(f"{info.get('name')} is not a folder")
+            else:
+                info = get_file_info(service, extract_file_id(url), http)
+            result.file_info = info
+        except Exception as e:
+            result.errors["metadata"] = str(e)
+
+    def free_space() -> dict:
+        # Свободное место по устройствам: main и кэш архивов могут быть на разных дисках
+        space = {}
+        for path_ in [main_dir] + ([app_data_dir("archives")] if use_cache else []):
+            space.setdefault(os.stat(path_).st_dev, (path_, shutil.disk_usage(path_).free))
+        return space
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        checks = {"connection": pool.submit(connectivity), "drive": pool.submit(drive),
+                  "disk space": pool.submit(free_space)}
+        for check, future in checks.items():
+            try:
+                future.result()
+            except Exception as e:
+                result.errors[check] = str(e)
+
+    info = result.file_info
+    if "disk space" not in result.errors and info and not folder_id and not is_parts_manifest(info.get("name", "")):
+        # Папка Drive и части сборки размера заранее не знают — их место не проверяем
+        try:
+            size = int(info.get("size") or 0)
+            space = checks["disk space"].result()
+            main_device = os.stat(main_dir).st_dev
+            needed = dict.fromkeys(space, 0)
+            needed[main_device] += int(size * (PREFLIGHT_SPACE_FACTOR - 1))  # Распакованные файлы
+            if not (use_cache and ArchiveCache().lookup(extract_file_id(url), info, touch=False)):
+                needed[os.stat(app_data_dir("archives") if use_cache else main_dir).st_dev] += size  # Сам архив
+            for device, (path_, free) in space.items():
+                if free < needed[device]:
+                    result.errors["disk space"] = f"{format_bytes(needed[device])} needed on {path_}, " \
+                                                  f"{format_bytes(free)} free"
+            result.free_bytes, result.needed_bytes = space[main_device][1], needed[main_device]
+        except Exception as e:
+            result.errors["disk space"] = str(e)
+
+    result.elapsed = time.monotonic() - started
+    logger.info(result.summary())
+    return result
+
+# ==================== Исключения ====================
+
+class ExclusionFilter:
+    """
+    Правила вкладки Exclusions, собранные один раз перед распаковкой
+    (пути — относительно .minecraft, через '/'):
+    - ignored_files: имя файла ("options.txt"), путь ("config/a.cfg")
+      или glob по имени/пути ("*.log", "config/*.bak") — такие файлы не ставим;
+    - ignored_folders: имя папки на любом уровне ("logs"), префикс пути
+      ("config/old") или glob по имени папки ("*cache*") — не ставим ничего внутри;
+    - keep_in_main: подстроки пути — если такой файл уже есть в main, не перезаписываем;
+    - skip_if_in_main (MC_FILES_TO_REMOVE): имена, которые не ставим, если файл
+      с таким именем есть в корне main.
+    Папки managed_folders (mods/, configs/) заменяются целиком, поэтому для них
+    действуют только ignored_*.
+    """
+    GLOB_CHARS = ("*", "?", "[")
+
+    def __init__(self,
+                 ignored_files: List[str] = (),
+                 ignored_folders: List[str] = (),
+                 keep_in_main: List[str] = (),
+                 skip_if_in_main: List[str] = MC_FILES_TO_REMOVE,
+                 managed_folders: List[str] = MODS_FOLDERS):
+        def entries(values):
+            return [v.strip().replace("\\", "/").strip("/") for v in values if v.strip()]
+
+        def compile_globs(patterns):
+            return re.compile("|".join(fnmatch.translate(p) for p in patterns)) if patterns else None
+
+        file_globs = [e for e in entries(ignored_files) if any(c in e for c in self.GLOB_CHARS)]
+        file_plain = [e for e in entries(ignored_files) if e not in file_globs]
+        self.ignored_names = {e for e in file_plain if "/" not in e}
+        self.ignored_paths = {e for e in file_plain if "/" in e}
+        self.name_glob = compile_globs([e for e in file_globs if "/" not in e])
+        self.path_glob = compile_globs([e for e in file_globs if "/" in e])
+
+        folder_globs = [e for e in entries(ignored_folders) if any(c in e for c in self.GLOB_CHARS)]
+        folder_plain = [e for e in entries(ignored_folders) if e not in folder_globs]
+        self.folder_names = {e for e in folder_plain if "/" not in e}
+        self.folder_prefixes = tuple(e + "/" for e in folder_plain if "/" in e)
+        self.folder_glob = compile_globs(folder_globs)
+
+        self.keep_substrings = tuple(entries(keep_in_main))
+        self.skip_if_in_main = set(skip_if_in_main)
+        self.managed_prefixes = tuple(f.strip("/") + "/" for f in managed_folders)
+
+    def is_ignored_dir(self, rel: str) -> bool:
+        rel = rel.replace(os.sep, "/")
+        if (rel + "/").startswith(self.folder_prefixes):
+            return True
+        for part in rel.split("/"):
+            if part in self.folder_names or (self.folder_glob and self.folder_glob.match(part)):
+                return True
+        return False
+
+    def is_ignored_file(self, rel: str) -> bool:
+        rel = rel.replace(os.sep, "/")
+        parent, _, name = rel.rpartition("/")
+        if name in self.ignored_names or rel in self.ignored_paths:
+            return True
+        if (self.name_glob and self.name_glob.match(name)) or (self.path_glob and self.path_glob.match(rel)):
+            return True
+        return bool(parent) and self.is_ignored_dir(parent)
+
+    def is_protected(self, rel: str) -> bool:
+        rel = rel.replace(os.sep, "/")
+        return any(sub in rel for sub in self.keep_substrings)
+
+    def skip_reason(self, rel: str, main_dir: str) -> Optional[str]:
+        """
+        Почему файл rel не надо ставить в main_dir (None — ставим).
+        Обращения к диску — только для файлов, подходящих под правила «если есть в main».
+        """
+        if self.is_ignored_file(rel):
+            return "ignored"
+        if rel.replace(os.sep, "/").startswith(self.managed_prefixes):
+            return None
+        if os.path.basename(rel) in self.skip_if_in_main and \
+                os.path.exists(os.path.join(main_dir, os.path.basename(rel))):
+            return "exists in main"
+        if self.is_protected(rel) and os.path.exists(os.path.join(main_dir, rel)):
+            return "kept in main"
+        return None
+
+# ==================== Установка ====================
+
+class Installer:
+    """
+    Установка архива сборки в папку игры (main). Прогресс, статус и сообщения
+    отдаются через callbacks — в GUI это сигналы QThread, в CLI — логгер.
+    """
+    def __init__(self,
+                 file_path: str,
+                 extract_folder: str,
+                 ignored_files: List[str],
+                 ignored_folders: List[str],
+                 keep_in_main: List[str],
+                 direct_install: bool = DIRECT_INSTALL,
+                 progress_callback: Optional[Callable[[int], None]] = None,
+                 status_callback: Optional[Callable[[str], None]] = None,
+                 message_callback: Optional[Callable[[str], None]] = None,
+                 delta_install: bool = DELTA_INSTALL,
+                 snapshot_before_install: bool = SNAPSHOT_BEFORE_INSTALL,
+                 use_store: bool = USE_CONTENT_STORE,
+                 store_dir: Optional[str] = None):
+        self.file_path = file_path
+        self.extract_folder = extract_folder
+        self.ignored_files = ignored_files
+        self.ignored_folders = ignored_folders
+        self.keep_in_main = keep_in_main
+        self.direct_install = direct_install
+        self.delta_install = delta_install
+        self.snapshot_before_install = snapshot_before_install
+        self.progress_callback = progress_callback
+        self.status_callback = status_callback
+        self.message_callback = message_callback
+        self.exclusions = ExclusionFilter(ignored_files, ignored_folders, keep_in_main)
+        self.skipped = collections.Counter()
+        self.archive_files = set()  # Все файлы .minecraft/ из архива (пути относительно .minecraft)
+        self.store = ContentStore(store_dir) if use_store else None
+        self.workers = EXTRACT_WORKERS
+        self.linked = {}  # Файлы, поставленные ссылками на хранилище: путь относительно .minecraft -> sha256
+        self.planned = {}  # Файлы из архива для индекса: путь через '/' -> (размер, CRC32 или None)
+        self.compare = set()  # Пути назначения, которые сверяются с main по содержимому при записи (tar)
+        self.drive_source = {}  # file_id и версия архива на Drive, если он оттуда
+
+    def on_progress(self, value: int):
+        if self.progress_callback:
+            self.progress_callback(value)
+
+    def on_status(self, text: str):
+        if self.status_callback:
+            self.status_callback(text)
+
+    def on_message(self, text: str):
+        if self.message_callback:
+            self.message_callback(text)
+        else:
+            logger.info(text)
+
+    def make_progress(self, phase: str, total_bytes: int) -> ProgressTracker:
+        return ProgressTracker(phase, total_bytes, self.on_progress, self.on_status)
+
+    @telemetry_run("install")
+    def custom_install_process(self):
+        """
+        1) Создаём папку tmp
+        2) Распаковываем архив => tmp
+        3) Удаляем mods/, configs/ в main
+        4) options.txt/server.dat (если они есть в main) и всё из Exclusions
+           отсеиваем ещё при распаковке — в tmp они не попадают
+        5) Переносим tmp/.minecraft => main (overwrite, os.replace — без копирования)
+        6) Удаляем tmp (и при желании — сам архив)
+
+        При direct_install шаги 1, 5, 6 не нужны — см. direct_install_process.
+        """
+        main_dir = self.extract_folder
+        archive_path = self.file_path
+        annotate_run(target=main_dir, archive=os.path.basename(archive_path),
+                     direct=self.direct_install, delta=self.delta_install, store=self.store is not None)
+
+        if self.direct_install:
+            self.direct_install_process(archive_path, main_dir)
+            self.write_index(main_dir)
+            return
+
+        # 1. Папка tmp
+        tmp_dir = os.path.join(main_dir, "tmp")
+        if not os.path.exists(tmp_dir):
+            os.makedirs(tmp_dir)
+
+        # 2. Распаковать архива => tmp (битый архив прерывает установку до шага 3)
+        try:
+            self.extract_to_tmp(archive_path, tmp_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.finish_staged_install(tmp_dir, main_dir)
+        self.write_index(main_dir)
+        # (Если хотите удалять архив — раскомментируйте)
+        # os.remove(archive_path)
+
+    def finish_staged_install(self, tmp_dir: str, main_dir: str):
+        """
+        Шаги 3-6 установки через tmp (архив уже распакован в tmp_dir).
+        Ошибка или прерывание на шагах 3-5 возвращает main к снимку.
+        """
+        # 3. Удаляем mods/, configs/ из main (сохранив их снимок и файлы, которые перенос перезапишет)
+        mc_path = os.path.join(tmp_dir, MC_ROOT)
+        paths = [os.path.relpath(os.path.join(root, name), mc_path).replace(os.sep, "/")
+                 for root, _, files in os.walk(mc_path) for name in files]
+        snapshot_id = self.take_snapshot(main_dir, paths)
+        try:
+            self.remove_mods_folders_in_main(main_dir, MODS_FOLDERS)
+
+            # 5. Переносим tmp/.minecraft => main
+            self.place_minecraft_in_main(tmp_dir, main_dir)
+        except BaseException:
+            self.restore_snapshot(main_dir, snapshot_id)
+            raise
+
+        # 6. Удаляем tmp
+        with run_phase("cleanup"):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.record_links(main_dir)
+
+    def direct_install_process(self, archive_path: str, main_dir: str):
+        """
+        Прямая установка без tmp:
+        1) Читаем оглавление архива, проверяем, что в нём есть .minecraft,
+           и сразу отсеиваем исключения (см. ExclusionFilter)
+        2) При delta_install из архива оставляем лишь новые/изменённые файлы
+        3) Снимок mods/, configs/ и всех остальных файлов, которые сейчас
+           будут перезаписаны
+        4) Пишем их из .minecraft/ сразу в main (временное имя + os.replace),
+           сверяя размер и CRC
+        5) Только после этого удаляем из mods/, configs/ файлы, которых нет
+           в архиве
+        Любая ошибка (и прерывание) на шагах 4-5 возвращает main к снимку.
+        """
+        backend = archive_backend_for(archive_path)
+        with run_phase("read index") as entry, backend(archive_path) as archive:
+            dirs, jobs = self.plan_members(archive.members(), main_dir, main_dir)
+            entry["files"] = len(jobs)
+        total = len(jobs)
+        if self.delta_install:
+            jobs = self.changed_jobs(jobs)
+        snapshot_id = self.take_snapshot(main_dir, job_paths(jobs, main_dir))
+        store = self.active_store(main_dir)
+        crcs, same = {}, set()
+        try:
+            if store is not None:
+                jobs = self.link_stored_jobs(store, jobs, main_dir)
+            progress = self.make_progress("Installing", sum(member.size for member, _ in jobs))
+            with run_phase("extract", files=len(jobs), bytes=progress.total, workers=self.workers) as entry:
+                linked = extract_members(backend, archive_path, dirs, jobs, progress, self.workers, store, crcs,
+                                         self.compare, same)
+                entry["unchanged"] = len(same)
+            self.note_written(crcs, main_dir)
+            self.linked.update({os.path.relpath(dst, main_dir): sha for dst, sha in linked.items()})
+            self.record_links(main_dir)
+            removed = self.remove_stale_files_in_main(main_dir, MODS_FOLDERS)
+        except BaseException:
+            self.restore_snapshot(main_dir, snapshot_id)
+            raise
+        logger.info(f"Installed {len(jobs) - len(same)} of {total} files from {archive_path} to {main_dir}, "
+                    f"{removed} stale files removed")
+
+    def accept_member(self, rel: str, is_dir: bool, is_file: bool, main_dir: str) -> bool:
+        if is_dir:
+            return not self.exclusions.is_ignored_dir(rel)
+        if not is_file:
+            self.skipped["non-regular"] += 1
+            return False
+        reason = self.exclusions.skip_reason(rel, main_dir)
+        if reason:
+            self.skipped[reason] += 1
+            logger.debug(f"Skipped {rel}: {reason}")
+            return False
+        return True
+
+    def plan_members(self, members: List[ArchiveMember], main_dir: str,
+                     dest_root: str) -> Tuple[List[str], List[Tuple[ArchiveMember, str]]]:
+        """
+        За один проход по оглавлению архива отбираем то, что надо записать:
+        папки и пары (член архива, путь назначения внутри dest_root).
+        """
+        self.skipped.clear()
+        self.archive_files.clear()
+        self.linked.clear()
+        self.planned.clear()
+        self.compare.clear()
+        dirs, jobs, found = [], [], False
+        for member in members:
+            rel = minecraft_relpath(member.name)
+            if rel is None:
+                continue
+            found = True
+            if member.is_file:
+                self.archive_files.add(rel.replace(os.sep, "/"))
+            if self.accept_member(rel, member.is_dir, member.is_file, main_dir):
+                if member.is_dir:
+                    dirs.append(os.path.join(dest_root, rel))
+                else:
+                    jobs.append((member, os.path.join(dest_root, rel)))
+                    self.planned[rel.replace(os.sep, "/")] = (member.size, member.crc)
+        # До любых изменений в main убеждаемся, что сборка вообще есть в архиве
+        if not found:
+            raise FileNotFoundError("No .minecraft folder found inside the archive.")
+        self.log_skipped()
+        return dirs, jobs
+
+    def note_written(self, crcs: Dict[str, int], dest_root: str):
+        """
+        CRC32, посчитанные при записи, — в план индекса для членов, у
+        которых CRC нет в оглавлении (tar): индексу не придётся их перечитывать.
+        """
+        for dst, crc in crcs.items():
+            rel = os.path.relpath(dst, dest_root).replace(os.sep, "/")
+            if rel in self.planned and self.planned[rel][1] is None:
+                self.planned[rel] = (self.planned[rel][0], crc)
+
+    def log_skipped(self):
+        if self.skipped:
+            summary = ", ".join(f"{count} {reason}" for reason, count in self.skipped.items())
+            logger.info(f"Skipped archive members: {summary}")
+
+    def extract_to_tmp(self, archive_path: str, tmp_dir: str):
+        mc_path = os.path.join(tmp_dir, MC_ROOT)
+        backend = archive_backend_for(archive_path)
+        with run_phase("read index") as entry, backend(archive_path) as archive:
+            dirs, jobs = self.plan_members(archive.members(), self.extract_folder, mc_path)
+            entry["files"] = len(jobs)
+        store = self.active_store(self.extract_folder)
+        if store is not None:
+            jobs = self.link_stored_jobs(store, jobs, mc_path)
+        progress = self.make_progress("Extracting", sum(member.size for member, _ in jobs))
+        crcs = {}
+        with run_phase("extract", files=len(jobs), bytes=progress.total, workers=self.workers):
+            linked = extract_members(backend, archive_path, [mc_path] + dirs, jobs, progress, self.workers, store,
+                                     crcs)
+        self.note_written(crcs, mc_path)
+        self.linked.update({os.path.relpath(dst, mc_path): sha for dst, sha in linked.items()})
+
+    def active_store(self, main_dir: str) -> Optional[ContentStore]:
+        if self.store is None:
+            return None
+        if not self.store.usable_for(main_dir):
+            logger.info(f"Content store {self.store.root} is on another drive than {main_dir}, not using it")
+            return None
+        return self.store
+
+    def link_stored_jobs(self, store: ContentStore, jobs: list, dest_root: str) -> list:
+        """
+        Члены, которые уже есть в хранилище (по размеру и CRC из оглавления),
+        ставим ссылками без распаковки. Возвращает оставшиеся.
+        """
+        rest = []
+        with run_phase("store link") as entry:
+            for member, dst in jobs:
+                sha = store.lookup(store.crc_alias(member.size, member.crc), member.size) \
+                    if store.accepts(dst) else None
+                if sha is None:
+                    rest.append((member, dst))
+                    continue
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                store.link(sha, dst)
+                self.linked[os.path.relpath(dst, dest_root)] = sha
+            entry["files"] = len(jobs) - len(rest)
+        if len(rest) < len(jobs):
+            logger.info(f"Linked {len(jobs) - len(rest)} files from the content store without extracting")
+        return rest
+
+    def write_index(self, main_dir: str, parts: Optional[list] = None, keep: Optional[set] = None):
+        """
+        Индекс установленных файлов (см. InstallIndex) — по нему работает Verify.
+        parts — [(файлы, источник)] для сборки из нескольких архивов, keep —
+        все её файлы. Без индекса установка всё равно считается удачной.
+        """
+        if parts is None:
+            parts = [(self.planned, dict(self.drive_source, archive=os.path.abspath(self.file_path)))]
+            keep = set(self.planned)
+        try:
+            with run_phase("index", files=sum(len(planned) for planned, _ in parts)):
+                index = InstallIndex(main_dir)
+                for planned, source in parts:
+                    index.update(planned, source)
+                index.prune(keep)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Could not update the install index of {main_dir}: {e}")
+
+    def record_links(self, main_dir: str):
+        if self.store is not None and self.linked:
+            self.store.record(main_dir, self.linked)
+
+    def take_snapshot(self, main_dir: str, paths: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Снимок mods/, configs/ и файлов paths вне них (пути относительно main
+        через '/') перед тем, как их менять (см. SnapshotManager).
+        Неудачный снимок не мешает установке.
+        """
+        if not self.snapshot_before_install:
+            return None
+        try:
+            with run_phase("snapshot"):
+                label = f"before {os.path.basename(self.file_path) or 'update'}"
+                return SnapshotManager(main_dir).create(label=label, paths=paths)
+        except OSError as e:
+            logger.warning(f"Could not snapshot {main_dir}: {e}")
+            return None
+
+    def add_to_snapshot(self, main_dir: str, snapshot_id: Optional[str], jobs: list):
+        """
+        Дополняем снимок файлами, которые перезапишут jobs (для установки по частям).
+        """
+        if not snapshot_id:
+            return
+        try:
+            with run_phase("snapshot") as entry:
+                entry["files"] = SnapshotManager(main_dir).add(snapshot_id, job_paths(jobs, main_dir))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not add files to snapshot {snapshot_id}: {e}")
+
+    def restore_snapshot(self, main_dir: str, snapshot_id: Optional[str]):
+        """
+        Возвращаем main к снимку после прерванной записи в него.
+        """
+        if not snapshot_id:
+            return
+        try:
+            SnapshotManager(main_dir).restore(snapshot_id)
+            self.on_message(f"Installation aborted, restored snapshot {snapshot_id}.")
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not restore snapshot {snapshot_id}: {e}")
+
+    def changed_jobs(self, jobs: list) -> list:
+        """
+        Отбрасываем члены архива, которые уже лежат в main без изменений.
+        Сравнение читает только файлы совпадающего размера. Члены без CRC
+        (tar) с файлом того же размера остаются и попадают в self.compare:
+        их сверит с main сама распаковка.
+        """
+        progress = self.make_progress("Comparing", sum(member.size for member, _ in jobs))
+
+        def check(job):
+            unchanged = member_unchanged(*job)
+            progress.add(job[0].size)
+            return unchanged
+
+        with run_phase("compare", files=len(jobs), bytes=progress.total) as entry:
+            with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+                unchanged = list(pool.map(check, jobs))
+            entry["changed"] = unchanged.count(False)
+            entry["compare"] = unchanged.count(None)
+        progress.finish()
+        self.compare = {dst for (_, dst), same in zip(jobs, unchanged) if same is None}
+        return [job for job, same in zip(jobs, unchanged) if not same]
+
+    def remove_stale_files_in_main(self, main_dir: str, folders: List[str]) -> int:
+        """
+        Вместо удаления mods/, configs/ целиком убираем из них только файлы,
+        которых нет в архиве, и опустевшие папки. Возвращает число удалённых файлов.
+        """
+        removed = 0
+        with run_phase("remove stale") as entry:
+            for folder_name in folders:
+                path_ = os.path.join(main_dir, folder_name)
+                for root, _, files in os.walk(path_, topdown=False):
+                    for name in files:
+                        file_path = os.path.join(root, name)
+                        rel = os.path.relpath(file_path, main_dir).replace(os.sep, "/")
+                        if rel not in self.archive_files:
+                            os.remove(file_path)
+                            logger.debug(f"Removed stale file: {file_path}")
+                            removed += 1
+                    if not os.listdir(root):
+                        os.rmdir(root)
+            entry["files"] = removed
+        return removed
+
+    def remove_mods_folders_in_main(self, main_dir: str, folders: List[str]):
+        with run_phase("remove folders"):
+            for folder_name in folders:
+                path_ = os.path.join(main_dir, folder_name)
+                if os.path.isdir(path_):
+                    shutil.rmtree(path_, ignore_errors=True)
+                    logger.info(f"Removed folder: {path_}")
+
+    def place_minecraft_in_main(self, tmp_dir: str, main_dir: str):
+        mc_path = os.path.join(tmp_dir, MC_ROOT)
+        if not os.path.exists(mc_path):
+            return
+        total = sum(os.path.getsize(os.path.join(root, f))
+                    for root, _, files in os.walk(mc_path) for f in files)
+        progress = self.make_progress("Placing", total)
+        with run_phase("place", bytes=total) as entry:
+            placed = place_tree(mc_path, main_dir, lambda path_: progress.add(os.path.getsize(path_)))
+            entry["files"] = placed
+        progress.finish()
+        logger.info(f"Moved {placed} files from {mc_path} to {main_dir}")
+
+class StreamInstaller(Installer):
+    """
+    Закачка и установка одним конвейером. Для tar-архивов куски из закачки
+    через ограниченную очередь идут в потоковый tarfile ("r|*"), который
+    распаковывает каждый член по мере прихода — общее время ближе к
+    max(закачка, распаковка), а не к их сумме. Остальные архивы (архивы,
+    уже лежащие в кэше, и все архивы, если поток не годится — см. can_stream)
+    ставятся обычным путём: download_file + Installer.
+    """
+    def __init__(self,
+                 url: str,
+                 extract_folder: str,
+                 service_account_file: str,
+                 ignored_files: List[str],
+                 ignored_folders: List[str],
+                 keep_in_main: List[str],
+                 use_cache: bool = USE_ARCHIVE_CACHE,
+                 file_info: Optional[dict] = None,
+                 **callbacks):
+        super().__init__("", extract_folder, ignored_files, ignored_folders, keep_in_main, **callbacks)
+        self.url = url
+        self.service_account_file = service_account_file
+        self.use_cache = use_cache
+        self.file_info = file_info  # Метаданные, уже полученные проверкой перед установкой
+
+    @telemetry_run("install")
+    def custom_install_process(self):
+        with run_phase("metadata"):
+            service = get_drive_service(self.service_account_file)
+            file_id = extract_file_id(self.url)
+            file_info = self.file_info or get_file_info(service, file_id)
+        file_name = file_info.get("name", "downloaded_file")
+        file_size = int(file_info.get("size") or 0)
+        cache = ArchiveCache() if self.use_cache else None
+        annotate_run(target=self.extract_folder, archive=file_name, archive_size=file_size)
+
+        if is_parts_manifest(file_name):
+            self.file_path = download_file(service, file_id, self.extract_folder, lambda value: None,
+                                           cache=cache, file_info=file_info)
+            installer = MultiPartInstaller(
+                self.file_path, self.extract_folder, self.service_account_file, self.ignored_files,
+                self.ignored_folders, self.keep_in_main, self.use_cache,
+                delta_install=self.delta_install,
+                snapshot_before_install=self.snapshot_before_install,
+                progress_callback=self.progress_callback,
+                status_callback=self.status_callback,
+                message_callback=self.message_callback
+            )
+            installer.store = self.store
+            installer.custom_install_process()
+            return
+
+        if not self.can_stream(file_name, file_size) or (cache is not None and cache.lookup(file_id, file_info)):
+            self.on_message(f"Downloading {file_name}...")
+            self.file_path = download_file(
+                service=service,
+                file_id=file_id,
+                save_folder=self.extract_folder,
+                progress_callback=self.on_progress,
+                cache=cache,
+                file_info=file_info,
+                status_callback=self.on_status
+            )
+            self.on_message(f"Downloaded file: {self.file_path}")
+            self.on_progress(0)
+            self.drive_source = dict(archive_version(file_info), file_id=file_id)
+            try:
+                super().custom_install_process()
+            except IntegrityError:
+                # Архив из кэша испортился на диске — в следующий раз скачаем заново
+                if cache is not None:
+                    cache.discard(file_id, file_info)
+                raise
+            mark_installed(self.extract_folder, file_info)
+            return
+
+        self.on_message(f"Streaming {file_name} (download and extraction overlap)...")
+        file_path = cache.path_for(file_id, file_info) if cache is not None \
+            else os.path.join(self.extract_folder, file_name)
+        remote = {
+            "file_id": file_id,
+            "size": file_size,
+            "md5Checksum": file_info.get("md5Checksum"),
+            "modifiedTime": file_info.get("modifiedTime"),
+        }
+        tmp_dir = os.path.join(self.extract_folder, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        self.found_minecraft = False
+
+        reader = ChunkQueueReader()
+        request = service.files().get_media(fileId=file_id)
+
+        progress = self.make_progress("Downloading + extracting", file_size)
+
+        def produce():
+            try:
+                stream_download(request, file_size, file_path + PART_SUFFIX,
+                                file_path + PART_STATE_SUFFIX, remote, reader, progress)
+                reader.put(None)
+            except BaseException as e:
+                if not reader.closed.is_set():
+                    reader.put(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            with run_phase("download + extract", bytes=file_size) as entry:
+                entry["files"] = self.extract_tar_stream(reader, tmp_dir)
+        except BaseException:
+            # Обрыв или несовпавший MD5 — main ещё не тронут, убираем только tmp
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        finally:
+            reader.close()
+            producer.join()
+
+        os.replace(file_path + PART_SUFFIX, file_path)
+        os.remove(file_path + PART_STATE_SUFFIX)
+        if cache is not None:
+            cache.add(file_id, file_info, file_path)
+
+        if not self.found_minecraft:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise FileNotFoundError("No .minecraft folder found inside the archive.")
+        self.finish_staged_install(tmp_dir, self.extract_folder)
+        self.file_path = file_path
+        self.drive_source = dict(archive_version(file_info), file_id=file_id)
+        self.write_index(self.extract_folder)
+        mark_installed(self.extract_folder, file_info)
+
+    def can_stream(self, file_name: str, file_size: int) -> bool:
+        """
+        Поток годится только для полной установки через tmp (без
+        direct_install и delta_install): члены tar приходят по одному, и
+        сверить их с main заранее нельзя, а закачка идёт одним соединением,
+        без сегментов download_file. Иначе быстрее скачать и поставить.
+        """
+        return STREAM_TAR_INSTALL and not self.direct_install and not self.delta_install and \
+            file_name.lower().endswith(TAR_STREAM_EXTENSIONS) and bool(file_size)
+
+    def extract_tar_stream(self, reader: ChunkQueueReader, tmp_dir: str) -> int:
+        """
+        Распаковка tar из очереди закачки в tmp_dir. Возвращает число записанных файлов.
+        """
+        written = 0
+        self.skipped.clear()
+        self.linked.clear()
+        self.planned.clear()
+        store = self.active_store(self.extract_folder)
+        mc_path = os.path.join(tmp_dir, MC_ROOT)
+        os.makedirs(mc_path, exist_ok=True)
+        with tarfile.open(fileobj=reader, mode="r|*") as tar_ref:
+            while True:
+                member = tar_ref.next()
+                if member is None:
+                    break
+                rel = minecraft_relpath(member.name)
+                if rel is not None:
+                    self.found_minecraft = True
+                if rel is not None and \
+                        self.accept_member(rel, member.isdir(), member.isfile(), self.extract_folder):
+                    dst = os.path.join(mc_path, rel)
+                    if member.isdir():
+                        os.makedirs(dst, exist_ok=True)
+                    elif member.isfile():
+                        os.makedirs(os.path.dirname(dst), exist_ok=True)
+                        try:
+                            with tar_ref.extractfile(member) as src:
+                                if store is not None and store.accepts(dst):
+                                    self.linked[rel], checksum = store.add(src, member.size, None, None)
+                                    store.link(self.linked[rel], dst)
+                                else:
+                                    checksum = write_file_atomic(src, dst, size=member.size)
+                        except (tarfile.TarError, zlib.error, EOFError, IntegrityError) as e:
+                            if e is reader.error:
+                                raise
+                            raise IntegrityError(f"Archive member {member.name} is corrupted: {e}") from e
+                        os.utime(dst, (member.mtime, member.mtime))
+                        self.planned[rel.replace(os.sep, "/")] = (member.size, checksum)
+                        written += 1
+                # Заголовки уже обработанных членов не копим — память не растёт
+                tar_ref.members = []
+            # Дочитываем хвост (нулевые блоки), чтобы закачка дошла до конца
+            while reader.read(1024 * 1024):
+                pass
+        self.log_skipped()
+        return written
+
+# ==================== Фоновая подготовка обновлений ====================
+
+def archive_version(file_info: dict) -> dict:
+    return {key: file_info.get(key) for key in ("name", "size", "md5Checksum", "modifiedTime")}
+
+def installed_version(main_dir: str) -> dict:
+    try:
+        with open(os.path.join(main_dir, INSTALLED_STATE_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def mark_installed(main_dir: str, file_info: dict):
+    """
+    Запоминаем, какая версия архива с Drive установлена в main_dir.
+    """
+    path_ = os.path.join(main_dir, INSTALLED_STATE_NAME)
+    with open(path_ + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(dict(archive_version(file_info), installed=time.time()), f)
+    os.replace(path_ + ".tmp", path_)
+
+class UpdateStager:
+    """
+    Фоновая подготовка обновления. stage() сверяет метаданные архива на
+    Drive с установленной (main/.fc-installed.json) и уже подготовленной
+    версией; новую версию качает в кэш архивов и распаковывает в
+    main/.fc-staged/.minecraft — в один поток и с низким приоритетом
+    ввода-вывода, чтобы не мешать игре. apply() делает только финальный
+    шаг установки через tmp (снимок, удаление mods/, configs/, перенос
+    переименованием) — секунды вместо минут.
+
+    Исключения применяются при распаковке, а перед apply() — ещё раз, по
+    текущему состоянию main: файл из keep_in_main, появившийся в main уже
+    после подготовки, не перезаписывается.
+    """
+    STATE_NAME = "staged.json"
+
+    def __init__(self,
+                 url: str,
+                 main_dir: str,
+                 service_account_file: str,
+                 ignored_files: List[str],
+                 ignored_folders: List[str],
+                 keep_in_main: List[str],
+                 **installer_kwargs):
+        self.url = url
+        self.main_dir = main_dir
+        self.service_account_file = service_account_file
+        self.installer_args = (ignored_files, ignored_folders, keep_in_main)
+        self.installer_kwargs = installer_kwargs
+        self.staging_dir = os.path.join(main_dir, STAGING_DIR_NAME)
+        self.state_path = os.path.join(self.staging_dir, self.STATE_NAME)
+
+    def staged_version(self) -> Optional[dict]:
+        """
+        Подготовленная версия, готовая к apply() (None — её нет).
+        """
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state if os.path.isdir(os.path.join(self.staging_dir, MC_ROOT)) else None
+
+    def discard(self):
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def stage(self, progress_callback: Optional[Callable[[int], None]] = None) -> Optional[dict]:
+        """
+        Готовим новую версию, если она есть. Возвращает подготовленную
+        версию или None, если main уже в актуальном состоянии.
+        """
+        service = get_drive_service(self.service_account_file)
+        file_id = extract_file_id(self.url)
+        file_info = get_file_info(service, file_id)
+        if is_parts_manifest(file_info.get("name", "")):
+            logger.info("Background preparation is not available for multi-part modpacks")
+            return None
+        version = archive_version(file_info)
+        staged = self.staged_version()
+
+        if archive_version(installed_version(self.main_dir)) == version:
+            if staged:
+                self.discard()
+            return None
+        if staged and archive_version(staged) == version:
+            return staged
+
+        logger.info(f"Preparing update {version['name']} in the background...")
+        started = time.monotonic()
+        self.discard()
+        with telemetry_run("prestage", target=self.main_dir), low_io_priority():
+            archive_path = download_file(
+                service=service,
+                file_id=file_id,
+                save_folder=self.main_dir,
+                progress_callback=progress_callback or (lambda value: None),
+                segments=1,
+                cache=ArchiveCache(),
+                file_info=file_info
+            )
+            installer = Installer(archive_path, self.main_dir, *self.installer_args,
+                                  direct_install=False, **self.installer_kwargs)
+            installer.workers = 1
+            try:
+                installer.extract_to_tmp(archive_path, self.staging_dir)
+            except BaseException:
+                self.discard()
+                raise
+        state = dict(version, file_id=file_id, staged=time.time(), linked=installer.linked,
+                     archive=os.path.abspath(archive_path), planned=installer.planned)
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        logger.info(f"Update {version['name']} is ready to apply "
+                    f"(prepared in {format_duration(time.monotonic() - started)})")
+        return state
+
+    @telemetry_run("apply update")
+    def apply(self, **callbacks) -> dict:
+        """
+        Ставим подготовленную версию в main. Возвращает её метаданные.
+        """
+        staged = self.staged_version()
+        if not staged:
+            raise FileNotFoundError(f"No prepared update in {self.staging_dir}")
+        started = time.monotonic()
+        installer = Installer(staged["name"] or "", self.main_dir, *self.installer_args,
+                              direct_install=False, **dict(self.installer_kwargs, **callbacks))
+        installer.linked = staged.get("linked", {})
+        installer.planned = {rel: tuple(meta) for rel, meta in staged.get("planned", {}).items()}
+        installer.drive_source = dict(archive_version(staged), file_id=staged.get("file_id"))
+        annotate_run(target=self.main_dir, archive=staged["name"])
+        os.remove(self.state_path)
+        self.drop_excluded(installer)
+        installer.finish_staged_install(self.staging_dir, self.main_dir)
+        if installer.planned:
+            installer.file_path = staged.get("archive") or installer.file_path
+            installer.write_index(self.main_dir)
+        mark_installed(self.main_dir, staged)
+        logger.info(f"Applied update {staged['name']} in {time.monotonic() - started:.1f}s")
+        return staged
+
+    def drop_excluded(self, installer: "Installer"):
+        """
+        Убираем из подготовленной версии файлы, которые по текущему
+        состоянию main (и текущим правилам) ставить уже не надо.
+        """
+        mc_path = os.path.join(self.staging_dir, MC_ROOT)
+        with run_phase("recheck exclusions") as entry:
+            for current, _, files in os.walk(mc_path):
+                for name in files:
+                    path_ = os.path.join(current, name)
+                    rel = os.path.relpath(path_, mc_path)
+                    reason = installer.exclusions.skip_reason(rel, self.main_dir)
+                    if reason is None:
+                        continue
+                    os.remove(path_)
+                    installer.linked.pop(rel, None)
+                    installer.planned.pop(rel.replace(os.sep, "/"), None)
+                    installer.skipped[reason] += 1
+                    logger.debug(f"Skipped {rel}: {reason} (changed since the update was prepared)")
+            entry["files"] = sum(installer.skipped.values())
+        installer.log_skipped()
+
+# ==================== Сборка из нескольких частей ====================
+
+def is_parts_manifest(name: str) -> bool:
+    return name.lower().endswith(MANIFEST_EXTENSION)
+
+def load_parts_manifest(path_: str) -> List[dict]:
+    """
+    Манифест сборки из нескольких архивов на Drive:
+
+        {"parts": [
+            {"name": "base", "url": "https://drive.google.com/file/d/<id>/view"},
+            {"name": "mods", "id": "<id>", "md5": "<md5Checksum>"},
+            {"name": "resourcepacks", "id": "<id>", "version": "2024-05"}
+        ]}
+
+    Части накладываются на main в порядке списка: если путь есть в
+    нескольких частях, остаётся файл из более поздней. md5 (по желанию) —
+    какой архив ожидается на Drive, version — метка, смена которой
+    заставляет переустановить часть.
+    """
+    try:
+        with open(path_, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except ValueError as e:
+        raise ValueError(f"Invalid modpack manifest {os.path.basename(path_)}: {e}") from e
+    parts = manifest.get("parts") if isinstance(manifest, dict) else None
+    if not parts:
+        raise ValueError("The modpack manifest lists no parts.")
+
+    result = []
+    for part in parts:
+        file_id = part.get("id") or (extract_file_id(part["url"]) if part.get("url") else None)
+        name = part.get("name") or file_id
+        if not file_id or name in (p["name"] for p in result):
+            raise ValueError(f"Invalid part in the modpack manifest: {part}")
+        result.append({"name": name, "id": file_id, "md5": part.get("md5"), "version": part.get("version")})
+    return result
+
+class MultiPartInstaller(Installer):
+    """
+    Сборка из нескольких архивов по манифесту (см. load_parts_manifest).
+    Скачиваются только части, чья версия на Drive отличается от записанной
+    в main/.fc-parts.json, — до PART_DOWNLOADS одновременно; каждая
+    ставится в main, как только скачана, но строго в порядке манифеста.
+    Файлы, которые принадлежат более поздней неизменной части, при этом
+    не трогаем, поэтому результат не зависит от того, какая закачка
+    закончилась первой. Лишнее из mods/, configs/ удаляется по объединённому
+    списку файлов всех частей.
+    """
+    def __init__(self,
+                 manifest_path: str,
+                 extract_folder: str,
+                 service_account_file: str,
+                 ignored_files: List[str],
+                 ignored_folders: List[str],
+                 keep_in_main: List[str],
+                 use_cache: bool = USE_ARCHIVE_CACHE,
+                 part_workers: int = PART_DOWNLOADS,
+                 **callbacks):
+        super().__init__(manifest_path, extract_folder, ignored_files, ignored_folders, keep_in_main, **callbacks)
+        self.service_account_file = service_account_file
+        self.use_cache = use_cache
+        self.part_workers = part_workers
+        self.state_path = os.path.join(extract_folder, PARTS_STATE_NAME)
+        self._progress_lock = threading.Lock()
+        self._part_sizes = {}
+        self._part_percent = {}
+        self.current_part = ""
+
+    def load_state(self) -> dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("parts", {})
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, parts: dict):
+        with open(self.state_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"parts": parts}, f)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    @staticmethod
+    def part_version(part: dict, file_info: dict) -> dict:
+        if part["md5"] and file_info.get("md5Checksum") and part["md5"] != file_info["md5Checksum"]:
+            raise ValueError(f"Part {part['name']} on Drive ({file_info['md5Checksum']}) does not match "
+                             f"the manifest ({part['md5']}); the manifest may be out of date.")
+        return dict(archive_version(file_info), version=part["version"])
+
+    def parts_to_install(self, parts: List[dict], versions: Dict[str, dict], state: dict) -> List[dict]:
+        if not self.delta_install:
+            return list(parts)
+        updated = {part["name"] for part in parts
+                   if state.get(part["name"], {}).get("version") != versions[part["name"]]}
+        todo = set(updated)
+        for i, part in enumerate(parts):
+            own = set(state.get(part["name"], {}).get("files", []))
+            # Изменившаяся более поздняя часть могла перестать перекрывать файлы этой
+            if part["name"] not in todo and any(own & set(state.get(later["name"], {}).get("files", []))
+                                                for later in parts[i + 1:] if later["name"] in updated):
+                todo.add(part["name"])
+        return [part for part in parts if part["name"] in todo]
+
+    def part_progress(self, name: str, stage: str) -> Callable[[int], None]:
+        """
+        Общая полоса прогресса: у каждой части половина — закачка, половина —
+        установка, с весом по размеру архива.
+        """
+        def callback(value: int):
+            with self._progress_lock:
+                self._part_percent[(name, stage)] = value
+                total = 2 * sum(self._part_sizes.values()) or 1
+                done = sum(percent * self._part_sizes[part] for (part, _), percent in self._part_percent.items())
+                self.on_progress(int(done / total))
+        return callback
+
+    def make_progress(self, phase: str, total_bytes: int) -> ProgressTracker:
+        # Сравнение и распаковка части идут в её долю общей полосы
+        return ProgressTracker(f"{phase} {self.current_part}", total_bytes,
+                               self.part_progress(self.current_part, "install"), self.on_status)
+
+    @telemetry_run("install")
+    def custom_install_process(self):
+        main_dir = self.extract_folder
+        parts = load_parts_manifest(self.file_path)
+        service = get_drive_service(self.service_account_file)
+        # Сервис общий для всего процесса (в CLI им же пользуются другие папки) — соединения свои
+        base_http = service.files().list().http
+        with run_phase("metadata", files=len(parts)):
+            http = new_http(base_http)
+            infos = {part["name"]: get_file_info(service, part["id"], http) for part in parts}
+        versions = {part["name"]: self.part_version(part, infos[part["name"]]) for part in parts}
+        state = self.load_state()
+        todo = self.parts_to_install(parts, versions, state)
+        annotate_run(target=main_dir, parts=len(parts), parts_changed=len(todo))
+        if todo:
+            self.on_message(f"Modpack parts to update: {', '.join(part['name'] for part in todo)} "
+                            f"({len(todo)} of {len(parts)})")
+        else:
+            self.on_message("All modpack parts are up to date")
+
+        self._part_sizes = {part["name"]: int(infos[part["name"]].get("size") or 0) for part in todo}
+        self._part_percent = {}
+        cache = ArchiveCache() if self.use_cache else None
+        # Состояние частей — в снимок вместе с файлами: после отката оно не должно обгонять main
+        snapshot_id = self.take_snapshot(main_dir, [PARTS_STATE_NAME]) if todo else None
+        store = self.active_store(main_dir)
+        report = current_report()
+        installed = {}  # Часть -> её файлы (пути относительно .minecraft)
+        linked = {}
+        indexed = []  # (файлы, источник) поставленных частей для индекса
+
+        def download_part(part: dict) -> str:
+            file_info = infos[part["name"]]
+            progress_callback = self.part_progress(part["name"], "download")
+            with report_to(report):
+                if cache is None:
+                    return download_file(service, part["id"], main_dir, progress_callback,
+                                         file_info=file_info, http=new_http(base_http))
+                with cache.download_lock(part["id"], file_info):
+                    return download_file(service, part["id"], main_dir, progress_callback,
+                                         cache=cache, file_info=file_info, http=new_http(base_http))
+
+        pool = ThreadPoolExecutor(max_workers=max(1, self.part_workers))
+        futures = {part["name"]: pool.submit(download_part, part) for part in todo}
+        try:
+            try:
+                for i, part in enumerate(todo):
+                    archive_path = futures[part["name"]].result()
+                    self.on_message(f"Installing part {part['name']}...")
+                    # Файлы более поздних частей, которые сейчас не ставятся, остаются их
+                    later = parts[parts.index(part) + 1:]
+                    shadowed = set()
+                    for other in later:
+                        if other not in todo:
+                            shadowed.update(state.get(other["name"], {}).get("files", []))
+                    try:
+                        installed[part["name"]] = self.install_part(part["name"], archive_path, shadowed, store,
+                                                                    snapshot_id)
+                    except IntegrityError:
+                        if cache is not None:
+                            cache.discard(part["id"], infos[part["name"]])
+                        raise
+                    linked.update(self.linked)
+                    indexed.append((dict(self.planned), dict(archive_version(infos[part["name"]]),
+                                                             file_id=part["id"],
+                                                             archive=os.path.abspath(archive_path))))
+                    state[part["name"]] = {"version": versions[part["name"]],
+                                           "files": sorted(installed[part["name"]]), "installed": time.time()}
+                    self.save_state(state)
+            finally:
+                for future in futures.values():
+                    future.cancel()
+                pool.shutdown(wait=True)
+
+            self.linked = linked
+            self.record_links(main_dir)
+            self.save_state({part["name"]: state[part["name"]] for part in parts})
+            self.archive_files = {rel for part in parts for rel in state[part["name"]]["files"]}
+            removed = self.remove_stale_files_in_main(main_dir, MODS_FOLDERS)
+        except BaseException:
+            self.restore_snapshot(main_dir, snapshot_id)
+            raise
+        if indexed or InstallIndex(main_dir).exists():
+            self.write_index(main_dir, indexed, self.archive_files)
+        logger.info(f"Installed {len(todo)} of {len(parts)} modpack parts to {main_dir}, "
+                    f"{removed} stale files removed")
+
+    def install_part(self, name: str, archive_path: str, shadowed: set,
+                     store: Optional[ContentStore], snapshot_id: Optional[str] = None) -> set:
+        """
+        Ставим одну часть прямо в main (как direct_install_process, но без
+        удаления лишнего; файлы, которые она перезапишет, дописываются в
+        общий снимок snapshot_id). Возвращает все файлы .minecraft/ этой части.
+        """
+        main_dir = self.extract_folder
+        self.current_part = name
+        backend = archive_backend_for(archive_path)
+        with run_phase("read index", part=name) as entry, backend(archive_path) as archive:
+            dirs, jobs = self.plan_members(archive.members(), main_dir, main_dir)
+            entry["files"] = len(jobs)
+        files = set(self.archive_files)
+        jobs = [(member, dst) for member, dst in jobs
+                if os.path.relpath(dst, main_dir).replace(os.sep, "/") not in shadowed]
+        self.planned = {rel: meta for rel, meta in self.planned.items() if rel not in shadowed}
+        if self.delta_install:
+            jobs = self.changed_jobs(jobs)
+        self.add_to_snapshot(main_dir, snapshot_id, jobs)
+        if store is not None:
+            jobs = self.link_stored_jobs(store, jobs, main_dir)
+        progress = self.make_progress("Installing", sum(member.size for member, _ in jobs))
+        crcs, same = {}, set()
+        with run_phase("extract", part=name, files=len(jobs), bytes=progress.total, workers=self.workers) as entry:
+            linked = extract_members(backend, archive_path, dirs, jobs, progress, self.workers, store, crcs,
+                                     self.compare, same)
+            entry["unchanged"] = len(same)
+        self.note_written(crcs, main_dir)
+        self.linked.update({os.path.relpath(dst, main_dir): sha for dst, sha in linked.items()})
+        return files
+
+# ==================== Синхронизация папки Drive ====================
+
+def list_drive_folder(service, folder_id: str, http=None) -> List[dict]:
+    """
+    Все элементы одной папки Drive (с постраничной выдачей files().list).
+    """
+    items, page_token = [], None
+    while True:
+        request = service.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            fields="nextPageToken, files(id, name, mimeType, size, md5Checksum)",
+            pageSize=1000,
+            pageToken=page_token,
+            supportsAllDrives=True,
+            includeItemsFromAllDrives=True
+        )
+        # num_retries: клиент сам повторяет 5xx и ответы о превышении квоты с паузой
+        response = request.execute(http=http, num_retries=DOWNLOAD_RETRIES)
+        items.extend(response.get("files", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return items
+
+def list_drive_tree(service, folder_id: str, workers: int = SYNC_WORKERS) -> dict:
+    """
+    Обходим дерево папки Drive по уровням, папки одного уровня — параллельно.
+    Возвращает {путь через '/': {"id", "size", "md5Checksum"}} для обычных
+    файлов (документы Google без size пропускаем). Если в корне есть папка
+    .minecraft, пути считаются от неё.
+    """
+    local = threading.local()
+
+    def list_folder(folder):
+        # Соединение сервиса может быть занято другим потоком — у каждого своё
+        if not hasattr(local, "http"):
+            local.http = new_http(service.files().list().http)
+        return folder, list_drive_folder(service, folder[0], http=local.http)
+
+    _, root_items = list_folder((folder_id, ""))
+    for item in root_items:
+        if item["name"] == MC_ROOT and item["mimeType"] == DRIVE_FOLDER_MIME:
+            folder_id = item["id"]
+            _, root_items = list_folder((folder_id, ""))
+            break
+
+    files = {}
+    level = [((folder_id, ""), root_items)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while level:
+            subfolders = []
+            for (_, prefix), items in level:
+                for item in items:
+                    path_ = prefix + item["name"]
+                    if item["mimeType"] == DRIVE_FOLDER_MIME:
+                        subfolders.append((item["id"], path_ + "/"))
+                    elif "size" in item and safe_relpath(path_) is not None:
+                        files[path_] = {"id": item["id"], "size": int(item["size"]),
+                                        "md5Checksum": item.get("md5Checksum")}
+            level = list(pool.map(list_folder, subfolders))
+    return files
+
+def download_drive_file(request, dst_path: str, size: int, http, progress: ProgressTracker,
+                        chunk_size: int = DOWNLOAD_CHUNK_SIZE, md5_checksum: Optional[str] = None,
+                        digest=None):
+    """
+    Качаем файл Drive целиком через переданное соединение и атомарно
+    кладём его на место dst_path (если MD5 совпал с md5_checksum).
+    digest (объект hashlib) обновляется скачанными данными.
+    """
+    tmp_path = dst_path + ".fcpart"
+    md5 = hashlib.md5()
+    try:
+        with open(tmp_path, "wb") as f:
+            pos = 0
+            while pos < size:
+                end = min(pos + chunk_size, size) - 1
+                content, _ = fetch_range(request, pos, end, http=http)
+                content = content[:end - pos + 1]
+                if not content:
+                    raise IOError(f"Empty response for bytes {pos}-{end}")
+                f.write(content)
+                md5.update(content)
+                if digest is not None:
+                    digest.update(content)
+                pos += len(content)
+                progress.add(len(content))
+        check_md5(md5.hexdigest(), md5_checksum, os.path.basename(dst_path))
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_sync_manifest(main_dir: str) -> dict:
+    """
+    {путь: {"size", "md5Checksum"}} из манифеста прошлой синхронизации папки Drive.
+    """
+    try:
+        with open(os.path.join(main_dir, SYNC_MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+def drive_folder_source(folder_id: str) -> dict:
+    """
+    Источник для индекса установки (InstallIndex) — папка Drive.
+    """
+    return {"archive": f"https://drive.google.com/drive/folders/{folder_id}", "folder_id": folder_id}
+
+class FolderSyncInstaller(Installer):
+    """
+    Сборка, опубликованная на Drive распакованной папкой: сверяем size/
+    md5Checksum каждого файла с манифестом прошлой синхронизации
+    (main/.fc-sync.json) и качаем только новые/изменённые файлы пулом из
+    SYNC_WORKERS потоков, у каждого — своё постоянное соединение.
+    Архива и распаковки нет. Исключения и удаление лишнего из mods/,
+    configs/ — те же, что у Installer.
+    """
+    def __init__(self,
+                 url: str,
+                 extract_folder: str,
+                 service_account_file: str,
+                 ignored_files: List[str],
+                 ignored_folders: List[str],
+                 keep_in_main: List[str],
+                 workers: int = SYNC_WORKERS,
+                 **callbacks):
+        super().__init__("", extract_folder, ignored_files, ignored_folders, keep_in_main, **callbacks)
+        self.url = url
+        self.service_account_file = service_account_file
+        self.workers = workers
+        self.manifest_path = os.path.join(extract_folder, SYNC_MANIFEST_NAME)
+
+    def load_manifest(self) -> dict:
+        return load_sync_manifest(self.extract_folder)
+
+    def save_manifest(self, files: dict):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"folder_id": extract_folder_id(self.url), "files": files}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_up_to_date(self, rel: str, remote: dict, manifest: dict) -> bool:
+        local = manifest.get(rel)
+        dst = os.path.join(self.extract_folder, rel)
+        return bool(local) and local.get("md5Checksum") == remote["md5Checksum"] and \
+            local.get("size") == remote["size"] and \
+            os.path.isfile(dst) and os.path.getsize(dst) == remote["size"]
+
+    @telemetry_run("folder sync")
+    def custom_install_process(self):
+        main_dir = self.extract_folder
+        service = get_drive_service(self.service_account_file)
+        folder_id = extract_folder_id(self.url)
+        if not folder_id:
+            raise ValueError("Invalid Google Drive folder URL format.")
+        annotate_run(target=main_dir, workers=self.workers, store=self.store is not None)
+
+        self.on_status("Listing Drive folder...")
+        with run_phase("list folder") as entry:
+            remote_files = list_drive_tree(service, folder_id, self.workers)
+            entry["files"] = len(remote_files)
+        if not remote_files:
+            raise FileNotFoundError("The Drive folder is empty.")
+
+        self.skipped.clear()
+        self.archive_files = set(remote_files)
+        manifest = self.load_manifest()
+        wanted = {rel: meta for rel, meta in remote_files.items()
+                  if self.accept_member(rel, False, True, main_dir)}
+        changed = [(rel, meta) for rel, meta in wanted.items()
+                   if not self.is_up_to_date(rel, meta, manifest)]
+        self.log_skipped()
+        self.take_snapshot(main_dir)
+        self.on_message(f"Folder sync: {len(changed)} of {len(remote_files)} files changed")
+
+        # Манифест — только про файлы, которые ещё есть на Drive
+        synced = {rel: meta for rel, meta in manifest.items() if rel in remote_files}
+        progress = self.make_progress("Syncing", sum(meta["size"] for _, meta in changed))
+        store = self.active_store(main_dir)
+        self.linked.clear()
+        local = threading.local()
+        lock = threading.Lock()
+
+        def sync_one(job):
+            rel, meta = job
+            request = service.files().get_media(fileId=meta["id"])
+            if not hasattr(local, "http"):
+                local.http = new_http(request.http)
+            dst = os.path.join(main_dir, rel)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if store is not None and store.accepts(dst):
+                alias = store.md5_alias(meta["md5Checksum"])
+                sha = store.lookup(alias, meta["size"])
+                if sha is None:
+                    tmp_path, digest = store.tmp_file(), hashlib.sha256()
+                    download_drive_file(request, tmp_path, meta["size"], local.http, progress,
+                                        md5_checksum=meta["md5Checksum"], digest=digest)
+                    sha = store.adopt(tmp_path, digest.hexdigest(), alias)
+                else:
+                    progress.add(meta["size"])
+                store.link(sha, dst)
+                with lock:
+                    self.linked[rel] = sha
+            else:
+                download_drive_file(request, dst, meta["size"], local.http, progress,
+                                    md5_checksum=meta["md5Checksum"])
+            with lock:
+                synced[rel] = {"size": meta["size"], "md5Checksum": meta["md5Checksum"]}
+
+        try:
+            with run_phase("sync", files=len(changed), bytes=progress.total), \
+                    ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+                for future in [pool.submit(sync_one, job) for job in changed]:
+                    future.result()
+        finally:
+            # Уже скачанное не придётся качать повторно, даже если синхронизация оборвалась
+            self.save_manifest(synced)
+            self.record_links(main_dir)
+        progress.finish()
+        # Лишнее удаляем, только когда всё новое скачано и сошлось по MD5
+        removed = self.remove_stale_files_in_main(main_dir, MODS_FOLDERS)
+        self.write_folder_index(main_dir, folder_id, wanted, changed)
+        logger.info(f"Synced Drive folder {folder_id} to {main_dir}, {removed} stale files removed")
+
+    def write_folder_index(self, main_dir: str, folder_id: str, wanted: dict, changed: list):
+        """
+        Индекс установки (для Verify и Repair) по синхронизированной папке:
+        CRC считаем только у скачанных сейчас файлов и у тех, которых в
+        индексе от этой папки ещё нет; прочие строки уже описывают файлы,
+        которые синхронизация не трогала.
+        """
+        source = drive_folder_source(folder_id)
+        try:
+            indexed = InstallIndex(main_dir).paths(source)
+        except (OSError, sqlite3.Error):
+            indexed = set()
+        fresh = {rel for rel, _ in changed}
+        self.planned = {rel: (meta["size"], None) for rel, meta in wanted.items()
+                        if rel in fresh or rel not in indexed}
+        self.write_index(main_dir, [(self.planned, source)], set(wanted))
@@ -0,0 +1,68 @@
+"""
+Общее для тестов установки: архивы сборки с .minecraft/ и установка без
+окна и сети. Папка данных программы (отчёты, кэш, хранилище) — временная.
+"""
+import io
+import os
+import sys
+import time
+import tarfile
+import zipfile
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+os.environ["LOCALAPPDATA"] = tempfile.mkdtemp(prefix="fc-tests-")
+
+import fc_installer_core as core
+
+FIXED_MTIME = 1700000000  # Как у воспроизводимых сборок: у всех версий одно время
+
+def make_archive(path: str, files: dict, mtime: int = FIXED_MTIME) -> str:
+    """
+    Архив сборки: files — {путь внутри .minecraft через '/': bytes}.
+    Формат — по расширению path (.zip, .tar, .tar.gz).
+    """
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for rel, data in files.items():
+                zf.writestr(zipfile.ZipInfo(f"{core.MC_ROOT}/{rel}", time.localtime(mtime)[:6]), data)
+    else:
+        with tarfile.open(path, "w:gz" if path.endswith(".tar.gz") else "w") as tf:
+            for rel, data in files.items():
+                info = tarfile.TarInfo(f"{core.MC_ROOT}/{rel}")
+                info.size, info.mtime = len(data), mtime
+                tf.addfile(info, io.BytesIO(data))
+    return path
+
+def make_installer(archive: str, main_dir: str, **options) -> core.Installer:
+    return core.Installer(archive, main_dir, list(core.DEFAULT_IGNORED_FILES), list(core.DEFAULT_IGNORED_FOLDERS),
+                          list(core.DEFAULT_KEEP_IN_MAIN), **options)
+
+def install(archive: str, main_dir: str, **options) -> core.Installer:
+    installer = make_installer(archive, main_dir, **options)
+    installer.custom_install_process()
+    return installer
+
+def read_tree(root: str) -> dict:
+    """
+    {путь через '/': bytes} всех файлов root, кроме служебных .fc-* и tmp.
+    """
+    files = {}
+    for current, dirs, names in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith(".fc") and not (current == root and d == "tmp")]
+        for name in names:
+            if name.startswith(".fc"):
+                continue
+            path_ = os.path.join(current, name)
+            with open(path_, "rb") as f:
+                files[os.path.relpath(path_, root).replace(os.sep, "/")] = f.read()
+    return files
+
+def write_files(root: str, files: dict):
+    for rel, data in files.items():
+        path_ = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(path_), exist_ok=True)
+        with open(path_, "wb") as f:
+            f.write(data)
@@ -0,0 +1,105 @@
+"""
+Общее хранилище файлов (ContentStore): одинаковые jar в разных папках
+игры — один файл на диске, конфиги в хранилище не попадают, gc убирает
+то, на что больше никто не ссылается.
+
+    python -m pytest tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from support import core, install, make_archive, read_tree
+
+@unittest.skipIf(os.name == "nt", "st_ino of hardlinks is not compared on Windows")
+class ContentStoreTest(unittest.TestCase):
+    V1 = {"mods/a.jar": os.urandom(20000), "mods/b.jar": os.urandom(10000), "configs/c.cfg": b"x=1\n"}
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = core.ContentStore(os.path.join(self.tmp_dir, "store"))
+        self.targets = [os.path.join(self.tmp_dir, name) for name in ("a", "b")]
+        for target in self.targets:
+            os.makedirs(target)
+        self.v1 = make_archive(os.path.join(self.tmp_dir, "v1.zip"), self.V1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def install(self, archive: str, target: str, **options) -> core.Installer:
+        # Без снимков: их жёсткие ссылки держали бы файлы хранилища от gc
+        return install(archive, target, use_store=True, store_dir=self.store.root, snapshot_before_install=False,
+                       **options)
+
+    def objects(self) -> set:
+        return {sha for prefix in os.listdir(self.store.objects_dir)
+                for sha in os.listdir(os.path.join(self.store.objects_dir, prefix))}
+
+    def path(self, target: str, rel: str) -> str:
+        return os.path.join(target, *rel.split("/"))
+
+    def test_same_jar_in_two_folders_is_one_file(self):
+        for target in self.targets:
+            self.install(self.v1, target)
+            self.assertEqual(read_tree(target), self.V1)
+        self.assertEqual(len(self.objects()), 2)
+        for rel in ("mods/a.jar", "mods/b.jar"):
+            self.assertTrue(os.path.samefile(self.path(self.targets[0], rel), self.path(self.targets[1], rel)))
+        self.assertFalse(os.path.samefile(self.path(self.targets[0], "configs/c.cfg"),
+                                          self.path(self.targets[1], "configs/c.cfg")))
+
+    def test_second_folder_links_without_extracting(self):
+        self.install(self.v1, self.targets[0])
+        installer = core.Installer(self.v1, self.targets[1], [], [], [], use_store=True, store_dir=self.store.root)
+        extracted = []
+        extract_members = core.extract_members
+
+        def counting(backend, archive_path, dirs, jobs, *args, **kwargs):
+            extracted.extend(os.path.relpath(dst, self.targets[1]).replace(os.sep, "/") for _, dst in jobs)
+            return extract_members(backend, archive_path, dirs, jobs, *args, **kwargs)
+
+        with mock.patch.object(core, "extract_members", counting):
+            installer.custom_install_process()
+        self.assertEqual(extracted, ["configs/c.cfg"])
+        self.assertEqual(read_tree(self.targets[1]), self.V1)
+
+    def test_gc_keeps_referenced_files(self):
+        for target in self.targets:
+            self.install(self.v1, target)
+        old_sha = self.store.load_ref(self.store.ref_path(self.targets[0]))["files"][os.path.join("mods", "a.jar")]
+        v2 = make_archive(os.path.join(self.tmp_dir, "v2.zip"), dict(self.V1, **{"mods/a.jar": b"a2" * 5000}))
+        self.install(v2, self.targets[0])
+
+        # Старый a.jar ещё стоит во второй папке
+        self.assertEqual(self.store.gc(), (0, 0))
+        shutil.rmtree(self.targets[1])
+        removed, freed = self.store.gc()
+        self.assertEqual((removed, freed), (1, len(self.V1["mods/a.jar"])))
+        self.assertNotIn(old_sha, self.objects())
+        self.assertEqual(len(self.objects()), 2)
+        self.assertEqual(read_tree(self.targets[0])["mods/a.jar"], b"a2" * 5000)
+
+    def test_stored_files_are_read_only(self):
+        self.install(self.v1, self.targets[0])
+        self.assertEqual(os.stat(self.path(self.targets[0], "mods/a.jar")).st_mode & 0o222, 0)
+        self.assertNotEqual(os.stat(self.path(self.targets[0], "configs/c.cfg")).st_mode & 0o222, 0)
+
+    def test_damaged_store_file_is_not_linked_again(self):
+        self.install(self.v1, self.targets[0])
+        sha = self.store.load_ref(self.store.ref_path(self.targets[0]))["files"][os.path.join("mods", "a.jar")]
+        blob = self.store.object_path(sha)
+        os.chmod(blob, 0o644)
+        with open(blob, "ab") as f:
+            f.write(b"junk")
+        self.install(self.v1, self.targets[1])
+        self.assertEqual(read_tree(self.targets[1]), self.V1)
+        # Испорченный файл выброшен, в хранилище — свежий, а не ссылка на испорченный
+        self.assertFalse(os.path.samefile(self.path(self.targets[1], "mods/a.jar"),
+                                          self.path(self.targets[0], "mods/a.jar")))
+        self.assertEqual(os.path.getsize(blob), len(self.V1["mods/a.jar"]))
+
+if __name__ == "__main__":
+    unittest.main()
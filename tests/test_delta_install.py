@@ -0,0 +1,100 @@
+"""
+Установка только изменившихся файлов (DELTA_INSTALL) поверх прошлой версии
+сборки: ZIP сверяется по CRC из оглавления, tar — по содержимому при распаковке.
+
+    python -m pytest tests
+"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from support import core, install, make_archive, read_tree, write_files
+
+class DeltaInstallTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        os.makedirs(self.main_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def archive(self, name: str, files: dict) -> str:
+        return make_archive(os.path.join(self.tmp_dir, name), files)
+
+    def inode(self, rel: str) -> int:
+        return os.stat(os.path.join(self.main_dir, *rel.split("/"))).st_ino
+
+    def check_update(self, ext: str):
+        v1 = {"mods/a.jar": b"a" * 5000, "mods/b.jar": b"b1" * 3000, "configs/c.cfg": b"x=1\n",
+              "mods/old.jar": b"old"}
+        # b.jar и c.cfg меняются без смены размера (и mtime в заголовке тот же)
+        v2 = {"mods/a.jar": b"a" * 5000, "mods/b.jar": b"b2" * 3000, "configs/c.cfg": b"x=2\n",
+              "mods/new.jar": b"new"}
+        install(self.archive("v1" + ext, v1), self.main_dir)
+        self.assertEqual(read_tree(self.main_dir), v1)
+        unchanged_inode = self.inode("mods/a.jar")
+
+        install(self.archive("v2" + ext, v2), self.main_dir)
+
+        self.assertEqual(read_tree(self.main_dir), v2)
+        self.assertEqual(self.inode("mods/a.jar"), unchanged_inode)
+        self.assertEqual(core.InstallIndex(self.main_dir).verify(), [])
+
+    def test_zip_update_writes_only_changed_files(self):
+        self.check_update(".zip")
+
+    def test_tar_update_with_same_size_and_mtime(self):
+        self.check_update(".tar")
+
+    def test_tar_gz_update_with_same_size_and_mtime(self):
+        self.check_update(".tar.gz")
+
+    def test_files_outside_the_archive_are_kept(self):
+        write_files(self.main_dir, {"options.txt": b"mine", "saves/w/level.dat": b"world",
+                                    "mods/stale.jar": b"stale"})
+        install(self.archive("v1.tar", {"mods/a.jar": b"a", "options.txt": b"theirs"}), self.main_dir)
+        self.assertEqual(read_tree(self.main_dir),
+                         {"options.txt": b"mine", "saves/w/level.dat": b"world", "mods/a.jar": b"a"})
+
+class WriteFileIfChangedTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "f.bin")
+        self.data = os.urandom(3 * core.COPY_BUFFER_SIZE + 17)
+        with open(self.path, "wb") as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_same_data_is_not_rewritten(self):
+        inode = os.stat(self.path).st_ino
+        crc, changed = core.write_file_if_changed(io.BytesIO(self.data), self.path, size=len(self.data))
+        self.assertFalse(changed)
+        self.assertEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(crc, core.file_crc32(self.path))
+
+    def test_difference_after_the_first_chunk(self):
+        new = bytearray(self.data)
+        new[2 * core.COPY_BUFFER_SIZE + 5] ^= 0xFF
+        crc, changed = core.write_file_if_changed(io.BytesIO(bytes(new)), self.path, size=len(new))
+        self.assertTrue(changed)
+        self.assertEqual(self.read(), bytes(new))
+        self.assertEqual(crc, core.file_crc32(self.path))
+        self.assertFalse(os.path.exists(self.path + ".fcpart"))
+
+    def test_truncated_member_keeps_the_file(self):
+        with self.assertRaises(core.IntegrityError):
+            core.write_file_if_changed(io.BytesIO(self.data[:-100]), self.path, size=len(self.data))
+        self.assertEqual(self.read(), self.data)
+        self.assertFalse(os.path.exists(self.path + ".fcpart"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Исключения (ExclusionFilter) — правила вкладки Exclusions — и то, как их
+соблюдает установка: игнорируемое не ставится и не удаляется, файлы
+keep_in_main не перезаписываются, если уже есть в папке игры.
+
+    python -m pytest tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from support import core, make_archive, read_tree, write_files
+
+class ExclusionFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.exclusions = core.ExclusionFilter(
+            ignored_files=["options.txt", "config/a.cfg", "*.log", "config/*.bak", " "],
+            ignored_folders=["logs", "config/old", "*cache*"],
+            keep_in_main=["saves", "xaero"])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_ignored_files(self):
+        for rel in ["options.txt", "config/options.txt", "config/a.cfg", "latest.log", "mods/x.log",
+                    "config/b.bak", "logs/x.txt", "a/logs/x.txt", "config/old/x.cfg", "webcache/x", "a/my_cache/x"]:
+            self.assertTrue(self.exclusions.is_ignored_file(rel), rel)
+        for rel in ["config/b.cfg", "other/a.cfg", "sub/config/b.bak", "configs/old/x.cfg", "mods/a.jar",
+                    "logsx/x.txt"]:
+            self.assertFalse(self.exclusions.is_ignored_file(rel), rel)
+
+    def test_windows_separators(self):
+        self.assertTrue(self.exclusions.is_ignored_file(os.path.join("config", "old", "x.cfg")))
+        self.assertTrue(core.ExclusionFilter(ignored_files=["config\\a.cfg"]).is_ignored_file("config/a.cfg"))
+
+    def test_rules_that_depend_on_main(self):
+        self.assertIsNone(self.exclusions.skip_reason("saves/w/level.dat", self.tmp_dir))
+        self.assertIsNone(self.exclusions.skip_reason("server.dat", self.tmp_dir))
+        write_files(self.tmp_dir, {"saves/w/level.dat": b"mine", "server.dat": b"mine"})
+        self.assertEqual(self.exclusions.skip_reason("saves/w/level.dat", self.tmp_dir), "kept in main")
+        self.assertEqual(self.exclusions.skip_reason("server.dat", self.tmp_dir), "exists in main")
+        self.assertIsNone(self.exclusions.skip_reason("saves/w2/level.dat", self.tmp_dir))
+        self.assertEqual(self.exclusions.skip_reason("options.txt", self.tmp_dir), "ignored")
+
+    def test_managed_folders_ignore_keep_rules(self):
+        write_files(self.tmp_dir, {"mods/xaero-map.jar": b"old", "server.dat": b"mine"})
+        self.assertIsNone(self.exclusions.skip_reason("mods/xaero-map.jar", self.tmp_dir))
+        self.assertIsNone(self.exclusions.skip_reason("mods/server.dat", self.tmp_dir))
+
+class InstallExclusionsTest(unittest.TestCase):
+    FILES = {"mods/a.jar": b"a", "mods/skip.jar": b"theirs", "configs/c.cfg": b"x=1\n",
+             "options.txt": b"theirs", "logs/latest.log": b"log", "saves/w/level.dat": b"theirs",
+             "shaderpacks/s.zip": b"s"}
+    INSTALLED = {"mods/a.jar": b"a", "configs/c.cfg": b"x=1\n", "saves/w/level.dat": b"mine",
+                 "shaderpacks/s.zip": b"s"}
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        write_files(self.main_dir, {"mods/skip.jar": b"mine", "mods/stale.jar": b"stale",
+                                    "saves/w/level.dat": b"mine"})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def install(self, ext: str, **options) -> core.Installer:
+        archive = make_archive(os.path.join(self.tmp_dir, "pack" + ext), self.FILES)
+        installer = core.Installer(archive, self.main_dir, list(core.DEFAULT_IGNORED_FILES) + ["skip.jar"],
+                                   list(core.DEFAULT_IGNORED_FOLDERS), list(core.DEFAULT_KEEP_IN_MAIN), **options)
+        installer.custom_install_process()
+        self.assertEqual(dict(installer.skipped), {"ignored": 3, "kept in main": 1})
+        return installer
+
+    def test_direct_install(self):
+        self.install(".zip")
+        # Игнорируемый файл mods/ есть в архиве — он не лишний и остаётся своим
+        self.assertEqual(read_tree(self.main_dir), dict(self.INSTALLED, **{"mods/skip.jar": b"mine"}))
+
+    def test_staged_install(self):
+        # Через tmp mods/ и configs/ заменяются целиком
+        self.install(".tar", direct_install=False)
+        self.assertEqual(read_tree(self.main_dir), self.INSTALLED)
+
+if __name__ == "__main__":
+    unittest.main()
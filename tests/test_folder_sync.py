@@ -0,0 +1,84 @@
+"""
+Синхронизация папки Drive (FolderSyncInstaller) на локальной замене Drive:
+после неё есть индекс установки, verify находит испорченные файлы, а
+repair качает их из той же папки заново.
+
+    python -m pytest tests
+"""
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+from unittest import mock
+
+from support import core, read_tree, write_files
+from local_drive import LocalDrive
+
+class FolderSyncIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        os.makedirs(self.main_dir)
+        self.drive = LocalDrive()
+        service = self.drive.service()
+        patcher = mock.patch.object(core, "get_drive_service", lambda service_account_file: service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.files = {"mods/a.jar": os.urandom(30000), "mods/b.jar": b"b" * 1000, "configs/c.cfg": b"x=1\n"}
+        self.published = os.path.join(self.tmp_dir, "pack")
+        write_files(os.path.join(self.published, core.MC_ROOT), self.files)
+        self.url = f"https://drive.google.com/drive/folders/{self.drive.add_tree(self.published)}"
+        self.index = core.InstallIndex(self.main_dir)
+
+    def tearDown(self):
+        self.drive.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def sync(self):
+        core.FolderSyncInstaller(self.url, self.main_dir, "key.json", list(core.DEFAULT_IGNORED_FILES),
+                                 list(core.DEFAULT_IGNORED_FOLDERS),
+                                 list(core.DEFAULT_KEEP_IN_MAIN)).custom_install_process()
+
+    def publish(self, rel: str, data: bytes):
+        """
+        Новая версия файла на Drive (тот же id).
+        """
+        write_files(os.path.join(self.published, core.MC_ROOT), {rel: data})
+        path_ = os.path.join(self.published, core.MC_ROOT, *rel.split("/"))
+        meta = next(meta for meta in self.drive.files.values() if meta["path"] == path_)
+        meta.update(size=len(data), md5Checksum=hashlib.md5(data).hexdigest(),
+                    modifiedTime="2024-02-01T00:00:00.000Z")
+
+    def test_sync_writes_index(self):
+        self.sync()
+        self.assertEqual(self.index.verify(), [])
+        self.assertEqual(self.index.paths(core.drive_folder_source(core.extract_folder_id(self.url))),
+                         set(self.files))
+
+    def test_repair_downloads_from_the_folder(self):
+        self.sync()
+        write_files(self.main_dir, {"mods/a.jar": b"broken"})
+        problems = self.index.verify()
+        self.assertEqual(problems, [("mods/a.jar", "size")])
+        self.assertEqual(self.index.repair([rel for rel, _ in problems], "key.json"), 1)
+        self.assertEqual(self.index.verify(), [])
+        self.assertEqual(read_tree(self.main_dir), self.files)
+
+    def test_repair_refuses_files_changed_on_drive(self):
+        self.sync()
+        write_files(self.main_dir, {"mods/b.jar": b"broken"})
+        self.publish("mods/b.jar", b"b2" * 1000)
+        with self.assertRaises(ValueError):
+            self.index.repair(["mods/b.jar"], "key.json")
+
+    def test_resync_updates_index(self):
+        self.sync()
+        self.publish("configs/c.cfg", b"x=2\n")
+        self.sync()
+        self.assertEqual(read_tree(self.main_dir)["configs/c.cfg"], b"x=2\n")
+        self.assertEqual(self.index.verify(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Индекс установки (InstallIndex): verify находит испорченные файлы, repair
+возвращает их из архива, а CRC в индексе — всегда от данных на диске.
+Архив, скачанный CLI во временную папку, repair достаёт с Drive заново.
+
+    python -m pytest tests
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import contextlib
+
+from unittest import mock
+
+from support import core, install, make_archive, write_files
+from local_drive import LocalDrive
+
+import fc_cli
+
+class InstallIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        os.makedirs(self.main_dir)
+        self.files = {"mods/a.jar": b"a" * 4000, "mods/b.jar": b"b1" * 3000, "configs/c.cfg": b"x=1\n"}
+        self.archive = make_archive(os.path.join(self.tmp_dir, "pack.tar"), self.files)
+        install(self.archive, self.main_dir)
+        self.index = core.InstallIndex(self.main_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def path(self, rel: str) -> str:
+        return os.path.join(self.main_dir, *rel.split("/"))
+
+    def edit_in_place(self, rel: str, data: bytes):
+        """
+        Правка без смены размера и mtime — как редактор, вернувший время файла.
+        """
+        st = os.stat(self.path(rel))
+        write_files(self.main_dir, {rel: data})
+        os.utime(self.path(rel), ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    def indexed_crc(self, rel: str) -> int:
+        with contextlib.closing(sqlite3.connect(self.index.path)) as db:
+            return db.execute("SELECT crc32 FROM files WHERE path = ?", (rel,)).fetchone()[0]
+
+    def test_clean_install_verifies(self):
+        self.assertEqual(self.index.verify(), [])
+        for rel in self.files:
+            self.assertEqual(self.indexed_crc(rel), core.file_crc32(self.path(rel)))
+
+    def test_full_verify_finds_same_size_edit(self):
+        self.edit_in_place("mods/b.jar", b"b2" * 3000)
+        self.assertEqual(self.index.verify(quick=True), [])
+        self.assertEqual(self.index.verify(), [("mods/b.jar", "modified")])
+
+    def test_missing_and_resized_files(self):
+        os.remove(self.path("mods/a.jar"))
+        write_files(self.main_dir, {"configs/c.cfg": b"x=10\n"})
+        self.assertEqual(self.index.verify(), [("configs/c.cfg", "size"), ("mods/a.jar", "missing")])
+
+    def test_repair_restores_files_and_their_crc(self):
+        self.edit_in_place("mods/b.jar", b"b2" * 3000)
+        os.remove(self.path("mods/a.jar"))
+        problems = self.index.verify()
+        self.assertEqual(self.index.repair([rel for rel, _ in problems]), 2)
+        self.assertEqual(self.index.verify(), [])
+        with open(self.path("mods/b.jar"), "rb") as f:
+            self.assertEqual(f.read(), self.files["mods/b.jar"])
+
+    def test_update_hashes_files_without_crc(self):
+        # Прежняя строка с тем же размером и mtime не должна подменить CRC нового содержимого
+        self.edit_in_place("mods/b.jar", b"b2" * 3000)
+        self.index.update({"mods/b.jar": (6000, None)}, {"archive": os.path.abspath(self.archive)})
+        self.assertEqual(self.indexed_crc("mods/b.jar"), core.file_crc32(self.path("mods/b.jar")))
+
+class CliRepairTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        os.makedirs(self.main_dir)
+        self.drive = LocalDrive()
+        service = self.drive.service()
+        for module in (core, fc_cli):
+            patcher = mock.patch.object(module, "get_drive_service", lambda service_account_file: service)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.files = {"mods/a.jar": os.urandom(5000), "configs/c.cfg": b"x=1\n"}
+        self.file_id = self.drive.add_file("pack.zip", make_archive(os.path.join(self.tmp_dir, "pack.zip"), self.files))
+        self.url = f"https://drive.google.com/file/d/{self.file_id}/view"
+
+    def tearDown(self):
+        self.drive.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_repair_downloads_the_archive_again(self):
+        # Без кэша архив лежал только во временной папке CLI
+        self.assertEqual(fc_cli.main(["--url", self.url, "--service-account", "key.json", "--no-cache",
+                                      "--target", self.main_dir]), 0)
+        write_files(self.main_dir, {"mods/a.jar": b"broken"})
+        self.assertEqual(fc_cli.main(["--verify", "--repair", "--service-account", "key.json",
+                                      "--target", self.main_dir]), 0)
+        with open(os.path.join(self.main_dir, "mods", "a.jar"), "rb") as f:
+            self.assertEqual(f.read(), self.files["mods/a.jar"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Сборка из нескольких архивов (MultiPartInstaller) на локальной замене
+Drive: части накладываются в порядке манифеста, ставятся только
+изменившиеся, а файлы более поздней части не перетираются более ранней.
+
+    python -m pytest tests
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+from unittest import mock
+
+from support import core, make_archive, read_tree
+from local_drive import LocalDrive
+
+class MultiPartTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        os.makedirs(self.main_dir)
+        self.drive = LocalDrive()
+        service = self.drive.service()
+        patcher = mock.patch.object(core, "get_drive_service", lambda service_account_file: service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.versions = 0
+        self.ids = {
+            "base": self.drive.add_file("base.zip", self.archive({"configs/a.cfg": b"base", "mods/m.jar": b"m1"})),
+            "over": self.drive.add_file("over.zip", self.archive({"configs/a.cfg": b"over", "config.txt": b"o"})),
+        }
+        manifest = os.path.join(self.tmp_dir, "modpack.json")
+        with open(manifest, "w", encoding="utf-8") as f:
+            json.dump({"parts": [{"name": name, "id": file_id} for name, file_id in self.ids.items()]}, f)
+        self.url = f"https://drive.google.com/file/d/{self.drive.add_file('modpack.json', manifest)}/view"
+
+    def tearDown(self):
+        self.drive.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def archive(self, files: dict) -> str:
+        self.versions += 1
+        return make_archive(os.path.join(self.tmp_dir, f"part-{self.versions}.zip"), files)
+
+    def publish(self, name: str, files: dict):
+        """
+        Новая версия части на Drive (тот же id).
+        """
+        path_ = self.archive(files)
+        with open(path_, "rb") as f:
+            md5 = hashlib.md5(f.read()).hexdigest()
+        self.drive.files[self.ids[name]].update(path=path_, size=os.path.getsize(path_), md5Checksum=md5,
+                                                modifiedTime=f"2024-02-0{self.versions}T00:00:00.000Z")
+
+    def install(self) -> list:
+        """
+        Ставим сборку; возвращаем имена частей, которые ставились.
+        """
+        installed = []
+        install_part = core.MultiPartInstaller.install_part
+
+        def recording(installer, name, *args, **kwargs):
+            installed.append(name)
+            return install_part(installer, name, *args, **kwargs)
+
+        with mock.patch.object(core.MultiPartInstaller, "install_part", recording):
+            core.StreamInstaller(self.url, self.main_dir, "key.json", [], [], []).custom_install_process()
+        return installed
+
+    def test_later_part_wins(self):
+        self.assertEqual(self.install(), ["base", "over"])
+        self.assertEqual(read_tree(self.main_dir), {"configs/a.cfg": b"over", "mods/m.jar": b"m1", "config.txt": b"o"})
+        self.assertEqual(core.InstallIndex(self.main_dir).verify(), [])
+        self.assertEqual(self.install(), [])
+
+    def test_updated_earlier_part_does_not_shadow_later_one(self):
+        self.install()
+        self.publish("base", {"configs/a.cfg": b"base2", "mods/m.jar": b"m2", "mods/n.jar": b"n"})
+        self.assertEqual(self.install(), ["base"])
+        self.assertEqual(read_tree(self.main_dir), {"configs/a.cfg": b"over", "mods/m.jar": b"m2",
+                                                    "mods/n.jar": b"n", "config.txt": b"o"})
+        self.assertEqual(core.InstallIndex(self.main_dir).verify(), [])
+
+    def test_file_dropped_from_part_is_removed(self):
+        self.install()
+        self.publish("base", {"configs/a.cfg": b"base"})
+        self.assertEqual(self.install(), ["base"])
+        self.assertNotIn("mods/m.jar", read_tree(self.main_dir))
+
+    def test_failed_update_rolls_back_files_and_part_state(self):
+        self.install()
+        before = read_tree(self.main_dir)
+        with open(os.path.join(self.main_dir, core.PARTS_STATE_NAME), "rb") as f:
+            state = f.read()
+        self.publish("base", {"configs/a.cfg": b"base2", "mods/m.jar": b"m2"})
+        self.publish("over", {"configs/a.cfg": b"over2", "config.txt": b"o2", "new.txt": b"n"})
+        with mock.patch.object(core.Installer, "remove_stale_files_in_main", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.install()
+        self.assertEqual(read_tree(self.main_dir), before)
+        with open(os.path.join(self.main_dir, core.PARTS_STATE_NAME), "rb") as f:
+            self.assertEqual(f.read(), state)
+        # Следующая установка ставит обе части заново
+        self.assertEqual(self.install(), ["base", "over"])
+        self.assertEqual(read_tree(self.main_dir)["configs/a.cfg"], b"over2")
+
+if __name__ == "__main__":
+    unittest.main()
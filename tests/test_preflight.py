@@ -0,0 +1,89 @@
+"""
+Проверка перед установкой (preflight) на локальной замене Drive:
+метаданные архива и папки, место под архив с учётом кэша. Сама проверка
+кэш не меняет — это делает только установка.
+
+    python -m pytest tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from support import core, make_archive
+from local_drive import LocalDrive
+
+class PreflightTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        os.makedirs(self.main_dir)
+        self.drive = LocalDrive()
+        service = self.drive.service()
+        for name, value in (("authorize_drive_service", lambda service_account_file: service),
+                            ("check_internet_connection", lambda: True)):
+            patcher = mock.patch.object(core, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.archive = make_archive(os.path.join(self.tmp_dir, "pack.zip"), {"mods/a.jar": os.urandom(50000)})
+        self.file_id = self.drive.add_file("pack.zip", self.archive)
+        self.url = f"https://drive.google.com/file/d/{self.file_id}/view"
+        self.cache = core.ArchiveCache(os.path.join(self.tmp_dir, "archives"))
+
+    def tearDown(self):
+        self.drive.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def preflight(self, url: str) -> core.PreflightResult:
+        with mock.patch.object(core, "app_data_dir", lambda *parts: self.cache.cache_dir):
+            result = core.preflight(url, self.main_dir, "key.json")
+        self.assertEqual(result.errors, {})
+        return result
+
+    def cache_archive(self) -> dict:
+        file_info = self.drive.files[self.file_id]
+        path_ = self.cache.path_for(self.file_id, file_info)
+        shutil.copyfile(self.archive, path_)
+        self.cache.add(self.file_id, file_info, path_)
+        return file_info
+
+    def read_index(self) -> bytes:
+        with open(self.cache.index_path, "rb") as f:
+            return f.read()
+
+    def test_archive_metadata_and_space(self):
+        result = self.preflight(self.url)
+        size = os.path.getsize(self.archive)
+        self.assertEqual(result.file_info["name"], "pack.zip")
+        self.assertEqual(int(result.file_info["size"]), size)
+        # Все на одном диске: распакованные файлы и сам архив
+        self.assertEqual(result.needed_bytes, int(size * (core.PREFLIGHT_SPACE_FACTOR - 1)) + size)
+
+    def test_cached_archive_needs_no_space_and_stays_untouched(self):
+        self.cache_archive()
+        index = self.read_index()
+        result = self.preflight(self.url)
+        self.assertEqual(result.needed_bytes, int(os.path.getsize(self.archive) * (core.PREFLIGHT_SPACE_FACTOR - 1)))
+        self.assertEqual(self.read_index(), index)
+
+    def test_folder(self):
+        folder_id = self.drive.add_folder("pack")
+        result = self.preflight(f"https://drive.google.com/drive/folders/{folder_id}")
+        self.assertEqual(result.file_info["mimeType"], core.DRIVE_FOLDER_MIME)
+
+    def test_lookup_without_touch_keeps_index(self):
+        file_info = self.cache_archive()
+        index = self.read_index()
+        self.assertEqual(self.cache.lookup(self.file_id, file_info, touch=False),
+                         self.cache.path_for(self.file_id, file_info))
+        os.remove(self.cache.path_for(self.file_id, file_info))
+        self.assertIsNone(self.cache.lookup(self.file_id, file_info, touch=False))
+        self.assertEqual(self.read_index(), index)
+        # Обычный lookup выбрасывает пропавший архив из index.json
+        self.assertIsNone(self.cache.lookup(self.file_id, file_info))
+        self.assertNotEqual(self.read_index(), index)
+
+if __name__ == "__main__":
+    unittest.main()
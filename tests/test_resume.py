@@ -0,0 +1,175 @@
+"""
+Докачка download_file на локальной замене Drive (benchmarks/local_drive.py):
+оборванная закачка продолжается с места остановки, изменившийся на Drive
+файл качается заново, MD5 докачанного файла сходится.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import fc_installer_core as core
+from local_drive import LocalDrive
+
+CHUNK_SIZE = 64 * 1024  # Маленькие куски, чтобы обрыв пришёлся на середину файла
+FILE_SIZE = 16 * CHUNK_SIZE + 123
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.save_folder = os.path.join(self.tmp_dir, "download")
+        os.makedirs(self.save_folder)
+        self.drive = LocalDrive()
+        self.service = self.drive.service()
+        self.source = self.write_source("pack-v1.zip", FILE_SIZE)
+        self.file_id = self.drive.add_file("pack.zip", self.source)
+        self.file_path = os.path.join(self.save_folder, "pack.zip")
+        self.part_path = self.file_path + core.PART_SUFFIX
+        self.state_path = self.file_path + core.PART_STATE_SUFFIX
+        # Без повторов: первый же сбой обрывает закачку
+        for name, value in (("DOWNLOAD_RETRIES", 0), ("SEGMENT_RETRIES", 0)):
+            patcher = mock.patch.object(core, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.drive.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    # ==================== Помощники ====================
+
+    def write_source(self, name: str, size: int) -> str:
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        return path
+
+    def download(self, segments: int = 2) -> str:
+        return core.download_file(self.service, self.file_id, self.save_folder, lambda value: None,
+                                  segments=segments, chunk_size=CHUNK_SIZE)
+
+    def interrupt_after(self, chunks: int, segments: int = 2):
+        """
+        Закачка, которая рвётся после chunks успешных Range-запросов.
+        """
+        fetch_range = core.fetch_range
+        calls = []
+
+        def flaky(*args, **kwargs):
+            calls.append(1)
+            if len(calls) > chunks:
+                raise ConnectionError("connection dropped")
+            return fetch_range(*args, **kwargs)
+
+        with mock.patch.object(core, "fetch_range", flaky):
+            with self.assertRaises(ConnectionError):
+                self.download(segments)
+
+    def count_fetched(self):
+        """
+        Считаем байты, запрошенные у Drive: [(начало, длина), ...].
+        """
+        fetch_range = core.fetch_range
+        fetched = []
+
+        def counting(request, start, end, http=None):
+            content, total = fetch_range(request, start, end, http=http)
+            fetched.append((start, len(content)))
+            return content, total
+
+        patcher = mock.patch.object(core, "fetch_range", counting)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return fetched
+
+    def read_state(self) -> dict:
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def assert_same_file(self, path: str, expected: str):
+        with open(path, "rb") as f, open(expected, "rb") as g:
+            self.assertEqual(hashlib.md5(f.read()).hexdigest(), hashlib.md5(g.read()).hexdigest())
+
+    # ==================== Тесты ====================
+
+    def test_interrupted_download_resumes(self):
+        self.interrupt_after(5)
+        self.assertTrue(os.path.exists(self.part_path))
+        self.assertFalse(os.path.exists(self.file_path))
+        state = self.read_state()
+        done = sum(pos - start for start, _, pos in state["segments"])
+        self.assertGreater(done, 0)
+        self.assertLess(done, FILE_SIZE)
+
+        fetched = self.count_fetched()
+        file_path = self.download()
+
+        self.assertEqual(file_path, self.file_path)
+        self.assert_same_file(file_path, self.source)
+        # Докачано ровно то, чего не было на диске
+        self.assertEqual(sum(length for _, length in fetched), FILE_SIZE - done)
+        self.assertFalse(os.path.exists(self.part_path))
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_resume_after_several_interruptions(self):
+        for chunks in (3, 4, 2):
+            self.interrupt_after(chunks, segments=3)
+        self.assert_same_file(self.download(segments=3), self.source)
+
+    def test_changed_modified_time_discards_partial_state(self):
+        self.interrupt_after(5)
+        self.assertTrue(os.path.exists(self.state_path))
+
+        # Файл на Drive заменили: тот же id и размер, другие содержимое и modifiedTime
+        new_source = self.write_source("pack-v2.zip", FILE_SIZE)
+        with open(new_source, "rb") as f:
+            md5 = hashlib.md5(f.read()).hexdigest()
+        self.drive.files[self.file_id].update(path=new_source, size=os.path.getsize(new_source),
+                                              md5Checksum=md5, modifiedTime="2025-01-01T00:00:00.000Z")
+
+        fetched = self.count_fetched()
+        self.assert_same_file(self.download(), new_source)
+        self.assertEqual(sum(length for _, length in fetched), os.path.getsize(new_source))
+        self.assertIn(0, [start for start, _ in fetched])
+
+    def test_load_partial_state_checks_metadata(self):
+        self.interrupt_after(5)
+        remote = {key: value for key, value in self.read_state().items() if key != "segments"}
+        self.assertTrue(core.load_partial_state(self.part_path, self.state_path, remote))
+
+        changed = dict(remote, modifiedTime="2025-01-01T00:00:00.000Z")
+        self.assertIsNone(core.load_partial_state(self.part_path, self.state_path, changed))
+        self.assertFalse(os.path.exists(self.part_path))
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_incremental_md5_reads_resumed_bytes_from_disk(self):
+        with open(self.source, "rb") as f:
+            data = f.read()
+        half = FILE_SIZE // 2
+        # Первая половина уже в файле (прошлая закачка), вторая приходит не по порядку
+        hasher = core.IncrementalMD5(self.source, max_buffered=CHUNK_SIZE)
+        hasher.add_on_disk(0, half)
+        chunks = [(pos, data[pos:pos + CHUNK_SIZE]) for pos in range(half, FILE_SIZE, CHUNK_SIZE)]
+        for pos, chunk in reversed(chunks):
+            hasher.add(pos, chunk)
+        self.assertEqual(hasher.hexdigest(FILE_SIZE), hashlib.md5(data).hexdigest())
+
+    def test_incremental_md5_rejects_missing_bytes(self):
+        hasher = core.IncrementalMD5(self.source)
+        hasher.add_on_disk(0, FILE_SIZE // 2)
+        with self.assertRaises(core.IntegrityError):
+            hasher.hexdigest(FILE_SIZE)
+
+if __name__ == "__main__":
+    unittest.main()
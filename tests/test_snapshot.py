@@ -0,0 +1,138 @@
+"""
+Снимки mods/, configs/ (SnapshotManager) и откат к ним: правка конфига на
+месте не меняет снимок, откат возвращает прежнюю версию сборки, а
+прерванный откат не оставляет папку игры без mods/. Сорвавшаяся установка
+возвращает и файлы вне mods/, configs/.
+
+    python -m pytest tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from support import core, install, make_archive, read_tree, write_files
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        self.files = {"mods/a.jar": b"jar v1", "configs/c.cfg": b"x=1\n", "configs/sub/d.toml": b"d=1\n"}
+        write_files(self.main_dir, self.files)
+        self.snapshots = core.SnapshotManager(self.main_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def path(self, rel: str) -> str:
+        return os.path.join(self.main_dir, *rel.split("/"))
+
+    def test_config_edited_in_place_does_not_change_snapshot(self):
+        snapshot_id = self.snapshots.create("test")
+        # Игра переписывает конфиг в тот же inode
+        with open(self.path("configs/c.cfg"), "r+b") as f:
+            f.write(b"x=9\n")
+        self.snapshots.restore(snapshot_id)
+        self.assertEqual(read_tree(self.main_dir), self.files)
+
+    @unittest.skipIf(os.name == "nt", "st_ino of hardlinks is not compared on Windows")
+    def test_only_jars_are_hardlinked(self):
+        snapshot_id = self.snapshots.create("test")
+        saved = os.path.join(self.main_dir, core.SNAPSHOTS_DIR_NAME, snapshot_id)
+        self.assertTrue(os.path.samefile(self.path("mods/a.jar"), os.path.join(saved, "mods", "a.jar")))
+        self.assertFalse(os.path.samefile(self.path("configs/c.cfg"), os.path.join(saved, "configs", "c.cfg")))
+        # И после отката конфиг снова отдельный файл: следующая правка снимок не тронет
+        self.snapshots.restore(snapshot_id)
+        self.assertFalse(os.path.samefile(self.path("configs/c.cfg"), os.path.join(saved, "configs", "c.cfg")))
+
+    def test_rollback_after_update(self):
+        archive = make_archive(os.path.join(self.tmp_dir, "v2.zip"),
+                               {"mods/a.jar": b"jar v2", "mods/b.jar": b"new", "configs/c.cfg": b"x=2\n"})
+        install(archive, self.main_dir)
+        self.assertEqual(read_tree(self.main_dir)["mods/a.jar"], b"jar v2")
+        self.snapshots.restore("latest")
+        self.assertEqual(read_tree(self.main_dir), self.files)
+
+    def test_failed_swap_puts_current_folders_back(self):
+        snapshot_id = self.snapshots.create("test")
+        write_files(self.main_dir, {"mods/a.jar": b"jar v2", "configs/c.cfg": b"x=2\n"})
+        current = read_tree(self.main_dir)
+        replace = os.replace
+
+        def flaky(src, dst):
+            # Папку configs держит другой процесс
+            if os.path.basename(src) == "configs.fcrestore":
+                raise PermissionError("in use")
+            return replace(src, dst)
+
+        with mock.patch.object(core.os, "replace", flaky):
+            with self.assertRaises(PermissionError):
+                self.snapshots.restore(snapshot_id)
+        self.assertEqual(read_tree(self.main_dir), current)
+        self.assertFalse([name for name in os.listdir(self.main_dir) if name.endswith(".fcrestore")])
+
+    def test_old_snapshots_are_pruned(self):
+        snapshots = core.SnapshotManager(self.main_dir, keep=2)
+        ids = [snapshots.create(str(i)) for i in range(4)]
+        self.assertEqual([meta["id"] for meta in snapshots.list()], ids[:1:-1])
+
+class FailedInstallTest(unittest.TestCase):
+    V1 = {"mods/a.jar": b"jar v1", "configs/c.cfg": b"x=1\n", "resourcepacks/r.zip": b"pack v1",
+          "config.txt": b"v1"}
+    V2 = {"mods/a.jar": b"jar v2", "configs/c.cfg": b"x=2\n", "resourcepacks/r.zip": b"pack v2",
+          "config.txt": b"v2", "shaderpacks/s.zip": b"new"}
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        os.makedirs(self.main_dir)
+        install(make_archive(os.path.join(self.tmp_dir, "v1.tar"), self.V1), self.main_dir)
+        self.v2 = make_archive(os.path.join(self.tmp_dir, "v2.zip"), self.V2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def check_rolled_back(self, exception, **options):
+        with self.assertRaises(exception):
+            install(self.v2, self.main_dir, **options)
+        self.assertEqual(read_tree(self.main_dir), self.V1)
+
+    def test_interrupt_after_writing_restores_every_written_file(self):
+        with mock.patch.object(core.Installer, "remove_stale_files_in_main", side_effect=KeyboardInterrupt):
+            self.check_rolled_back(KeyboardInterrupt)
+
+    def test_write_error_midway(self):
+        write_file_atomic = core.write_file_atomic
+        calls = []
+
+        def disk_full(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 3:
+                raise OSError(28, "No space left on device")
+            return write_file_atomic(*args, **kwargs)
+
+        with mock.patch.object(core, "write_file_atomic", disk_full):
+            self.check_rolled_back(OSError)
+
+    def test_staged_install_fails_while_placing(self):
+        place_tree = core.place_tree
+
+        def place_then_fail(*args):
+            place_tree(*args)
+            raise PermissionError("in use")
+
+        with mock.patch.object(core, "place_tree", place_then_fail):
+            self.check_rolled_back(PermissionError, direct_install=False)
+
+    def test_snapshot_keeps_state_before_the_update(self):
+        install(self.v2, self.main_dir)
+        meta = core.SnapshotManager(self.main_dir).list()[0]
+        self.assertEqual(meta["other"], ["config.txt", "resourcepacks/r.zip"])
+        self.assertEqual(meta["absent"], ["shaderpacks/s.zip"])
+        core.SnapshotManager(self.main_dir).restore("latest")
+        self.assertEqual(read_tree(self.main_dir), self.V1)
+
+if __name__ == "__main__":
+    unittest.main()
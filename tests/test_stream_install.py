@@ -0,0 +1,79 @@
+"""
+StreamInstaller на локальной замене Drive: tar-архив распаковывается во
+время закачки только при полной установке через tmp, а обычная установка
+(прямая, только изменённые файлы) качает архив целиком.
+
+    python -m pytest tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from support import core, make_archive, read_tree
+from local_drive import LocalDrive
+
+class StreamInstallTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.main_dir = os.path.join(self.tmp_dir, "main")
+        os.makedirs(self.main_dir)
+        self.drive = LocalDrive()
+        service = self.drive.service()
+        patcher = mock.patch.object(core, "get_drive_service", lambda service_account_file: service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.files = {"mods/a.jar": os.urandom(200000), "configs/c.cfg": b"x=1\n"}
+        archive = make_archive(os.path.join(self.tmp_dir, "pack.tar.gz"), self.files)
+        self.url = f"https://drive.google.com/file/d/{self.drive.add_file('pack.tar.gz', archive)}/view"
+
+    def tearDown(self):
+        self.drive.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def install(self, **options) -> list:
+        """
+        Ставим архив с Drive; возвращаем, каким путём он шёл (stream / download).
+        """
+        installer = core.StreamInstaller(self.url, self.main_dir, "", list(core.DEFAULT_IGNORED_FILES),
+                                         list(core.DEFAULT_IGNORED_FOLDERS), list(core.DEFAULT_KEEP_IN_MAIN),
+                                         **options)
+        paths = []
+        extract_tar_stream = installer.extract_tar_stream
+        download_file = core.download_file
+
+        def streamed(*args):
+            paths.append("stream")
+            return extract_tar_stream(*args)
+
+        def downloaded(*args, **kwargs):
+            paths.append("download")
+            return download_file(*args, **kwargs)
+
+        installer.extract_tar_stream = streamed
+        with mock.patch.object(core, "download_file", downloaded):
+            installer.custom_install_process()
+        return paths
+
+    def test_default_install_downloads_then_installs_changed_files(self):
+        self.assertEqual(self.install(), ["download"])
+        inode = os.stat(os.path.join(self.main_dir, "mods", "a.jar")).st_ino
+        self.assertEqual(self.install(), ["download"])
+        self.assertEqual(read_tree(self.main_dir), self.files)
+        # Второй раз файл не переписан
+        self.assertEqual(os.stat(os.path.join(self.main_dir, "mods", "a.jar")).st_ino, inode)
+
+    def test_full_staged_install_streams(self):
+        self.assertEqual(self.install(direct_install=False, delta_install=False), ["stream"])
+        self.assertEqual(read_tree(self.main_dir), self.files)
+        self.assertEqual(core.InstallIndex(self.main_dir).verify(), [])
+
+    def test_stream_flag_off(self):
+        with mock.patch.object(core, "STREAM_TAR_INSTALL", False):
+            self.assertEqual(self.install(direct_install=False, delta_install=False), ["download"])
+        self.assertEqual(read_tree(self.main_dir), self.files)
+
+if __name__ == "__main__":
+    unittest.main()